@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+============================================
+MICROBENCHMARK: DECODIFICACIÓN DE PAYLOADS
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Mide el costo por mensaje de extraer los campos (sensor_id, valor,
+unidad; estado solo en decodificacion.py) con las mismas formas de
+mensaje que llegan al suscriptor:
+
+- simulador: crear_mensaje() de sensores/sensor_simulator.py
+- esp32: publishSensor() de sensores/esp32_sensores.ino
+  (device_id/value/unit/status, timestamp en segundos, JSON compacto)
+
+Variantes:
+- original: decode('utf-8') + json.loads + dict.get (implementación
+  anterior de procesar_mensaje_json)
+- <backend>: extraer_campos() de suscriptores/decodificacion.py con
+  cada backend disponible (json, orjson, simdjson)
+
+No requiere broker ni base de datos.
+
+Uso:
+    python benchmarks/benchmark_decodificacion.py
+    python benchmarks/benchmark_decodificacion.py --mensajes 200000 --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Agregar path raíz del proyecto
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from sensores.sensor_simulator import crear_mensaje, Dispositivo, generar_lecturas, TOPICS
+from suscriptores import decodificacion
+
+
+# ============================================
+# MENSAJES DE PRUEBA
+# ============================================
+def mensajes_simulador(total):
+    """Payloads (tópico, bytes) generados como el simulador"""
+    dispositivos = [Dispositivo(f"ESP32_{i:03d}") for i in range(50)]
+    mensajes = []
+    while len(mensajes) < total:
+        disp = random.choice(dispositivos)
+        for lectura in generar_lecturas(disp):
+            texto = crear_mensaje(lectura.tipo, lectura.valor, lectura.unidad,
+                                  lectura.estado, disp.device_id)
+            mensajes.append((TOPICS[lectura.clave], texto.encode('utf-8')))
+    return mensajes[:total]
+
+
+def mensajes_esp32(total):
+    """Payloads (tópico, bytes) con el formato de publishSensor del ESP32"""
+    sensores = [
+        (TOPICS['temperatura'], '°C', None),
+        (TOPICS['humedad'], '%', None),
+        (TOPICS['humo'], '%', ('normal', 'alerta')),
+    ]
+    mensajes = []
+    for i in range(total):
+        topico, unidad, estados = sensores[i % len(sensores)]
+        doc = {
+            'device_id': f"ESP32_{i % 50:02d}",
+            'value': round(random.uniform(0, 100), 2),
+            'unit': unidad,
+        }
+        if estados:
+            doc['status'] = random.choice(estados)
+        doc['timestamp'] = i // 10
+        # ArduinoJson serializa sin espacios y con UTF-8 sin escapar
+        texto = json.dumps(doc, separators=(',', ':'), ensure_ascii=False)
+        mensajes.append((topico, texto.encode('utf-8')))
+    return mensajes
+
+
+FORMAS = {
+    'simulador': mensajes_simulador,
+    'esp32': mensajes_esp32,
+}
+
+
+# ============================================
+# VARIANTES
+# ============================================
+def original(topico, payload):
+    """Implementación anterior: decodificar a str y leer las claves del simulador"""
+    data = json.loads(payload.decode('utf-8'))
+    return data.get('sensor_id', None), data.get('valor', None), data.get('unidad', None)
+
+
+def variantes():
+    """Nombre → función (topico, payload) -> campos"""
+    resultado = {'original': original}
+    for nombre, loads in decodificacion.BACKENDS.items():
+        resultado[nombre] = (lambda loads: lambda topico, payload:
+                             decodificacion.campos_de(topico, loads(payload)))(loads)
+    return resultado
+
+
+def medir(funcion, mensajes, repeticiones):
+    """
+    Mejor tiempo por mensaje entre varias repeticiones
+
+    Returns:
+        float: Microsegundos por mensaje
+    """
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for topico, payload in mensajes:
+            funcion(topico, payload)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor / len(mensajes) * 1e6
+
+
+# ============================================
+# FUNCIÓN PRINCIPAL
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de decodificación de payloads JSON")
+    parser.add_argument('--mensajes', type=int, default=100000, help="Mensajes por forma")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones (se toma la mejor)")
+    parser.add_argument('--formas', default=','.join(FORMAS),
+                        help="Formas de mensaje separadas por coma (simulador,esp32)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    funciones = variantes()
+
+    print("=" * 60)
+    print("⏱️  MICROBENCHMARK DE DECODIFICACIÓN")
+    print("=" * 60)
+    print(f"🧪 Backends disponibles: {', '.join(decodificacion.BACKENDS)} "
+          f"(en uso: {decodificacion.BACKEND})")
+    print(f"📨 {args.mensajes} mensajes por forma, mejor de {args.repeticiones}\n")
+
+    for forma in args.formas.split(','):
+        mensajes = FORMAS[forma.strip()](args.mensajes)
+        tamano = sum(len(p) for _, p in mensajes) / len(mensajes)
+        topico, payload = mensajes[0]
+        print(f"📦 {forma} ({tamano:.0f} bytes/mensaje) → {original(topico, payload)} "
+              f"vs {decodificacion.extraer_campos(topico, payload)}")
+
+        base = None
+        for nombre, funcion in funciones.items():
+            microsegundos = medir(funcion, mensajes, args.repeticiones)
+            base = base or microsegundos
+            print(f"   {nombre:<10} {microsegundos:7.2f} µs/mensaje  "
+                  f"{1e6 / microsegundos:>10,.0f} msg/s  x{base / microsegundos:.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+============================================
+BENCHMARK DE INGESTA DE EXTREMO A EXTREMO
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Mide el pipeline completo:
+
+    generador de carga → broker MQTT → suscriptor_admin → PostgreSQL
+
+Para cada tasa pedida:
+1. Publica durante --duracion segundos con los publicadores de
+   sensores/generador_carga.py (mismo formato que el simulador) bajo
+   un prefijo de tópico único (bench/<id>/<tasa>/...)
+2. Sondea mensajes_mqtt cada --sondeo segundos; la latencia de cada
+   mensaje es el instante en que aparece confirmado menos el campo
+   "timestamp" del payload (momento de publicación). La resolución
+   es el intervalo de sondeo.
+3. Reporta msgs/s sostenidos, latencia p50/p99 publicación→commit
+   y tasa de pérdida
+
+Los resultados se guardan como JSON (con el commit de git y la
+configuración de ingesta) en benchmarks/resultados/ para comparar
+versiones con --comparar.
+
+Broker: el de .env, o un mosquitto local lanzado con --mosquitto
+(requiere el binario; alternativa: docker-compose up -d en broker/).
+
+Uso:
+    python benchmarks/benchmark_ingesta.py --tasas 1000,5000,10000 --duracion 30
+    python benchmarks/benchmark_ingesta.py --mosquitto --tasas 20000
+    python benchmarks/benchmark_ingesta.py --comparar benchmarks/resultados/anterior.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# Agregar path raíz del proyecto
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from database.db_config import crear_conexion
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+SUSCRIPTOR = os.path.join(RAIZ, 'suscriptores', 'suscriptor_admin.py')
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+# Variables de entorno de ingesta que se guardan con cada resultado
+VARIABLES_INGESTA = (
+    'INGESTA_MODO', 'BUFFER_TAM_LOTE', 'BUFFER_LATENCIA_MAX', 'BUFFER_HILOS',
+    'BUFFER_CAPACIDAD', 'BUFFER_POLITICA', 'ESTADISTICAS_INCREMENTALES'
+)
+
+# Ids que se vuelven a revisar en cada sondeo (los escritores paralelos
+# confirman lotes fuera de orden de id)
+VENTANA_IDS = 200000
+
+# Tablas de las que se borran las filas del benchmark (mensajes_claves
+# no guarda el tópico: sus claves vencen con DEDUP_VENTANA_HORAS)
+TABLAS_LIMPIEZA = ('mensajes_mqtt', 'estadisticas_sensores', 'mensajes_1m', 'mensajes_1h', 'mensajes_1d',
+                   'ultimo_valor')
+
+# Prefijo común de los tópicos de todas las corridas
+PREFIJO_BENCH = 'bench'
+
+
+# ============================================
+# UTILIDADES
+# ============================================
+def commit_actual():
+    """Hash corto del commit de git actual (None fuera de un repositorio)"""
+    try:
+        salida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+            capture_output=True, text=True, check=True
+        )
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) de una lista ya ordenada, por rango más cercano"""
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, max(0, int(round(p / 100 * len(valores_ordenados))) - 1))
+    return valores_ordenados[indice]
+
+
+def iniciar_mosquitto(puerto):
+    """Lanza un mosquitto local en el puerto dado; retorna el proceso o None"""
+    binario = shutil.which('mosquitto')
+    if not binario:
+        print("❌ No se encontró 'mosquitto' (usa docker-compose up -d en broker/)")
+        return None
+    proceso = subprocess.Popen(
+        [binario, '-p', str(puerto)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    time.sleep(1)
+    return proceso
+
+
+def detener_proceso(proceso, timeout=30):
+    """SIGINT (para vaciar buffers) y, si no termina, kill"""
+    if proceso.poll() is not None:
+        return
+    proceso.send_signal(signal.SIGINT)
+    try:
+        proceso.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+
+
+def limpiar_prefijo(cursor, prefijo, tablas=TABLAS_LIMPIEZA):
+    """Borra las filas del benchmark de las tablas de ingesta y resumen"""
+    for tabla in tablas:
+        try:
+            cursor.execute(f"DELETE FROM {tabla} WHERE topico LIKE %s", (prefijo + '/%',))
+        except Exception as e:
+            print(f"⚠️ No se pudo limpiar {tabla}: {e}")
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+class Sondeo:
+    """Detecta las filas nuevas del benchmark y calcula su latencia"""
+
+    def __init__(self, cursor, prefijo):
+        self.cursor = cursor
+        self.patron = prefijo + '/%'
+        self.vistos = set()
+        self.latencias = []
+        self.ultima = None
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM mensajes_mqtt")
+        self.max_id = cursor.fetchone()[0]
+
+    def sondear(self):
+        """Lee las filas confirmadas desde el último sondeo"""
+        self.cursor.execute(
+            "SELECT id, mensaje->>'timestamp' FROM mensajes_mqtt WHERE id > %s AND topico LIKE %s",
+            (max(0, self.max_id - VENTANA_IDS), self.patron)
+        )
+        ahora = datetime.now()
+        nuevas = 0
+        for id_fila, enviado_texto in self.cursor.fetchall():
+            if id_fila in self.vistos:
+                continue
+            self.vistos.add(id_fila)
+            self.max_id = max(self.max_id, id_fila)
+            nuevas += 1
+            try:
+                enviado = datetime.fromisoformat(enviado_texto)
+                self.latencias.append((ahora - enviado).total_seconds())
+            except (ValueError, TypeError):
+                pass
+        if nuevas:
+            self.ultima = time.monotonic()
+        return nuevas
+
+
+def ejecutar_tasa(tasa, args, cursor):
+    """
+    Publica a una tasa fija y mide lo que llega a la base de datos
+
+    Returns:
+        dict: Resultado de la corrida
+    """
+    # Importado aquí para que tome MQTT_BROKER/MQTT_PORT de --mosquitto
+    from sensores import generador_carga
+
+    prefijo = f"{PREFIJO_BENCH}/{uuid.uuid4().hex[:8]}/{int(tasa)}"
+    carga = argparse.Namespace(
+        dispositivos=args.dispositivos, tasa=tasa, rampa=0.0, duracion=args.duracion,
+        procesos=args.procesos, conexiones=args.conexiones, qos=args.qos,
+        # JSON de a una lectura: la latencia se mide con su "timestamp"
+        formato='json', lote=0,
+        prefijo='BENCH', topico_prefijo=prefijo + '/'
+    )
+    contadores = multiprocessing.Array('q', carga.procesos, lock=False)
+    sondeo = Sondeo(cursor, prefijo)
+
+    print(f"\n📤 {tasa:.0f} msgs/s durante {args.duracion:.0f}s → {prefijo}/...")
+    inicio = time.monotonic()
+    publicadores = [
+        multiprocessing.Process(target=generador_carga.publicador, args=(i, carga, contadores))
+        for i in range(carga.procesos)
+    ]
+    for proceso in publicadores:
+        proceso.start()
+
+    try:
+        while any(p.is_alive() for p in publicadores):
+            sondeo.sondear()
+            time.sleep(args.sondeo)
+
+        # Drenaje: esperar lo que quede en el broker y en el buffer
+        enviados = sum(contadores)
+        limite = time.monotonic() + args.drenaje
+        while len(sondeo.vistos) < enviados and time.monotonic() < limite:
+            sondeo.sondear()
+            time.sleep(args.sondeo)
+        sondeo.sondear()
+    finally:
+        for proceso in publicadores:
+            proceso.join(timeout=10)
+            if proceso.is_alive():
+                proceso.terminate()
+        limpiar_prefijo(cursor, prefijo)
+
+    guardados = len(sondeo.vistos)
+    segundos = (sondeo.ultima - inicio) if sondeo.ultima else 0.0
+    latencias = sorted(sondeo.latencias)
+    return {
+        'tasa_objetivo': tasa,
+        'enviados': enviados,
+        'guardados': guardados,
+        'perdida': round(1 - guardados / enviados, 6) if enviados else 0.0,
+        'msgs_por_segundo': round(guardados / segundos, 1) if segundos > 0 else 0.0,
+        'latencia_p50': round(percentil(latencias, 50), 4) if latencias else None,
+        'latencia_p99': round(percentil(latencias, 99), 4) if latencias else None,
+        'latencia_max': round(latencias[-1], 4) if latencias else None,
+        'resolucion_latencia': args.sondeo
+    }
+
+
+# ============================================
+# REPORTES
+# ============================================
+def mostrar_resultados(resultados):
+    """Imprime la tabla de resultados"""
+    print("\n" + "=" * 78)
+    print(f"{'Objetivo':>9} {'Enviados':>10} {'Guardados':>10} {'Pérdida':>9} "
+          f"{'msgs/s':>10} {'p50 (s)':>9} {'p99 (s)':>9}")
+    print("-" * 78)
+    for r in resultados:
+        p50 = f"{r['latencia_p50']:.3f}" if r['latencia_p50'] is not None else "N/A"
+        p99 = f"{r['latencia_p99']:.3f}" if r['latencia_p99'] is not None else "N/A"
+        print(f"{r['tasa_objetivo']:>9.0f} {r['enviados']:>10} {r['guardados']:>10} "
+              f"{r['perdida'] * 100:>8.2f}% {r['msgs_por_segundo']:>10} {p50:>9} {p99:>9}")
+    print("=" * 78)
+
+
+def comparar(actual, anterior):
+    """Compara dos archivos de resultados por tasa objetivo"""
+    previos = {r['tasa_objetivo']: r for r in anterior['resultados']}
+    print(f"\n🔍 Comparación: {anterior.get('commit')} → {actual.get('commit')}")
+    print(f"{'Objetivo':>9} {'msgs/s':>22} {'p99 (s)':>22} {'Pérdida':>18}")
+    for r in actual['resultados']:
+        p = previos.get(r['tasa_objetivo'])
+        if not p:
+            continue
+
+        def delta(clave, formato):
+            a, b = p.get(clave), r.get(clave)
+            if a is None or b is None:
+                return "N/A"
+            cambio = f" ({(b - a) / a * 100:+.0f}%)" if a else ""
+            return f"{a:{formato}}→{b:{formato}}{cambio}"
+
+        print(f"{r['tasa_objetivo']:>9.0f} {delta('msgs_por_segundo', '.0f'):>22} "
+              f"{delta('latencia_p99', '.3f'):>22} {delta('perdida', '.4f'):>18}")
+
+
+def guardar_resultados(datos, ruta=None):
+    """Guarda los resultados en JSON; retorna la ruta"""
+    if ruta is None:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        nombre = f"ingesta_{datetime.now():%Y%m%d_%H%M%S}_{datos['commit'] or 'sin_commit'}.json"
+        ruta = os.path.join(DIRECTORIO_RESULTADOS, nombre)
+    with open(ruta, 'w') as archivo:
+        json.dump(datos, archivo, indent=2)
+    return ruta
+
+
+# ============================================
+# FUNCIÓN PRINCIPAL
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta de extremo a extremo")
+    parser.add_argument('--tasas', default='1000,5000',
+                        help="Tasas objetivo en msgs/s separadas por coma")
+    parser.add_argument('--duracion', type=float, default=30.0, help="Segundos de publicación por tasa")
+    parser.add_argument('--dispositivos', type=int, default=1000, help="Dispositivos virtuales")
+    parser.add_argument('--procesos', type=int, default=2, help="Procesos publicadores")
+    parser.add_argument('--conexiones', type=int, default=2, help="Conexiones MQTT por proceso")
+    parser.add_argument('--qos', type=int, choices=(0, 1), default=0)
+    parser.add_argument('--sondeo', type=float, default=0.1, help="Segundos entre sondeos a la DB")
+    parser.add_argument('--drenaje', type=float, default=30.0,
+                        help="Segundos máximos de espera tras publicar")
+    parser.add_argument('--espera', type=float, default=3.0, help="Segundos de arranque del suscriptor")
+    parser.add_argument('--mosquitto', action='store_true', help="Lanzar un mosquitto local")
+    parser.add_argument('--puerto', type=int, default=18830, help="Puerto del mosquitto local")
+    parser.add_argument('--salida', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', help="Resultados anteriores (JSON) para comparar")
+    args = parser.parse_args()
+
+    broker = None
+    if args.mosquitto:
+        broker = iniciar_mosquitto(args.puerto)
+        if not broker:
+            sys.exit(1)
+        # Lo heredan el suscriptor y los publicadores
+        os.environ['MQTT_BROKER'] = 'localhost'
+        os.environ['MQTT_PORT'] = str(args.puerto)
+
+    tasas = [float(t) for t in args.tasas.split(',') if t.strip()]
+    print("=" * 78)
+    print("⏱️  BENCHMARK DE INGESTA: GENERADOR → BROKER → SUSCRIPTOR → POSTGRESQL")
+    print("=" * 78)
+    print(f"📡 Broker: {os.getenv('MQTT_BROKER', 'localhost')}:{os.getenv('MQTT_PORT', 1883)}")
+    print(f"🎯 Tasas: {', '.join(f'{t:.0f}' for t in tasas)} msgs/s x {args.duracion:.0f}s")
+
+    suscriptor = subprocess.Popen(
+        [sys.executable, SUSCRIPTOR], cwd=RAIZ,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    conexion = crear_conexion()
+    conexion.autocommit = True
+    cursor = conexion.cursor()
+
+    resultados = []
+    try:
+        time.sleep(args.espera)
+        if suscriptor.poll() is not None:
+            print("❌ El suscriptor terminó al arrancar (revisa broker y base de datos)")
+            sys.exit(1)
+        for tasa in tasas:
+            resultados.append(ejecutar_tasa(tasa, args, cursor))
+    except KeyboardInterrupt:
+        print("\n⏹️  Benchmark interrumpido")
+    finally:
+        detener_proceso(suscriptor)
+        # Al detenerse el suscriptor guarda su caché de último valor:
+        # se borra después para no dejar sensores del benchmark en /ultimo
+        limpiar_prefijo(cursor, PREFIJO_BENCH, ('ultimo_valor',))
+        cursor.close()
+        conexion.close()
+        if broker:
+            detener_proceso(broker, timeout=5)
+
+    if not resultados:
+        return
+
+    mostrar_resultados(resultados)
+    datos = {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar')},
+        'ingesta': {v: os.getenv(v) for v in VARIABLES_INGESTA},
+        'resultados': resultados
+    }
+    print(f"💾 Resultados: {guardar_resultados(datos, args.salida)}")
+
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            comparar(datos, json.load(archivo))
+
+
+if __name__ == "__main__":
+    main()
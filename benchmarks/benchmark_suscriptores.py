@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+============================================
+BENCHMARK: SUSCRIPTOR CALLBACK VS ASYNCIO
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Compara el throughput de ingesta de suscriptor_admin.py (callbacks
+paho + hilos escritores) con suscriptor_async.py (asyncio).
+
+Para cada motor:
+1. Lanza el suscriptor como proceso aparte
+2. Publica N mensajes con el formato del simulador bajo un prefijo
+   de tópico único (bench/<id>/<motor>/...)
+3. Mide el tiempo hasta que los N mensajes están en mensajes_mqtt
+4. Detiene el suscriptor y borra las filas del benchmark
+
+Requiere el broker MQTT y PostgreSQL configurados en .env.
+
+Uso:
+    python benchmarks/benchmark_suscriptores.py --mensajes 20000
+    python benchmarks/benchmark_suscriptores.py --motores async --mensajes 50000
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+import paho.mqtt.client as mqtt
+
+# Agregar path raíz del proyecto
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from database.db_config import crear_conexion
+from sensores.sensor_simulator import crear_mensaje, TOPICS, MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD
+
+# ============================================
+# MOTORES A COMPARAR
+# ============================================
+MOTORES = {
+    'callback': os.path.join(RAIZ, 'suscriptores', 'suscriptor_admin.py'),
+    'async': os.path.join(RAIZ, 'suscriptores', 'suscriptor_async.py')
+}
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+def publicar_mensajes(prefijo, total):
+    """
+    Publica mensajes con el formato del simulador lo más rápido posible
+
+    Args:
+        prefijo: Prefijo de tópico único del benchmark
+        total: Número de mensajes a publicar
+
+    Returns:
+        float: Instante (time.monotonic) de la primera publicación
+    """
+    client = mqtt.Client(client_id=f"bench_pub_{uuid.uuid4().hex[:8]}")
+    if MQTT_USERNAME and MQTT_PASSWORD:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    client.max_inflight_messages_set(1000)
+    client.max_queued_messages_set(0)
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+
+    tipos = list(TOPICS.items())
+    inicio = time.monotonic()
+    infos = []
+    for i in range(total):
+        tipo, topico = tipos[i % len(tipos)]
+        mensaje = crear_mensaje(tipo, round(20 + (i % 100) / 10, 1), '%')
+        infos.append(client.publish(f"{prefijo}/{topico}", mensaje, qos=1))
+
+    for info in infos:
+        info.wait_for_publish()
+    client.loop_stop()
+    client.disconnect()
+    return inicio
+
+
+def contar_filas(cursor, prefijo):
+    """Cuenta las filas guardadas bajo el prefijo del benchmark"""
+    cursor.execute("SELECT COUNT(*) FROM mensajes_mqtt WHERE topico LIKE %s", (prefijo + '/%',))
+    return cursor.fetchone()[0]
+
+
+def ejecutar_motor(nombre, total, espera, timeout):
+    """
+    Mide el throughput de un motor de ingesta
+
+    Returns:
+        dict: Resultado con mensajes guardados, segundos y msgs/s
+    """
+    prefijo = f"bench/{uuid.uuid4().hex[:8]}/{nombre}"
+    print(f"\n🔄 [{nombre}] Iniciando suscriptor...")
+    proceso = subprocess.Popen(
+        [sys.executable, MOTORES[nombre]],
+        cwd=RAIZ,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    conexion = crear_conexion()
+    conexion.autocommit = True
+    cursor = conexion.cursor()
+
+    try:
+        time.sleep(espera)
+        print(f"📤 [{nombre}] Publicando {total} mensajes en {prefijo}/...")
+        inicio = publicar_mensajes(prefijo, total)
+
+        guardados = 0
+        fin = inicio
+        while time.monotonic() - inicio < timeout:
+            guardados = contar_filas(cursor, prefijo)
+            fin = time.monotonic()
+            if guardados >= total:
+                break
+            time.sleep(0.2)
+
+        segundos = fin - inicio
+        return {
+            'motor': nombre,
+            'publicados': total,
+            'guardados': guardados,
+            'segundos': round(segundos, 2),
+            'msgs_por_segundo': round(guardados / segundos, 1) if segundos > 0 else 0.0
+        }
+    finally:
+        # SIGINT para que el suscriptor vacíe su buffer antes de salir
+        proceso.send_signal(signal.SIGINT)
+        try:
+            proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+        cursor.execute("DELETE FROM mensajes_mqtt WHERE topico LIKE %s", (prefijo + '/%',))
+        cursor.execute("DELETE FROM estadisticas_sensores WHERE topico LIKE %s", (prefijo + '/%',))
+        cursor.close()
+        conexion.close()
+
+
+# ============================================
+# FUNCIÓN PRINCIPAL
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de suscriptores: callback vs asyncio")
+    parser.add_argument('--mensajes', type=int, default=20000, help="Mensajes por motor")
+    parser.add_argument('--motores', default='callback,async', help="Motores separados por coma")
+    parser.add_argument('--espera', type=float, default=3.0, help="Segundos de arranque del suscriptor")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Segundos máximos por motor")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  BENCHMARK DE INGESTA: CALLBACK VS ASYNCIO")
+    print("=" * 60)
+    print(f"📡 Broker: {MQTT_BROKER}:{MQTT_PORT}")
+    print(f"📨 Mensajes por motor: {args.mensajes}")
+
+    resultados = []
+    for nombre in [m.strip() for m in args.motores.split(',') if m.strip()]:
+        if nombre not in MOTORES:
+            print(f"⚠️ Motor desconocido: {nombre}")
+            continue
+        resultados.append(ejecutar_motor(nombre, args.mensajes, args.espera, args.timeout))
+
+    print("\n" + "=" * 60)
+    print(f"{'Motor':<12} {'Guardados':>10} {'Segundos':>10} {'msgs/s':>12}")
+    print("-" * 60)
+    for r in resultados:
+        print(f"{r['motor']:<12} {r['guardados']:>10} {r['segundos']:>10} {r['msgs_por_segundo']:>12}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,51 @@
 Script de consulta de base de datos MQTT
 Uso: python consultar_db.py
 o desde el venv: .venv/bin/python consultar_db.py
+
+El reporte se lee de estadisticas_sensores (una fila por sensor y
+tópico), no de mensajes_mqtt. Si el suscriptor no la mantiene en cada
+lote (ESTADISTICAS_INCREMENTALES=0), antes del reporte se agregan solo
+las filas nuevas desde la última marca de id.
+
+    python consultar_db.py --fresh   # recalcular todo desde mensajes_mqtt
 """
 
+import argparse
 import sys
+import time
 from database.db_config import crear_conexion
+from database.estadisticas import (
+    ESTADISTICAS_INCREMENTALES, actualizar_desde_marca, recalcular_estadisticas, leer_marca
+)
+
+
+def refrescar_resumen(completo=False):
+    """
+    Pone al día estadisticas_sensores antes del reporte
+
+    Args:
+        completo: Recalcular desde mensajes_mqtt (recorrido completo)
+    """
+    inicio = time.monotonic()
+    if completo:
+        print("🔄 Recalculando estadísticas desde mensajes_mqtt (recorrido completo)...")
+        combinaciones = recalcular_estadisticas()
+        print(f"✅ {combinaciones} combinaciones sensor/tópico en {time.monotonic() - inicio:.1f}s")
+    elif not ESTADISTICAS_INCREMENTALES:
+        ultimo_id = actualizar_desde_marca()
+        print(f"🔄 Estadísticas al día hasta el id {ultimo_id} ({time.monotonic() - inicio:.2f}s)")
+
 
-def consultar_base_datos():
-    """Consulta y muestra el estado actual de la base de datos MQTT"""
+def consultar_base_datos(fresco=False):
+    """
+    Consulta y muestra el estado actual de la base de datos MQTT
+
+    Args:
+        fresco: Recalcular el resumen completo antes de mostrarlo
+    """
     try:
+        refrescar_resumen(fresco)
+        
         conn = crear_conexion()
         cursor = conn.cursor()
         
@@ -18,8 +55,15 @@ def consultar_base_datos():
         print("📊 CONSULTA DE BASE DE DATOS - SISTEMA MQTT")
         print("=" * 70)
         
+        ultimo_id, actualizado = leer_marca(cursor)
+        if actualizado:
+            print(f"🕒 Resumen recalculado por marca: id {ultimo_id} ({actualizado:%Y-%m-%d %H:%M:%S})")
+        
+        # Los totales y estadísticas se leen de estadisticas_sensores,
+        # que el suscriptor mantiene en cada lote (sin recorrer mensajes_mqtt)
+        
         # 1. Total de mensajes
-        cursor.execute("SELECT COUNT(*) FROM mensajes_mqtt;")
+        cursor.execute("SELECT COALESCE(SUM(total_mensajes), 0) FROM estadisticas_sensores;")
         total = cursor.fetchone()[0]
         print(f"\n📈 TOTAL DE MENSAJES GUARDADOS: {total}")
         
@@ -27,10 +71,8 @@ def consultar_base_datos():
         print(f"\n📊 MENSAJES POR TÓPICO:")
         print("-" * 70)
         cursor.execute("""
-            SELECT topico, COUNT(*) as cantidad 
-            FROM mensajes_mqtt 
-            GROUP BY topico 
-            ORDER BY cantidad DESC;
+            SELECT topico, total_mensajes 
+            FROM estadisticas_topicos;
         """)
         for topic, count in cursor.fetchall():
             print(f"   {topic:30} → {count:4} mensajes")
@@ -61,12 +103,12 @@ def consultar_base_datos():
         cursor.execute("""
             SELECT 
                 topico,
-                COUNT(*) as total,
-                AVG(valor_numerico) as promedio,
-                MIN(valor_numerico) as minimo,
-                MAX(valor_numerico) as maximo
-            FROM mensajes_mqtt
-            WHERE valor_numerico IS NOT NULL
+                SUM(total_valores) as total,
+                SUM(valor_suma) / SUM(total_valores) as promedio,
+                MIN(valor_minimo) as minimo,
+                MAX(valor_maximo) as maximo
+            FROM estadisticas_sensores
+            WHERE total_valores > 0
             GROUP BY topico
             ORDER BY topico;
         """)
@@ -83,10 +125,10 @@ def consultar_base_datos():
         print("-" * 70)
         cursor.execute("""
             SELECT 
-                MIN(timestamp_recepcion) as primer_mensaje,
-                MAX(timestamp_recepcion) as ultimo_mensaje,
-                MAX(timestamp_recepcion) - MIN(timestamp_recepcion) as duracion
-            FROM mensajes_mqtt;
+                MIN(primer_mensaje) as primer_mensaje,
+                MAX(ultimo_mensaje) as ultimo_mensaje,
+                MAX(ultimo_mensaje) - MIN(primer_mensaje) as duracion
+            FROM estadisticas_sensores;
         """)
         
         first, last, duration = cursor.fetchone()
@@ -99,9 +141,9 @@ def consultar_base_datos():
         print(f"\n🔬 SENSORES DETECTADOS:")
         print("-" * 70)
         cursor.execute("""
-            SELECT DISTINCT sensor_id, COUNT(*) as mensajes
-            FROM mensajes_mqtt
-            WHERE sensor_id IS NOT NULL
+            SELECT sensor_id, SUM(total_mensajes) as mensajes
+            FROM estadisticas_sensores
+            WHERE sensor_id <> ''
             GROUP BY sensor_id
             ORDER BY mensajes DESC;
         """)
@@ -123,4 +165,8 @@ def consultar_base_datos():
         sys.exit(1)
 
 if __name__ == "__main__":
-    consultar_base_datos()
+    parser = argparse.ArgumentParser(description="Reporte de la base de datos MQTT")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Recalcular las estadísticas desde mensajes_mqtt antes del reporte")
+    args = parser.parse_args()
+    consultar_base_datos(args.fresh)
@@ -0,0 +1,174 @@
+"""
+Consultas por Campos del Payload (JSONB)
+Taller MQTT - Universidad Militar Nueva Granada
+
+Filtra mensajes_mqtt por campos del mensaje JSON (estado, tipo) usando
+las mismas expresiones que los índices idx_mensaje_estado e
+idx_mensaje_tipo (database/schema.sql, database/migracion_jsonb.sql),
+de modo que PostgreSQL resuelve la búsqueda con el índice y solo en
+las particiones del rango de fechas pedido.
+
+El estado llega como 'estado' (simulador) o 'status' (ESP32); el
+timestamp del dispositivo es ISO 8601 en el simulador y segundos desde
+el arranque en el ESP32, por eso se devuelve tal cual como texto.
+
+Uso:
+    python database/consultas.py --estado alerta --topico incendio/sensor_humo --dias 7
+    python database/consultas.py --tipo puerta --estado abierta --limite 20
+    python database/consultas.py --resumen --dias 1
+    python database/consultas.py --estado alerta --explicar
+"""
+
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta
+import os
+import sys
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+
+# ============================================
+# EXPRESIONES INDEXADAS
+# ============================================
+# Deben ser idénticas a las de los índices para que se usen
+EXPR_ESTADO = "COALESCE(mensaje->>'estado', mensaje->>'status')"
+EXPR_TIPO = "(mensaje->>'tipo')"
+
+Mensaje = namedtuple('Mensaje', [
+    'id', 'topico', 'timestamp_recepcion', 'sensor_id', 'tipo', 'estado',
+    'valor_numerico', 'unidad', 'timestamp_dispositivo'
+])
+
+_SELECT_MENSAJES = f"""
+    SELECT id, topico, timestamp_recepcion, sensor_id, {EXPR_TIPO}, {EXPR_ESTADO},
+           valor_numerico, unidad, mensaje->>'timestamp'
+    FROM mensajes_mqtt
+"""
+
+
+def _filtros(estado=None, tipo=None, topico=None, sensor_id=None, desde=None, hasta=None):
+    """
+    Arma la cláusula WHERE con los filtros dados
+
+    Returns:
+        tuple: (texto WHERE o '', parámetros)
+    """
+    condiciones = []
+    parametros = []
+    for expresion, valor in ((EXPR_ESTADO, estado), (EXPR_TIPO, tipo),
+                             ('topico', topico), ('sensor_id', sensor_id)):
+        if valor is not None:
+            condiciones.append(f"{expresion} = %s")
+            parametros.append(valor)
+    if desde is not None:
+        condiciones.append("timestamp_recepcion >= %s")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("timestamp_recepcion < %s")
+        parametros.append(hasta)
+    where = "WHERE " + " AND ".join(condiciones) if condiciones else ""
+    return where, parametros
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+def buscar_mensajes(cursor, estado=None, tipo=None, topico=None, sensor_id=None,
+                    desde=None, hasta=None, limite=100):
+    """
+    Mensajes que cumplen los filtros, del más reciente al más antiguo
+
+    Args:
+        cursor: Cursor de PostgreSQL
+        estado: Valor de 'estado'/'status' en el payload (p. ej. 'alerta')
+        tipo: Valor de 'tipo' en el payload (p. ej. 'humo')
+        topico: Tópico exacto
+        sensor_id: Sensor exacto
+        desde: Inicio del rango de recepción (incluido)
+        hasta: Fin del rango de recepción (excluido)
+        limite: Máximo de filas (None = sin límite)
+
+    Returns:
+        list: Lista de Mensaje
+    """
+    where, parametros = _filtros(estado, tipo, topico, sensor_id, desde, hasta)
+    query = f"{_SELECT_MENSAJES} {where} ORDER BY timestamp_recepcion DESC"
+    if limite is not None:
+        query += " LIMIT %s"
+        parametros.append(limite)
+    cursor.execute(query, parametros)
+    return [Mensaje(*fila) for fila in cursor.fetchall()]
+
+
+def contar_por_estado(cursor, tipo=None, topico=None, desde=None, hasta=None):
+    """
+    Total de mensajes por estado (solo los que traen estado)
+
+    Returns:
+        list: [(estado, total)] de mayor a menor
+    """
+    where, parametros = _filtros(None, tipo, topico, None, desde, hasta)
+    condicion = f"{EXPR_ESTADO} IS NOT NULL"
+    where = f"{where} AND {condicion}" if where else f"WHERE {condicion}"
+    cursor.execute(f"""
+        SELECT {EXPR_ESTADO} AS estado, COUNT(*) AS total
+        FROM mensajes_mqtt
+        {where}
+        GROUP BY 1
+        ORDER BY total DESC
+    """, parametros)
+    return cursor.fetchall()
+
+
+def explicar_busqueda(cursor, **filtros):
+    """
+    Plan de ejecución (EXPLAIN ANALYZE) de buscar_mensajes con los filtros
+
+    Returns:
+        list: Líneas del plan
+    """
+    limite = filtros.pop('limite', 100)
+    where, parametros = _filtros(**filtros)
+    cursor.execute(f"EXPLAIN ANALYZE {_SELECT_MENSAJES} {where} "
+                   f"ORDER BY timestamp_recepcion DESC LIMIT %s", parametros + [limite])
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+# ============================================
+# EJECUCIÓN DIRECTA
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultas por campos del payload JSON")
+    parser.add_argument('--estado', help="estado/status del payload (alerta, abierta, detectado...)")
+    parser.add_argument('--tipo', help="tipo del payload (humo, puerta, temperatura...)")
+    parser.add_argument('--topico', help="Tópico exacto")
+    parser.add_argument('--sensor', help="Sensor exacto")
+    parser.add_argument('--dias', type=float, default=7.0, help="Días hacia atrás")
+    parser.add_argument('--limite', type=int, default=50, help="Máximo de mensajes a mostrar")
+    parser.add_argument('--resumen', action='store_true', help="Contar mensajes por estado")
+    parser.add_argument('--explicar', action='store_true', help="Mostrar el plan de ejecución")
+    args = parser.parse_args()
+
+    desde = datetime.now() - timedelta(days=args.dias)
+    filtros = dict(estado=args.estado, tipo=args.tipo, topico=args.topico,
+                   sensor_id=args.sensor, desde=desde)
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        if args.explicar:
+            for linea in explicar_busqueda(cursor, limite=args.limite, **filtros):
+                print(linea)
+        elif args.resumen:
+            print(f"📊 Mensajes por estado (últimos {args.dias:g} días)")
+            for estado, total in contar_por_estado(cursor, args.tipo, args.topico, desde):
+                print(f"   {estado}: {total}")
+        else:
+            mensajes = buscar_mensajes(cursor, limite=args.limite, **filtros)
+            print(f"🔎 {len(mensajes)} mensaje(s) (últimos {args.dias:g} días)")
+            for m in mensajes:
+                valor = f"{m.valor_numerico} {m.unidad or ''}" if m.valor_numerico is not None else ""
+                print(f"   [{m.timestamp_recepcion:%Y-%m-%d %H:%M:%S}] {m.topico} "
+                      f"{m.sensor_id or '-'} {m.estado or ''} {valor}")
+        cursor.close()
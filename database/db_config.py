@@ -5,7 +5,15 @@ Taller MQTT - Universidad Militar Nueva Granada
 
 import psycopg2
 from psycopg2 import pool
+from psycopg2 import extras
+from psycopg2 import extensions
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import io
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # Cargar variables de entorno desde .env si existe
@@ -23,78 +31,328 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'mqtt_secure_2025')
 }
 
-# Pool de conexiones (opcional, para mejor rendimiento)
+# ============================================
+# CONFIGURACIÓN DEL POOL DE CONEXIONES
+# ============================================
+
+POOL_CONFIG = {
+    'min_conn': int(os.getenv('DB_POOL_MIN', 1)),
+    'max_conn': int(os.getenv('DB_POOL_MAX', 10)),
+    # Segundos de vida de una conexión antes de reciclarla
+    'vida_max': float(os.getenv('DB_POOL_VIDA_MAX', 1800)),
+    # Segundos máximos esperando una conexión libre
+    'timeout_espera': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    # Segundos de inactividad tras los cuales se valida con SELECT 1
+    'ping_inactividad': float(os.getenv('DB_POOL_PING', 30))
+}
+
+# Pool de conexiones compartido por todo el proceso
 connection_pool = None
+_lock_pool = threading.Lock()
+
+
+# ============================================
+# POOL DE CONEXIONES
+# ============================================
+
+class PoolConexiones(pool.ThreadedConnectionPool):
+    """
+    Pool seguro entre hilos con validación, reciclaje y espera acotada
+    
+    Sobre ThreadedConnectionPool agrega:
+    - Espera hasta timeout_espera segundos si el pool está agotado
+      (en lugar de fallar de inmediato)
+    - Validación al entregar: descarta conexiones cerradas o rotas y
+      hace SELECT 1 si la conexión estuvo inactiva más de ping_inactividad
+    - Reciclaje de conexiones con más de vida_max segundos
+    - Estadísticas: en uso, libres, esperas y tiempo de espera
+    
+    Args:
+        min_conn: Conexiones abiertas de forma permanente
+        max_conn: Conexiones máximas simultáneas
+        vida_max: Segundos de vida antes de reciclar (0 = sin límite)
+        timeout_espera: Segundos máximos esperando conexión libre
+        ping_inactividad: Inactividad que dispara SELECT 1 (0 = siempre)
+        **kwargs: Parámetros de psycopg2.connect
+    """
+
+    def __init__(self, min_conn, max_conn, vida_max=1800, timeout_espera=10,
+                 ping_inactividad=30, **kwargs):
+        self.vida_max = vida_max
+        self.timeout_espera = timeout_espera
+        self.ping_inactividad = ping_inactividad
+        self._condicion = threading.Condition()
+        self._creada = {}
+        self._devuelta = {}
+        
+        # Estadísticas
+        self.conexiones_creadas = 0
+        self.conexiones_recicladas = 0
+        self.conexiones_descartadas = 0
+        self.esperas = 0
+        self.timeouts = 0
+        self.tiempo_espera_total = 0.0
+        self.tiempo_espera_max = 0.0
+        
+        super().__init__(min_conn, max_conn, **kwargs)
+    
+    def _connect(self, key=None):
+        """Abre una conexión nueva registrando su instante de creación"""
+        conexion = super()._connect(key)
+        self._creada[id(conexion)] = time.monotonic()
+        self.conexiones_creadas += 1
+        return conexion
+    
+    def getconn(self, key=None, timeout=None):
+        """
+        Entrega una conexión válida, esperando si el pool está agotado
+        
+        Args:
+            key: Clave opcional de la conexión (igual que psycopg2)
+            timeout: Segundos máximos de espera (None = timeout_espera)
+        
+        Returns:
+            connection: Conexión lista para usar
+        
+        Raises:
+            pool.PoolError: Si vence la espera o el pool está cerrado
+        """
+        if timeout is None:
+            timeout = self.timeout_espera
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        espero = False
+        
+        while True:
+            with self._condicion:
+                while True:
+                    try:
+                        conexion = super().getconn(key)
+                        break
+                    except pool.PoolError:
+                        if self.closed:
+                            raise
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            self.timeouts += 1
+                            raise pool.PoolError(
+                                f"Tiempo de espera agotado ({timeout}s) esperando conexión del pool"
+                            )
+                        espero = True
+                        self._condicion.wait(restante)
+            
+            if self._validar(conexion):
+                break
+            # Conexión descartada: se cierra y se pide otra
+            super().putconn(conexion, key, close=True)
+            self._olvidar(conexion)
+        
+        if espero:
+            espera = time.monotonic() - inicio
+            self.esperas += 1
+            self.tiempo_espera_total += espera
+            self.tiempo_espera_max = max(self.tiempo_espera_max, espera)
+        return conexion
+    
+    def putconn(self, conn=None, key=None, close=False):
+        """Devuelve una conexión al pool y despierta a quien esté esperando"""
+        if conn is not None and not close and self._vencida(conn):
+            close = True
+            self.conexiones_recicladas += 1
+        super().putconn(conn, key, close)
+        if conn is not None:
+            if conn.closed:
+                self._olvidar(conn)
+            else:
+                self._devuelta[id(conn)] = time.monotonic()
+        with self._condicion:
+            self._condicion.notify()
+    
+    def closeall(self):
+        """Cierra todas las conexiones y despierta a los hilos en espera"""
+        super().closeall()
+        self._creada.clear()
+        self._devuelta.clear()
+        with self._condicion:
+            self._condicion.notify_all()
+    
+    def estadisticas(self):
+        """
+        Retorna las estadísticas del pool
+        
+        Returns:
+            dict: Conexiones en uso/libres, esperas y reciclajes
+        """
+        with self._lock:
+            en_uso = len(self._used)
+            libres = len(self._pool)
+        return {
+            'en_uso': en_uso,
+            'libres': libres,
+            'max_conn': self.maxconn,
+            'creadas': self.conexiones_creadas,
+            'recicladas': self.conexiones_recicladas,
+            'descartadas': self.conexiones_descartadas,
+            'esperas': self.esperas,
+            'timeouts': self.timeouts,
+            'espera_total_s': round(self.tiempo_espera_total, 3),
+            'espera_max_s': round(self.tiempo_espera_max, 3)
+        }
+    
+    def _vencida(self, conexion):
+        """Indica si la conexión superó su vida máxima"""
+        if not self.vida_max:
+            return False
+        creada = self._creada.get(id(conexion))
+        return creada is not None and time.monotonic() - creada > self.vida_max
+    
+    def _validar(self, conexion):
+        """Comprueba que la conexión sirve antes de entregarla"""
+        if conexion.closed:
+            self.conexiones_descartadas += 1
+            return False
+        if self._vencida(conexion):
+            self.conexiones_recicladas += 1
+            return False
+        if conexion.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            self.conexiones_descartadas += 1
+            return False
+        
+        devuelta = self._devuelta.get(id(conexion))
+        inactiva = time.monotonic() - devuelta if devuelta is not None else 0
+        if devuelta is not None and inactiva >= self.ping_inactividad:
+            try:
+                cursor = conexion.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conexion.rollback()
+            except psycopg2.Error:
+                self.conexiones_descartadas += 1
+                return False
+        return True
+    
+    def _olvidar(self, conexion):
+        self._creada.pop(id(conexion), None)
+        self._devuelta.pop(id(conexion), None)
+
 
 # ============================================
 # FUNCIONES DE CONEXIÓN
 # ============================================
 
-def crear_conexion():
+def crear_conexion(base_datos=None):
     """
-    Crea y retorna una conexión a PostgreSQL
+    Crea y retorna una conexión dedicada a PostgreSQL (fuera del pool)
+    
+    Para operaciones puntuales usar mejor el context manager conexion().
+    
+    Args:
+        base_datos: Otra base de datos del mismo servidor (por defecto DB_NAME)
     
     Returns:
         connection: Objeto de conexión psycopg2
     """
+    base_datos = base_datos or DB_CONFIG['database']
     try:
         conexion = psycopg2.connect(
             host=DB_CONFIG['host'],
             port=DB_CONFIG['port'],
-            database=DB_CONFIG['database'],
+            database=base_datos,
             user=DB_CONFIG['user'],
             password=DB_CONFIG['password']
         )
-        print(f"✅ Conexión exitosa a PostgreSQL: {DB_CONFIG['database']}")
+        print(f"✅ Conexión exitosa a PostgreSQL: {base_datos}")
         return conexion
     except psycopg2.Error as e:
         print(f"❌ Error al conectar a PostgreSQL: {e}")
         return None
 
 
-def inicializar_pool(min_conn=1, max_conn=10):
-    """
-    Inicializa un pool de conexiones para múltiples clientes
-    
-    Args:
-        min_conn: Número mínimo de conexiones
-        max_conn: Número máximo de conexiones
-    """
+def _crear_pool(config):
+    """Crea el pool global (llamar con _lock_pool tomado)"""
     global connection_pool
+    if connection_pool:
+        connection_pool.closeall()
+        connection_pool = None
     try:
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            min_conn,
-            max_conn,
+        connection_pool = PoolConexiones(
+            config['min_conn'],
+            config['max_conn'],
+            vida_max=config['vida_max'],
+            timeout_espera=config['timeout_espera'],
+            ping_inactividad=config['ping_inactividad'],
             host=DB_CONFIG['host'],
             port=DB_CONFIG['port'],
             database=DB_CONFIG['database'],
             user=DB_CONFIG['user'],
             password=DB_CONFIG['password']
         )
-        print(f"✅ Pool de conexiones inicializado ({min_conn}-{max_conn} conexiones)")
+        print(f"✅ Pool de conexiones inicializado ({config['min_conn']}-{config['max_conn']} conexiones)")
         return connection_pool
     except psycopg2.Error as e:
         print(f"❌ Error al inicializar pool: {e}")
         return None
 
 
-def obtener_conexion_pool():
+def inicializar_pool(min_conn=None, max_conn=None, **opciones):
+    """
+    Inicializa el pool de conexiones compartido del proceso
+    
+    Si ya había un pool se cierra y se reemplaza.
+    
+    Args:
+        min_conn: Número mínimo de conexiones (por defecto DB_POOL_MIN)
+        max_conn: Número máximo de conexiones (por defecto DB_POOL_MAX)
+        **opciones: vida_max, timeout_espera o ping_inactividad
+    
+    Returns:
+        PoolConexiones: Pool creado, o None si falló
+    """
+    config = dict(POOL_CONFIG, **opciones)
+    if min_conn is not None:
+        config['min_conn'] = min_conn
+    if max_conn is not None:
+        config['max_conn'] = max_conn
+    config['max_conn'] = max(config['max_conn'], config['min_conn'])
+    
+    with _lock_pool:
+        return _crear_pool(config)
+
+
+def obtener_pool():
+    """
+    Retorna el pool del proceso, creándolo con la configuración por defecto
+    
+    Returns:
+        PoolConexiones: Pool compartido
+    
+    Raises:
+        psycopg2.OperationalError: Si no se pudo crear el pool
+    """
+    pool_actual = connection_pool
+    if pool_actual is None:
+        with _lock_pool:
+            pool_actual = connection_pool or _crear_pool(POOL_CONFIG)
+        if pool_actual is None:
+            raise psycopg2.OperationalError("No se pudo inicializar el pool de conexiones")
+    return pool_actual
+
+
+def obtener_conexion_pool(timeout=None):
     """
     Obtiene una conexión del pool
     
+    Args:
+        timeout: Segundos máximos de espera (None = DB_POOL_TIMEOUT)
+    
     Returns:
-        connection: Conexión del pool
+        connection: Conexión del pool, o None si no hay disponible
     """
-    global connection_pool
-    if connection_pool:
-        try:
-            return connection_pool.getconn()
-        except psycopg2.Error as e:
-            print(f"❌ Error al obtener conexión del pool: {e}")
-            return None
-    else:
-        print("⚠️ Pool no inicializado, creando conexión directa")
-        return crear_conexion()
+    try:
+        return obtener_pool().getconn(timeout=timeout)
+    except psycopg2.Error as e:
+        print(f"❌ Error al obtener conexión del pool: {e}")
+        return None
 
 
 def liberar_conexion_pool(conexion):
@@ -104,9 +362,64 @@ def liberar_conexion_pool(conexion):
     Args:
         conexion: Conexión a devolver
     """
-    global connection_pool
-    if connection_pool and conexion:
-        connection_pool.putconn(conexion)
+    if not conexion:
+        return
+    if connection_pool and not connection_pool.closed:
+        try:
+            connection_pool.putconn(conexion)
+            return
+        except pool.PoolError:
+            pass
+    # Conexión ajena al pool (o pool ya cerrado): se cierra directamente
+    if not conexion.closed:
+        conexion.close()
+
+
+@contextmanager
+def conexion(timeout=None):
+    """
+    Context manager que presta una conexión del pool
+    
+    Hace commit al salir sin errores y rollback si hubo una excepción;
+    en ambos casos la conexión vuelve al pool.
+    
+    Uso:
+        with conexion() as conn:
+            cursor = conn.cursor()
+            ...
+    
+    Args:
+        timeout: Segundos máximos esperando una conexión libre
+    """
+    pool_actual = obtener_pool()
+    conn = pool_actual.getconn(timeout=timeout)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        try:
+            pool_actual.putconn(conn)
+        except pool.PoolError:
+            pass
+
+
+def estadisticas_pool():
+    """
+    Retorna las estadísticas del pool (en uso, libres, tiempos de espera)
+    
+    Returns:
+        dict: Estadísticas, o None si el pool no está inicializado
+    """
+    if connection_pool is None:
+        return None
+    return connection_pool.estadisticas()
 
 
 def cerrar_pool():
@@ -114,9 +427,11 @@ def cerrar_pool():
     Cierra todas las conexiones del pool
     """
     global connection_pool
-    if connection_pool:
-        connection_pool.closeall()
-        print("✅ Pool de conexiones cerrado")
+    with _lock_pool:
+        if connection_pool:
+            connection_pool.closeall()
+            connection_pool = None
+            print("✅ Pool de conexiones cerrado")
 
 
 # ============================================
@@ -130,10 +445,9 @@ def probar_conexion():
     Returns:
         bool: True si la conexión es exitosa
     """
-    conexion = crear_conexion()
-    if conexion:
-        try:
-            cursor = conexion.cursor()
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor()
             cursor.execute("SELECT version();")
             version = cursor.fetchone()
             print(f"📊 PostgreSQL Version: {version[0]}")
@@ -143,12 +457,10 @@ def probar_conexion():
             print(f"📊 Base de datos actual: {db_name[0]}")
             
             cursor.close()
-            conexion.close()
             return True
-        except psycopg2.Error as e:
-            print(f"❌ Error al probar conexión: {e}")
-            return False
-    return False
+    except psycopg2.Error as e:
+        print(f"❌ Error al probar conexión: {e}")
+        return False
 
 
 def verificar_tabla(nombre_tabla='mensajes_mqtt'):
@@ -161,10 +473,9 @@ def verificar_tabla(nombre_tabla='mensajes_mqtt'):
     Returns:
         bool: True si la tabla existe
     """
-    conexion = crear_conexion()
-    if conexion:
-        try:
-            cursor = conexion.cursor()
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor()
             cursor.execute("""
                 SELECT EXISTS (
                     SELECT FROM information_schema.tables 
@@ -179,12 +490,32 @@ def verificar_tabla(nombre_tabla='mensajes_mqtt'):
                 print(f"⚠️ Tabla '{nombre_tabla}' NO existe")
             
             cursor.close()
-            conexion.close()
             return existe
-        except psycopg2.Error as e:
-            print(f"❌ Error al verificar tabla: {e}")
-            return False
-    return False
+    except psycopg2.Error as e:
+        print(f"❌ Error al verificar tabla: {e}")
+        return False
+
+
+def tablas_faltantes(conexion_db, tablas):
+    """
+    Tablas (o vistas) de la lista que no existen en la base de datos
+
+    Args:
+        conexion_db: Conexión psycopg2 abierta
+        tablas: Nombres a verificar
+
+    Returns:
+        list: Nombres que faltan, en el orden recibido
+    """
+    cursor = conexion_db.cursor()
+    try:
+        cursor.execute("SELECT nombre FROM unnest(%s) AS nombre WHERE to_regclass(nombre) IS NULL",
+                       (list(tablas),))
+        faltantes = {fila[0] for fila in cursor.fetchall()}
+    finally:
+        cursor.close()
+    conexion_db.rollback()
+    return [tabla for tabla in tablas if tabla in faltantes]
 
 
 def obtener_estadisticas():
@@ -194,46 +525,147 @@ def obtener_estadisticas():
     Returns:
         dict: Diccionario con estadísticas
     """
-    conexion = crear_conexion()
-    if conexion:
-        try:
-            cursor = conexion.cursor()
-            
-            # Total de mensajes
-            cursor.execute("SELECT COUNT(*) FROM mensajes_mqtt;")
-            total_mensajes = cursor.fetchone()[0]
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor()
             
-            # Mensajes por tópico
-            cursor.execute("""
-                SELECT topico, COUNT(*) as cantidad 
-                FROM mensajes_mqtt 
-                GROUP BY topico 
-                ORDER BY cantidad DESC;
-            """)
-            mensajes_por_topico = cursor.fetchall()
+            # Se leen de la tabla de agregados que mantiene la ingesta
+            # (database/estadisticas.py), sin recorrer mensajes_mqtt
+            cursor.execute("SELECT topico, total_mensajes, ultimo_mensaje FROM estadisticas_topicos;")
+            filas = cursor.fetchall()
             
-            # Último mensaje
-            cursor.execute("""
-                SELECT timestamp_recepcion 
-                FROM mensajes_mqtt 
-                ORDER BY timestamp_recepcion DESC 
-                LIMIT 1;
-            """)
-            ultimo_mensaje = cursor.fetchone()
+            total_mensajes = sum(cantidad for _, cantidad, _ in filas)
+            mensajes_por_topico = [(topico, cantidad) for topico, cantidad, _ in filas]
+            ultimos = [ultimo for _, _, ultimo in filas if ultimo is not None]
             
             estadisticas = {
                 'total_mensajes': total_mensajes,
                 'mensajes_por_topico': mensajes_por_topico,
-                'ultimo_mensaje': ultimo_mensaje[0] if ultimo_mensaje else None
+                'ultimo_mensaje': max(ultimos) if ultimos else None
             }
             
             cursor.close()
-            conexion.close()
             return estadisticas
-        except psycopg2.Error as e:
-            print(f"❌ Error al obtener estadísticas: {e}")
-            return None
-    return None
+    except psycopg2.Error as e:
+        print(f"❌ Error al obtener estadísticas: {e}")
+        return None
+
+
+# ============================================
+# ESCRITURA EN LOTE DE MENSAJES
+# ============================================
+
+# Fila de mensajes_mqtt en el orden de columnas usado por la ingesta
+FilaMensaje = namedtuple('FilaMensaje', [
+    'topico',
+    'mensaje',
+    'timestamp_recepcion',
+    'sensor_id',
+    'valor_numerico',
+    'unidad',
+    'ip_origen'
+])
+
+COLUMNAS_MENSAJES = FilaMensaje._fields
+
+
+def insertar_mensajes_lote(conexion, filas):
+    """
+    Inserta un lote de mensajes con un único INSERT multi-fila
+    
+    No hace commit: la transacción la controla quien llama, para que
+    todo el lote quede confirmado (o descartado) de una sola vez.
+    
+    Args:
+        conexion: Conexión psycopg2 abierta
+        filas: Lista de FilaMensaje (o tuplas en el mismo orden)
+    """
+    if not filas:
+        return
+    
+    query = f"""
+    INSERT INTO mensajes_mqtt ({', '.join(COLUMNAS_MENSAJES)})
+    VALUES %s
+    """
+    
+    cursor = conexion.cursor()
+    try:
+        extras.execute_values(cursor, query, filas, page_size=len(filas))
+    finally:
+        cursor.close()
+
+
+def _escapar_copy(texto):
+    """Escapa los caracteres especiales del formato texto de COPY"""
+    # Camino rápido: la mayoría de campos no tiene nada que escapar
+    if '\\' in texto:
+        texto = texto.replace('\\', '\\\\')
+    if '\t' in texto:
+        texto = texto.replace('\t', '\\t')
+    if '\n' in texto:
+        texto = texto.replace('\n', '\\n')
+    if '\r' in texto:
+        texto = texto.replace('\r', '\\r')
+    return texto
+
+
+def _campo_copy(valor):
+    """Convierte un valor Python a su representación en COPY (formato texto)"""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, str):
+        return _escapar_copy(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def serializar_copy(filas):
+    """
+    Serializa filas al formato texto de COPY (tabulador, \\N para NULL)
+    
+    Args:
+        filas: Lista de FilaMensaje
+    
+    Returns:
+        str: Contenido listo para COPY ... FROM STDIN
+    """
+    return ''.join(
+        '\t'.join([_campo_copy(valor) for valor in fila]) + '\n'
+        for fila in filas
+    )
+
+
+def copiar_mensajes_lote(conexion, filas):
+    """
+    Inserta un lote de mensajes con COPY ... FROM STDIN
+    
+    Mucho más rápido que INSERT para lotes grandes: el servidor no
+    analiza ni planifica una sentencia por fila. Igual que
+    insertar_mensajes_lote, no hace commit.
+    
+    Args:
+        conexion: Conexión psycopg2 abierta
+        filas: Lista de FilaMensaje (o tuplas en el mismo orden)
+    """
+    if not filas:
+        return
+    
+    datos = io.StringIO(serializar_copy(filas))
+    query = f"COPY mensajes_mqtt ({', '.join(COLUMNAS_MENSAJES)}) FROM STDIN"
+    
+    cursor = conexion.cursor()
+    try:
+        cursor.copy_expert(query, datos, size=1 << 20)
+    finally:
+        cursor.close()
+
+
+# Modos de ingesta disponibles para el suscriptor administrativo
+ESCRITORES_INGESTA = {
+    'insert': insertar_mensajes_lote,
+    'copy': copiar_mensajes_lote
+}
 
 
 # ============================================
@@ -261,6 +693,12 @@ if __name__ == "__main__":
             print(f"   Mensajes por tópico:")
             for topico, cantidad in stats['mensajes_por_topico']:
                 print(f"      {topico}: {cantidad}")
+        
+        # Estado del pool
+        print("\n🏊 Pool de conexiones:")
+        for clave, valor in estadisticas_pool().items():
+            print(f"   {clave}: {valor}")
+        cerrar_pool()
     else:
         print("\n❌ Error de conexión")
     
@@ -0,0 +1,396 @@
+"""
+Estadísticas Incrementales por Sensor y Tópico
+Taller MQTT - Universidad Militar Nueva Granada
+
+Mantiene la tabla estadisticas_sensores durante la ingesta: cada lote
+de mensajes se agrega en memoria por (sensor_id, topico) y se aplica
+con un único UPSERT en la misma transacción que el COPY/INSERT del
+lote. Las consultas de estadísticas leen esa tabla (unas pocas filas)
+en lugar de recorrer mensajes_mqtt con GROUP BY.
+
+Los mensajes sin sensor_id se agregan con sensor_id = '' (la tabla
+exige NOT NULL en la clave).
+
+Con ESTADISTICAS_INCREMENTALES=0 el suscriptor no toca la tabla y
+actualizar_desde_marca() la pone al día agregando solo las filas con
+id mayor que la marca guardada en estadisticas_estado. La marca solo
+avanza hasta ids cuyas transacciones ya terminaron (ver _id_estable()).
+
+Uso:
+    python database/estadisticas.py              # mostrar estadísticas
+    python database/estadisticas.py --actualizar # agregar filas nuevas (por id)
+    python database/estadisticas.py --recalcular # reconstruir desde mensajes_mqtt
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from psycopg2 import extras
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# Actualizar estadisticas_sensores en la misma transacción de cada lote
+ESTADISTICAS_INCREMENTALES = os.getenv('ESTADISTICAS_INCREMENTALES', '1') == '1'
+
+# Segundos máximos de espera a que terminen los lotes en curso antes
+# de fijar la marca de id
+ESTADISTICAS_ESPERA = float(os.getenv('ESTADISTICAS_ESPERA', 30))
+
+# IDs procesados por transacción en actualizar_desde_marca()
+ESTADISTICAS_BLOQUE_IDS = int(os.getenv('ESTADISTICAS_BLOQUE_IDS', 1000000))
+
+TABLA_CRUDA = 'mensajes_mqtt'
+
+# ============================================
+# SQL
+# ============================================
+COLUMNAS_ESTADISTICAS = (
+    'sensor_id', 'topico', 'total_mensajes', 'total_valores', 'valor_suma',
+    'valor_minimo', 'valor_maximo', 'primer_mensaje', 'ultimo_mensaje'
+)
+
+# Combina el acumulado existente con el agregado del lote
+_ON_CONFLICT = """
+ON CONFLICT (sensor_id, topico) DO UPDATE SET
+    total_mensajes = e.total_mensajes + EXCLUDED.total_mensajes,
+    total_valores = e.total_valores + EXCLUDED.total_valores,
+    valor_suma = e.valor_suma + EXCLUDED.valor_suma,
+    valor_minimo = LEAST(e.valor_minimo, EXCLUDED.valor_minimo),
+    valor_maximo = GREATEST(e.valor_maximo, EXCLUDED.valor_maximo),
+    primer_mensaje = LEAST(e.primer_mensaje, EXCLUDED.primer_mensaje),
+    ultimo_mensaje = GREATEST(e.ultimo_mensaje, EXCLUDED.ultimo_mensaje),
+    valor_promedio = (e.valor_suma + EXCLUDED.valor_suma)
+                     / NULLIF(e.total_valores + EXCLUDED.total_valores, 0)
+"""
+
+UPSERT_ESTADISTICAS = f"""
+INSERT INTO estadisticas_sensores AS e ({', '.join(COLUMNAS_ESTADISTICAS)}, valor_promedio)
+VALUES %s
+{_ON_CONFLICT}
+"""
+
+# Misma sentencia con parámetros posicionales (asyncpg)
+UPSERT_ESTADISTICAS_ASYNC = f"""
+INSERT INTO estadisticas_sensores AS e ({', '.join(COLUMNAS_ESTADISTICAS)}, valor_promedio)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $5::NUMERIC / NULLIF($4, 0))
+{_ON_CONFLICT}
+"""
+
+_PLANTILLA_VALORES = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::NUMERIC / NULLIF(%s, 0))"
+
+
+def _sql_agregar_crudos(filtro="", tabla='estadisticas_sensores'):
+    """INSERT ... SELECT que agrega filas de mensajes_mqtt sobre el acumulado"""
+    return f"""
+        INSERT INTO {tabla} AS e ({', '.join(COLUMNAS_ESTADISTICAS)}, valor_promedio)
+        SELECT COALESCE(sensor_id, ''), topico,
+               COUNT(*), COUNT(valor_numerico), COALESCE(SUM(valor_numerico), 0),
+               MIN(valor_numerico), MAX(valor_numerico),
+               MIN(timestamp_recepcion), MAX(timestamp_recepcion),
+               AVG(valor_numerico)
+        FROM {TABLA_CRUDA}
+        {filtro}
+        GROUP BY COALESCE(sensor_id, ''), topico
+        {_ON_CONFLICT}
+    """
+
+
+# ============================================
+# AGREGACIÓN EN MEMORIA
+# ============================================
+def valor_numerico(valor):
+    """
+    Convierte el valor extraído a float con la precisión de la columna
+    valor_numerico (DECIMAL(10,2)), si es numérico
+
+    Returns:
+        float: Valor numérico, o None si no lo es (incluye booleanos)
+    """
+    if valor is None or isinstance(valor, bool):
+        return None
+    try:
+        return round(float(valor), 2)
+    except (TypeError, ValueError):
+        return None
+
+
+def acumular_estadisticas(filas):
+    """
+    Agrega un lote de FilaMensaje por (sensor_id, topico)
+
+    Args:
+        filas: Lista de FilaMensaje
+
+    Returns:
+        list: Tuplas en el orden de COLUMNAS_ESTADISTICAS, ordenadas por
+              clave (orden fijo de bloqueo entre hilos escritores)
+    """
+    acumulado = {}
+    for fila in filas:
+        # Texto siempre: un lote con IDs int y str también se puede ordenar
+        clave = (str(fila.sensor_id) if fila.sensor_id is not None else '', fila.topico)
+        valor = valor_numerico(fila.valor_numerico)
+        ts = fila.timestamp_recepcion
+
+        a = acumulado.get(clave)
+        if a is None:
+            acumulado[clave] = [
+                1,
+                0 if valor is None else 1,
+                0.0 if valor is None else valor,
+                valor,
+                valor,
+                ts,
+                ts
+            ]
+            continue
+
+        a[0] += 1
+        if valor is not None:
+            a[1] += 1
+            a[2] += valor
+            if a[3] is None or valor < a[3]:
+                a[3] = valor
+            if a[4] is None or valor > a[4]:
+                a[4] = valor
+        if ts < a[5]:
+            a[5] = ts
+        if ts > a[6]:
+            a[6] = ts
+
+    return [clave + tuple(acumulado[clave]) for clave in sorted(acumulado)]
+
+
+def actualizar_estadisticas(conexion_db, filas):
+    """
+    Aplica a estadisticas_sensores el agregado de un lote (sin commit)
+
+    Debe llamarse en la misma transacción que guarda el lote, así las
+    estadísticas nunca cuentan filas que no llegaron a confirmarse.
+
+    Args:
+        conexion_db: Conexión psycopg2 abierta
+        filas: Lista de FilaMensaje
+    """
+    agregados = acumular_estadisticas(filas)
+    if not agregados:
+        return
+
+    # La plantilla repite suma y total_valores para calcular el promedio
+    valores = [a + (a[4], a[3]) for a in agregados]
+    cursor = conexion_db.cursor()
+    try:
+        extras.execute_values(cursor, UPSERT_ESTADISTICAS, valores,
+                              template=_PLANTILLA_VALORES, page_size=len(valores))
+    finally:
+        cursor.close()
+
+
+# ============================================
+# LECTURA Y RECONSTRUCCIÓN
+# ============================================
+def leer_estadisticas_topicos(cursor):
+    """
+    Lee las estadísticas por tópico desde la tabla de agregados
+
+    Returns:
+        list: Tuplas (topico, total, sensores, primer, ultimo, promedio, minimo, maximo)
+              ordenadas por total descendente
+    """
+    cursor.execute("SELECT * FROM estadisticas_topicos;")
+    return cursor.fetchall()
+
+
+def _guardar_marca(cursor, ultimo_id):
+    cursor.execute("""
+        INSERT INTO estadisticas_estado (tabla, ultimo_id, actualizado)
+        VALUES (%s, %s, NOW())
+        ON CONFLICT (tabla) DO UPDATE SET ultimo_id = EXCLUDED.ultimo_id, actualizado = NOW()
+    """, (TABLA_CRUDA, ultimo_id))
+
+
+def leer_marca(cursor):
+    """
+    Hasta qué id de mensajes_mqtt está agregada la tabla
+
+    Returns:
+        tuple: (ultimo_id, actualizado); (0, None) si nunca se actualizó
+    """
+    cursor.execute("SELECT ultimo_id, actualizado FROM estadisticas_estado WHERE tabla = %s",
+                   (TABLA_CRUDA,))
+    return cursor.fetchone() or (0, None)
+
+
+def _id_estable(cursor, espera=ESTADISTICAS_ESPERA):
+    """
+    Mayor id de mensajes_mqtt por debajo del cual todo está confirmado
+
+    Los IDs se asignan al insertar y los lotes se confirman en desorden
+    entre hilos y procesos: un id visible no garantiza que los menores
+    lo estén. Se lee el último valor entregado por la secuencia y se
+    espera a que terminen las transacciones que en ese momento
+    escribían en la tabla (las que tienen RowExclusiveLock, como hace
+    CREATE INDEX CONCURRENTLY). Desde entonces, ningún id menor o igual
+    puede aparecer. No bloquea a los escritores.
+
+    Args:
+        cursor: Cursor psycopg2
+        espera: Segundos máximos de espera
+
+    Returns:
+        int: Último id estable (0 si la secuencia no se ha usado)
+
+    Raises:
+        TimeoutError: Si alguna escritura sigue abierta pasada la espera
+    """
+    cursor.execute("SELECT COALESCE(pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass), 0)",
+                   (TABLA_CRUDA,))
+    ultimo_id = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT COALESCE(array_agg(virtualtransaction), '{}') FROM pg_locks
+        WHERE locktype = 'relation' AND relation = %s::regclass
+          AND mode = 'RowExclusiveLock' AND pid <> pg_backend_pid()
+    """, (TABLA_CRUDA,))
+    escritores = cursor.fetchone()[0]
+
+    limite = time.monotonic() + espera
+    while escritores:
+        # Cada transacción retiene su virtualxid hasta terminar
+        cursor.execute("""
+            SELECT COALESCE(array_agg(virtualxid), '{}') FROM pg_locks
+            WHERE locktype = 'virtualxid' AND virtualxid = ANY(%s)
+        """, (escritores,))
+        escritores = cursor.fetchone()[0]
+        if escritores and time.monotonic() > limite:
+            raise TimeoutError(f"{len(escritores)} escritura(s) en {TABLA_CRUDA} siguen abiertas "
+                               f"después de {espera:g}s")
+        if escritores:
+            time.sleep(0.05)
+    return ultimo_id
+
+
+def actualizar_desde_marca(espera=ESTADISTICAS_ESPERA, bloque=ESTADISTICAS_BLOQUE_IDS):
+    """
+    Agrega a estadisticas_sensores las filas nuevas desde la marca de id
+
+    Cada bloque de IDs se procesa en una transacción que también avanza
+    la marca, así una interrupción no cuenta filas dos veces. Usar solo
+    con ESTADISTICAS_INCREMENTALES=0: si el suscriptor ya actualiza la
+    tabla en cada lote, las filas se contarían doble.
+
+    Args:
+        espera: Segundos máximos de espera a los lotes en curso
+        bloque: IDs por transacción
+
+    Returns:
+        int: Nueva marca (último id agregado)
+    """
+    with conexion() as conn:
+        cursor = conn.cursor()
+        hasta = _id_estable(cursor, espera)
+        conn.commit()
+        sentencia = _sql_agregar_crudos("WHERE id > %(desde)s AND id <= %(hasta)s")
+        while True:
+            cursor.execute(
+                "INSERT INTO estadisticas_estado (tabla) VALUES (%s) ON CONFLICT DO NOTHING",
+                (TABLA_CRUDA,)
+            )
+            cursor.execute("SELECT ultimo_id FROM estadisticas_estado WHERE tabla = %s FOR UPDATE",
+                           (TABLA_CRUDA,))
+            desde = cursor.fetchone()[0]
+            if desde >= hasta:
+                conn.commit()
+                cursor.close()
+                return desde
+            fin = min(desde + bloque, hasta)
+            cursor.execute(sentencia, {'desde': desde, 'hasta': fin})
+            _guardar_marca(cursor, fin)
+            conn.commit()
+
+
+def recalcular_estadisticas(espera=ESTADISTICAS_ESPERA):
+    """
+    Reconstruye estadisticas_sensores desde mensajes_mqtt (recorrido completo)
+
+    Hace falta al activar las estadísticas incrementales sobre una base
+    de datos con mensajes previos, o para corregir una desviación. Solo
+    cuenta los mensajes que siguen en mensajes_mqtt (la retención pudo
+    haber borrado otros).
+
+    El recorrido completo se agrega en una tabla temporal sin bloquear
+    estadisticas_sensores; solo el reemplazo final (unas pocas filas por
+    sensor y tópico) la toma en modo EXCLUSIVE. Con
+    ESTADISTICAS_INCREMENTALES=1, en ese momento se suman también los
+    lotes confirmados durante el recorrido; los que siguen abiertos
+    actualizarán la tabla ya reconstruida al confirmarse. Deja la marca
+    de id en el último id estable al empezar.
+
+    Args:
+        espera: Segundos máximos de espera a los lotes en curso
+
+    Returns:
+        int: Número de combinaciones (sensor, tópico) calculadas
+    """
+    with conexion() as conn:
+        cursor = conn.cursor()
+        ultimo_id = _id_estable(cursor, espera)
+        conn.commit()
+
+        cursor.execute("""
+            CREATE TEMP TABLE estadisticas_reconstruidas
+            (LIKE estadisticas_sensores INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP
+        """)
+        cursor.execute(_sql_agregar_crudos("WHERE id <= %(hasta)s", 'estadisticas_reconstruidas'),
+                       {'hasta': ultimo_id})
+
+        # Mismo orden de bloqueo que actualizar_desde_marca(): marca y luego tabla
+        cursor.execute("INSERT INTO estadisticas_estado (tabla) VALUES (%s) ON CONFLICT DO NOTHING",
+                       (TABLA_CRUDA,))
+        cursor.execute("SELECT 1 FROM estadisticas_estado WHERE tabla = %s FOR UPDATE", (TABLA_CRUDA,))
+        cursor.execute("LOCK TABLE estadisticas_sensores IN EXCLUSIVE MODE;")
+        if ESTADISTICAS_INCREMENTALES:
+            cursor.execute(_sql_agregar_crudos("WHERE id > %(desde)s", 'estadisticas_reconstruidas'),
+                           {'desde': ultimo_id})
+        columnas = ', '.join(COLUMNAS_ESTADISTICAS + ('valor_promedio',))
+        cursor.execute("DELETE FROM estadisticas_sensores;")
+        cursor.execute(f"""
+            INSERT INTO estadisticas_sensores ({columnas})
+            SELECT {columnas} FROM estadisticas_reconstruidas
+        """)
+        total = cursor.rowcount
+        _guardar_marca(cursor, ultimo_id)
+        cursor.close()
+    return total
+
+
+# ============================================
+# EJECUCIÓN DIRECTA
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estadísticas incrementales de sensores")
+    parser.add_argument('--recalcular', action='store_true',
+                        help="Reconstruir estadisticas_sensores desde mensajes_mqtt")
+    parser.add_argument('--actualizar', action='store_true',
+                        help="Agregar las filas nuevas desde la marca de id")
+    args = parser.parse_args()
+
+    if args.recalcular:
+        print("🔄 Recalculando estadísticas desde mensajes_mqtt...")
+        print(f"✅ {recalcular_estadisticas()} combinaciones sensor/tópico")
+    elif args.actualizar:
+        print(f"✅ Estadísticas agregadas hasta el id {actualizar_desde_marca()}")
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        print(f"\n{'Tópico':<30} {'Total':>8} {'Sensores':>9} {'Promedio':>10}")
+        for topico, total, sensores, _, _, promedio, _, _ in leer_estadisticas_topicos(cursor):
+            promedio_str = f"{promedio:.1f}" if promedio is not None else "N/A"
+            print(f"{topico:<30} {total:>8} {sensores:>9} {promedio_str:>10}")
+        cursor.close()
@@ -0,0 +1,80 @@
+-- ============================================
+-- MIGRACIÓN: mensajes_mqtt.mensaje DE TEXT A JSONB
+-- Universidad Militar Nueva Granada
+-- Base de Datos: mqtt_taller
+-- ============================================
+
+-- Convierte la columna mensaje a JSONB para poder filtrar por los
+-- campos del payload (tipo, estado/status, timestamp del dispositivo)
+-- sin volver a parsear cada fila, y crea los índices de expresión
+-- que usa database/consultas.py.
+--
+-- Los payloads que no son JSON válido se conservan como cadena JSON
+-- ("texto original"); el suscriptor hace lo mismo al guardar.
+--
+-- Si la tabla aún no está particionada, ejecutar antes
+-- database/migracion_particiones.sql.
+--
+-- ALTER COLUMN ... TYPE reescribe todas las particiones y las bloquea
+-- mientras tanto: ejecutar con el suscriptor detenido.
+--
+--   psql -d mqtt_taller -f database/migracion_jsonb.sql
+
+BEGIN;
+
+-- ============================================
+-- 1. CONVERSIÓN SEGURA TEXT → JSONB
+-- ============================================
+CREATE OR REPLACE FUNCTION texto_a_jsonb(texto TEXT)
+RETURNS JSONB AS $$
+BEGIN
+    RETURN texto::JSONB;
+EXCEPTION WHEN others THEN
+    RETURN to_jsonb(texto);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- ============================================
+-- 2. CAMBIAR EL TIPO DE LA COLUMNA
+-- ============================================
+-- La vista depende de la columna: se elimina y se vuelve a crear
+DROP VIEW IF EXISTS mensajes_recientes;
+
+ALTER TABLE mensajes_mqtt
+    ALTER COLUMN mensaje TYPE JSONB USING texto_a_jsonb(mensaje);
+
+CREATE VIEW mensajes_recientes AS
+SELECT
+    id,
+    topico,
+    mensaje,
+    timestamp_recepcion,
+    sensor_id,
+    valor_numerico,
+    unidad
+FROM mensajes_mqtt
+WHERE timestamp_recepcion > NOW() - INTERVAL '24 hours'
+ORDER BY timestamp_recepcion DESC;
+
+GRANT SELECT ON mensajes_recientes TO mqtt_admin;
+
+-- ============================================
+-- 3. ÍNDICES DE EXPRESIÓN
+-- ============================================
+-- Deben coincidir con las expresiones de database/consultas.py.
+-- El simulador envía 'estado' y el ESP32 'status'.
+CREATE INDEX IF NOT EXISTS idx_mensaje_estado ON mensajes_mqtt
+    ((COALESCE(mensaje->>'estado', mensaje->>'status')), timestamp_recepcion DESC)
+    WHERE COALESCE(mensaje->>'estado', mensaje->>'status') IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_mensaje_tipo ON mensajes_mqtt
+    ((mensaje->>'tipo'), timestamp_recepcion DESC);
+
+-- Índice GIN para búsquedas por contención (mensaje @> '{...}') sobre
+-- cualquier clave. Encarece cada inserción; crear solo si se necesita:
+-- CREATE INDEX IF NOT EXISTS idx_mensaje_gin ON mensajes_mqtt
+--     USING GIN (mensaje jsonb_path_ops);
+
+COMMIT;
+
+ANALYZE mensajes_mqtt;
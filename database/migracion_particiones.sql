@@ -0,0 +1,149 @@
+-- ============================================
+-- MIGRACIÓN: mensajes_mqtt A TABLA PARTICIONADA
+-- Universidad Militar Nueva Granada
+-- Base de Datos: mqtt_taller
+-- ============================================
+
+-- Convierte una tabla mensajes_mqtt creada con el schema anterior
+-- (heap único con id SERIAL PRIMARY KEY) en una tabla particionada
+-- por rango de timestamp_recepcion.
+--
+-- No copia datos: la tabla actual se adjunta completa como partición
+-- "histórica" (desde MINVALUE hasta la medianoche siguiente a su último
+-- mensaje, como mínimo mañana). Cuando todos
+-- sus mensajes superen la retención, limpiar_mensajes_antiguos() o
+-- database/particiones.py la eliminarán con un único DROP.
+--
+-- Ejecutar como superusuario o como dueño de la tabla:
+--   psql -d mqtt_taller -f database/migracion_particiones.sql
+-- Después crear las particiones futuras:
+--   python database/particiones.py
+
+BEGIN;
+
+-- ============================================
+-- 1. RENOMBRAR TABLA E ÍNDICES ACTUALES
+-- ============================================
+ALTER TABLE mensajes_mqtt RENAME TO mensajes_mqtt_historico;
+ALTER INDEX mensajes_mqtt_pkey RENAME TO mensajes_mqtt_historico_pkey;
+ALTER INDEX idx_timestamp RENAME TO idx_historico_timestamp;
+ALTER INDEX idx_sensor_id RENAME TO idx_historico_sensor_id;
+ALTER INDEX idx_topico_timestamp RENAME TO idx_historico_topico_timestamp;
+ALTER INDEX idx_procesado RENAME TO idx_historico_procesado;
+
+-- Índice redundante con idx_topico_timestamp
+DROP INDEX IF EXISTS idx_topico;
+
+-- ============================================
+-- 2. ADAPTAR LA TABLA HISTÓRICA
+-- ============================================
+-- La clave de partición no admite NULL
+UPDATE mensajes_mqtt_historico
+SET timestamp_recepcion = 'epoch'::TIMESTAMP
+WHERE timestamp_recepcion IS NULL;
+
+ALTER TABLE mensajes_mqtt_historico ALTER COLUMN timestamp_recepcion SET NOT NULL;
+
+-- La clave primaria debe incluir la clave de partición
+ALTER TABLE mensajes_mqtt_historico DROP CONSTRAINT mensajes_mqtt_historico_pkey;
+ALTER TABLE mensajes_mqtt_historico ADD CONSTRAINT mensajes_mqtt_historico_pkey
+    PRIMARY KEY (id, timestamp_recepcion);
+
+-- ============================================
+-- 3. CREAR LA TABLA PARTICIONADA
+-- ============================================
+-- Mantiene la misma secuencia de IDs para no repetir identificadores
+CREATE TABLE mensajes_mqtt (
+    id INTEGER NOT NULL DEFAULT nextval('mensajes_mqtt_id_seq'),
+    topico VARCHAR(255) NOT NULL,
+    mensaje TEXT NOT NULL,
+    timestamp_recepcion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sensor_id VARCHAR(100),
+    valor_numerico DECIMAL(10,2),
+    unidad VARCHAR(20),
+    ip_origen INET,
+    procesado BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (id, timestamp_recepcion)
+) PARTITION BY RANGE (timestamp_recepcion);
+
+ALTER SEQUENCE mensajes_mqtt_id_seq OWNED BY mensajes_mqtt.id;
+
+CREATE INDEX idx_timestamp ON mensajes_mqtt(timestamp_recepcion DESC);
+CREATE INDEX idx_sensor_id ON mensajes_mqtt(sensor_id);
+CREATE INDEX idx_topico_timestamp ON mensajes_mqtt(topico, timestamp_recepcion DESC);
+CREATE INDEX idx_procesado ON mensajes_mqtt(procesado) WHERE procesado = FALSE;
+
+-- ============================================
+-- 4. ADJUNTAR LOS DATOS EXISTENTES
+-- ============================================
+-- Los índices existentes de la tabla histórica se reutilizan.
+-- El límite superior debe quedar después de su último mensaje (en un
+-- sistema en marcha siempre hay mensajes de hoy), si no la validación
+-- del ATTACH falla; el límite no admite subconsultas, por eso se arma
+-- la sentencia con el valor ya calculado. particiones.py omite las
+-- particiones nuevas que se solapen con este rango.
+DO $$
+DECLARE
+    limite TIMESTAMP;
+BEGIN
+    SELECT date_trunc('day', GREATEST(MAX(timestamp_recepcion), LOCALTIMESTAMP)) + INTERVAL '1 day'
+    INTO limite
+    FROM mensajes_mqtt_historico;
+
+    EXECUTE format(
+        'ALTER TABLE mensajes_mqtt ATTACH PARTITION mensajes_mqtt_historico '
+        'FOR VALUES FROM (MINVALUE) TO (%L)', limite);
+END $$;
+
+CREATE TABLE mensajes_mqtt_default PARTITION OF mensajes_mqtt DEFAULT;
+
+-- ============================================
+-- 5. VISTAS Y PERMISOS
+-- ============================================
+-- Las vistas seguían apuntando a la tabla renombrada
+CREATE OR REPLACE VIEW mensajes_recientes AS
+SELECT
+    id,
+    topico,
+    mensaje,
+    timestamp_recepcion,
+    sensor_id,
+    valor_numerico,
+    unidad
+FROM mensajes_mqtt
+WHERE timestamp_recepcion > NOW() - INTERVAL '24 hours'
+ORDER BY timestamp_recepcion DESC;
+
+-- Misma definición que schema.sql: lee el agregado estadisticas_sensores
+-- (con las columnas que agrega schema.sql), no recorre mensajes_mqtt.
+-- La vista se elimina antes del ALTER: si schema.sql ya la creó,
+-- depende de total_mensajes y el cambio de tipo fallaría
+DROP VIEW IF EXISTS estadisticas_topicos;
+ALTER TABLE estadisticas_sensores ALTER COLUMN total_mensajes TYPE BIGINT;
+ALTER TABLE estadisticas_sensores ADD COLUMN IF NOT EXISTS total_valores BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE estadisticas_sensores ADD COLUMN IF NOT EXISTS valor_suma NUMERIC NOT NULL DEFAULT 0;
+ALTER TABLE estadisticas_sensores ADD COLUMN IF NOT EXISTS primer_mensaje TIMESTAMP;
+
+CREATE VIEW estadisticas_topicos AS
+SELECT 
+    topico,
+    SUM(total_mensajes)::BIGINT as total_mensajes,
+    COUNT(NULLIF(sensor_id, '')) as sensores_unicos,
+    MIN(primer_mensaje) as primer_mensaje,
+    MAX(ultimo_mensaje) as ultimo_mensaje,
+    SUM(valor_suma) / NULLIF(SUM(total_valores), 0) as valor_promedio,
+    MIN(valor_minimo) as valor_minimo,
+    MAX(valor_maximo) as valor_maximo
+FROM estadisticas_sensores
+GROUP BY topico
+ORDER BY total_mensajes DESC;
+
+GRANT ALL PRIVILEGES ON TABLE mensajes_mqtt TO mqtt_admin;
+GRANT USAGE, SELECT ON SEQUENCE mensajes_mqtt_id_seq TO mqtt_admin;
+GRANT SELECT ON mensajes_recientes TO mqtt_admin;
+GRANT SELECT ON estadisticas_topicos TO mqtt_admin;
+
+COMMIT;
+
+-- La función limpiar_mensajes_antiguos() nueva está en schema.sql;
+-- volver a ejecutar esa sección (CREATE OR REPLACE FUNCTION ...).
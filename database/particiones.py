@@ -0,0 +1,306 @@
+"""
+Mantenimiento de Particiones de mensajes_mqtt
+Taller MQTT - Universidad Militar Nueva Granada
+
+mensajes_mqtt está particionada por rango de timestamp_recepcion.
+Este módulo:
+- Crea por adelantado las particiones de los próximos días/semanas
+- Aplica la retención eliminando particiones completas (DROP TABLE),
+  sin DELETE fila a fila
+- Lista las particiones con su tamaño y filas estimadas
+
+Uso:
+    python database/particiones.py                  # crear futuras + retención
+    python database/particiones.py --listar
+    python database/particiones.py --adelante 14 --intervalo semana
+    python database/particiones.py --retencion 30
+"""
+
+import argparse
+import re
+import threading
+from datetime import datetime, timedelta
+import os
+import sys
+
+import psycopg2
+from psycopg2 import sql
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+TABLA = 'mensajes_mqtt'
+
+# 'dia' o 'semana'
+PARTICION_INTERVALO = os.getenv('PARTICION_INTERVALO', 'dia').lower()
+
+# Particiones futuras que deben existir siempre
+PARTICION_ADELANTE = int(os.getenv('PARTICION_ADELANTE', 7))
+
+# Días de retención (0 = no eliminar nada)
+PARTICION_RETENCION_DIAS = int(os.getenv('PARTICION_RETENCION_DIAS', 0))
+
+# Horas entre ejecuciones del mantenimiento periódico
+PARTICION_MANTENIMIENTO_HORAS = float(os.getenv('PARTICION_MANTENIMIENTO_HORAS', 6))
+
+# Extrae los límites de pg_get_expr(relpartbound): FROM ('...') TO ('...')
+_PATRON_LIMITES = re.compile(r"FROM \((MINVALUE|'[^']+')\) TO \((MAXVALUE|'[^']+')\)")
+
+
+# ============================================
+# CÁLCULO DE PERIODOS
+# ============================================
+def inicio_periodo(fecha, intervalo=PARTICION_INTERVALO):
+    """
+    Retorna el inicio del periodo (día o semana ISO) que contiene la fecha
+
+    Args:
+        fecha: datetime o date
+        intervalo: 'dia' o 'semana'
+
+    Returns:
+        datetime: Medianoche del día (o del lunes de la semana)
+    """
+    inicio = datetime(fecha.year, fecha.month, fecha.day)
+    if intervalo == 'semana':
+        inicio -= timedelta(days=inicio.weekday())
+    elif intervalo != 'dia':
+        raise ValueError(f"Intervalo de partición desconocido: {intervalo}")
+    return inicio
+
+
+def siguiente_periodo(inicio, intervalo=PARTICION_INTERVALO):
+    """Retorna el inicio del periodo siguiente"""
+    return inicio + timedelta(days=7 if intervalo == 'semana' else 1)
+
+
+def nombre_particion(inicio):
+    """Nombre de la partición que empieza en la fecha dada"""
+    return f"{TABLA}_p{inicio.strftime('%Y%m%d')}"
+
+
+def _parsear_limite(texto):
+    if texto in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(texto.strip("'"))
+
+
+# ============================================
+# CONSULTAS DE CATÁLOGO
+# ============================================
+def tabla_particionada(cursor):
+    """Indica si mensajes_mqtt es una tabla particionada"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (TABLA,))
+    fila = cursor.fetchone()
+    return bool(fila) and fila[0] == 'p'
+
+
+def listar_particiones(cursor):
+    """
+    Lista las particiones de mensajes_mqtt
+
+    Returns:
+        list: dicts con nombre, desde, hasta (None = sin límite o DEFAULT),
+              filas_estimadas, bytes y defecto
+    """
+    cursor.execute("""
+        SELECT c.relname,
+               pg_get_expr(c.relpartbound, c.oid),
+               GREATEST(c.reltuples, 0)::BIGINT,
+               pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+    """, (TABLA,))
+
+    particiones = []
+    for nombre, limites, filas, tamano in cursor.fetchall():
+        coincidencia = _PATRON_LIMITES.search(limites)
+        particiones.append({
+            'nombre': nombre,
+            'desde': _parsear_limite(coincidencia.group(1)) if coincidencia else None,
+            'hasta': _parsear_limite(coincidencia.group(2)) if coincidencia else None,
+            'filas_estimadas': filas,
+            'bytes': tamano,
+            'defecto': limites == 'DEFAULT'
+        })
+    return particiones
+
+
+def _cubierto(particiones, desde, hasta):
+    """Indica si el rango [desde, hasta) se solapa con alguna partición existente"""
+    for p in particiones:
+        if p['defecto']:
+            continue
+        p_desde = p['desde'] or datetime.min
+        p_hasta = p['hasta'] or datetime.max
+        if p_desde < hasta and desde < p_hasta:
+            return True
+    return False
+
+
+# ============================================
+# MANTENIMIENTO
+# ============================================
+def crear_particiones_futuras(adelante=PARTICION_ADELANTE, intervalo=PARTICION_INTERVALO, desde=None):
+    """
+    Crea las particiones desde el periodo actual hasta 'adelante' periodos
+
+    Las que ya existen (o cuyo rango ya está cubierto) se omiten.
+
+    Args:
+        adelante: Número de periodos futuros a garantizar
+        intervalo: 'dia' o 'semana'
+        desde: Fecha de inicio (por defecto hoy)
+
+    Returns:
+        list: Nombres de las particiones creadas
+    """
+    inicio = inicio_periodo(desde or datetime.now(), intervalo)
+    creadas = []
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        if not tabla_particionada(cursor):
+            print(f"⚠️ {TABLA} no está particionada (ver database/migracion_particiones.sql)")
+            cursor.close()
+            return creadas
+
+        existentes = listar_particiones(cursor)
+        for _ in range(adelante + 1):
+            fin = siguiente_periodo(inicio, intervalo)
+            if not _cubierto(existentes, inicio, fin):
+                nombre = nombre_particion(inicio)
+                try:
+                    cursor.execute(sql.SQL(
+                        "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)"
+                    ).format(sql.Identifier(nombre), sql.Identifier(TABLA)), (inicio, fin))
+                    conn.commit()
+                    creadas.append(nombre)
+                    print(f"✅ Partición creada: {nombre} [{inicio:%Y-%m-%d} → {fin:%Y-%m-%d})")
+                except psycopg2.Error as e:
+                    # Típicamente: la partición por defecto ya tiene filas de ese rango
+                    conn.rollback()
+                    print(f"❌ No se pudo crear {nombre}: {e}")
+            inicio = fin
+        cursor.close()
+
+    return creadas
+
+
+def eliminar_particiones_antiguas(dias=PARTICION_RETENCION_DIAS, simular=False):
+    """
+    Elimina las particiones cuyo rango termina antes de now() - dias
+
+    Cada partición se borra con un único DROP TABLE (O(1), sin bloat),
+    y solo se recorre la partición por defecto para filas sueltas.
+
+    Args:
+        dias: Días de retención (0 = no eliminar)
+        simular: Si es True solo informa lo que se eliminaría
+
+    Returns:
+        list: dicts de las particiones eliminadas (o a eliminar)
+    """
+    if dias <= 0:
+        return []
+
+    corte = datetime.now() - timedelta(days=dias)
+    eliminadas = []
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        if not tabla_particionada(cursor):
+            print(f"⚠️ {TABLA} no está particionada (ver database/migracion_particiones.sql)")
+            cursor.close()
+            return eliminadas
+
+        for p in listar_particiones(cursor):
+            if p['defecto'] or p['hasta'] is None or p['hasta'] > corte:
+                continue
+            eliminadas.append(p)
+            if simular:
+                print(f"🔎 Se eliminaría {p['nombre']} (~{p['filas_estimadas']} filas, {p['bytes'] // 1024} KB)")
+                continue
+            cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(p['nombre'])))
+            conn.commit()
+            print(f"🗑️  Partición eliminada: {p['nombre']} (~{p['filas_estimadas']} filas)")
+
+        if not simular:
+            cursor.execute(
+                sql.SQL("DELETE FROM {} WHERE timestamp_recepcion < %s").format(
+                    sql.Identifier(f"{TABLA}_default")),
+                (corte,)
+            )
+            if cursor.rowcount:
+                print(f"🗑️  {cursor.rowcount} filas antiguas eliminadas de la partición por defecto")
+        cursor.close()
+
+    return eliminadas
+
+
+def mantener(adelante=PARTICION_ADELANTE, intervalo=PARTICION_INTERVALO, dias=PARTICION_RETENCION_DIAS):
+    """Ejecuta una pasada completa: particiones futuras y retención"""
+    crear_particiones_futuras(adelante, intervalo)
+    eliminar_particiones_antiguas(dias)
+
+
+def iniciar_mantenimiento_periodico(horas=PARTICION_MANTENIMIENTO_HORAS):
+    """
+    Ejecuta mantener() ahora y luego cada 'horas' en un hilo daemon
+
+    Pensado para el suscriptor administrativo: garantiza que siempre
+    exista la partición del día aunque nadie programe un cron.
+
+    Returns:
+        threading.Event: Evento que detiene el hilo al activarlo
+    """
+    detener = threading.Event()
+
+    def bucle():
+        while not detener.is_set():
+            try:
+                mantener()
+            except psycopg2.Error as e:
+                print(f"⚠️ Error en mantenimiento de particiones: {e}")
+            detener.wait(horas * 3600)
+
+    threading.Thread(target=bucle, name="mantenimiento_particiones", daemon=True).start()
+    return detener
+
+
+# ============================================
+# EJECUCIÓN DIRECTA
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de mensajes_mqtt")
+    parser.add_argument('--listar', action='store_true', help="Solo listar particiones")
+    parser.add_argument('--adelante', type=int, default=PARTICION_ADELANTE, help="Periodos futuros a crear")
+    parser.add_argument('--intervalo', choices=('dia', 'semana'), default=PARTICION_INTERVALO)
+    parser.add_argument('--retencion', type=int, default=PARTICION_RETENCION_DIAS,
+                        help="Días de retención (0 = no eliminar)")
+    parser.add_argument('--simular', action='store_true', help="Mostrar qué se eliminaría sin borrar")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("MANTENIMIENTO DE PARTICIONES - mensajes_mqtt")
+    print("=" * 50)
+
+    if not args.listar:
+        crear_particiones_futuras(args.adelante, args.intervalo)
+        eliminar_particiones_antiguas(args.retencion, simular=args.simular)
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        print(f"\n📋 Particiones:")
+        for p in listar_particiones(cursor):
+            rango = 'DEFAULT' if p['defecto'] else f"{p['desde'] or 'MIN'} → {p['hasta'] or 'MAX'}"
+            print(f"   {p['nombre']:32} {rango:45} ~{p['filas_estimadas']:>10} filas  {p['bytes'] // 1024:>8} KB")
+        cursor.close()
+
+    print("=" * 50)
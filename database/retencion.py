@@ -0,0 +1,367 @@
+"""
+Retención por Tópico de mensajes_mqtt
+Taller MQTT - Universidad Militar Nueva Granada
+
+Elimina los mensajes crudos según una retención distinta por tópico
+(RETENCION_REGLAS), por ejemplo:
+
+    RETENCION_REGLAS=clima/*=7,incendio/*=365,*=30
+
+Cada regla es patron=días (patrón estilo fnmatch, gana la primera que
+coincide; días 0 = conservar siempre). Los tópicos sin regla no se
+eliminan nunca.
+
+Para no bloquear la ingesta:
+- Una partición cuyos tópicos ya vencieron todos se elimina completa
+  (DROP TABLE, con lock_timeout para no quedar en cola delante del
+  suscriptor).
+- Si en la partición conviven tópicos con retenciones distintas, se
+  borran solo los vencidos, en lotes de RETENCION_LOTE filas con una
+  transacción y una pausa (RETENCION_PAUSA) entre lotes.
+
+Antes de borrar se ejecuta una pasada de submuestreo y nunca se borra
+más allá de la marca de agua del nivel de 1 minuto: los datos crudos
+que se eliminan ya están resumidos en mensajes_1m / 1h / 1d.
+
+Uso:
+    python database/retencion.py --simular            # estimación, sin borrar
+    python database/retencion.py                      # una pasada
+    python database/retencion.py --continuo 6         # cada 6 horas
+    python database/retencion.py --reglas "clima/*=7,incendio/*=365"
+"""
+
+import argparse
+import fnmatch
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+import os
+import sys
+
+import psycopg2
+from psycopg2 import sql
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+from database.particiones import TABLA, tabla_particionada, listar_particiones
+from database.submuestreo import submuestrear, marcas_de_agua, NIVELES
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# patron=días separados por coma (ver docstring)
+RETENCION_REGLAS = os.getenv('RETENCION_REGLAS', '')
+
+# Filas por lote de DELETE y segundos de pausa entre lotes
+RETENCION_LOTE = int(os.getenv('RETENCION_LOTE', 5000))
+RETENCION_PAUSA = float(os.getenv('RETENCION_PAUSA', 0.1))
+
+# Espera máxima por el bloqueo de un DROP antes de dejarlo para la próxima pasada
+RETENCION_LOCK_TIMEOUT = os.getenv('RETENCION_LOCK_TIMEOUT', '2s')
+
+# Clave del advisory lock que evita dos pasadas simultáneas
+CLAVE_BLOQUEO = 726173
+
+Regla = namedtuple('Regla', ['patron', 'dias'])
+
+# tipo: 'drop' (partición completa) o 'delete' (un tópico dentro de una tabla)
+Accion = namedtuple('Accion', ['tipo', 'tabla', 'topico', 'hasta', 'filas', 'bytes'])
+
+
+# ============================================
+# REGLAS
+# ============================================
+def parsear_reglas(texto=RETENCION_REGLAS):
+    """
+    Convierte 'patron=dias,patron=dias' en una lista de Regla
+
+    Raises:
+        ValueError: Si alguna regla no tiene el formato patron=dias
+    """
+    reglas = []
+    for parte in texto.split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        patron, separador, dias = parte.rpartition('=')
+        if not separador or not patron.strip():
+            raise ValueError(f"Regla de retención no válida: '{parte}' (se espera patron=dias)")
+        reglas.append(Regla(patron.strip(), float(dias)))
+    return reglas
+
+
+def dias_retencion(topico, reglas):
+    """Días de retención de un tópico (None = conservar siempre)"""
+    for regla in reglas:
+        if fnmatch.fnmatchcase(topico, regla.patron):
+            return regla.dias if regla.dias > 0 else None
+    return None
+
+
+# ============================================
+# PLANIFICACIÓN
+# ============================================
+def _tablas(cursor):
+    """Particiones de mensajes_mqtt, o la tabla completa si no está particionada"""
+    if tabla_particionada(cursor):
+        return listar_particiones(cursor)
+    cursor.execute("""
+        SELECT GREATEST(reltuples, 0)::BIGINT, pg_total_relation_size(oid)
+        FROM pg_class WHERE oid = to_regclass(%s)
+    """, (TABLA,))
+    filas, tamano = cursor.fetchone()
+    return [{'nombre': TABLA, 'desde': None, 'hasta': None,
+             'filas_estimadas': filas, 'bytes': tamano, 'defecto': True}]
+
+
+def _topicos_en(cursor, tabla):
+    """
+    Tópicos distintos de una tabla
+
+    Recorre el índice (topico, timestamp_recepcion) saltando de tópico
+    en tópico: cuesta un acceso por tópico, no un recorrido completo.
+    """
+    identificador = sql.Identifier(tabla)
+    cursor.execute(sql.SQL("""
+        WITH RECURSIVE t AS (
+            (SELECT topico FROM {0} ORDER BY topico LIMIT 1)
+            UNION ALL
+            SELECT (SELECT topico FROM {0} WHERE topico > t.topico ORDER BY topico LIMIT 1)
+            FROM t WHERE t.topico IS NOT NULL
+        )
+        SELECT topico FROM t WHERE topico IS NOT NULL
+    """).format(identificador))
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def _estimar_filas(cursor, tabla, topico, hasta):
+    """Filas estimadas por el planificador (sin contarlas)"""
+    cursor.execute(sql.SQL(
+        "EXPLAIN (FORMAT JSON) SELECT 1 FROM {} WHERE topico = %s AND timestamp_recepcion < %s"
+    ).format(sql.Identifier(tabla)), (topico, hasta))
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def planificar(cursor, reglas, limite=None, ahora=None):
+    """
+    Calcula qué se eliminaría con las reglas dadas
+
+    Args:
+        cursor: Cursor de PostgreSQL
+        reglas: Lista de Regla
+        limite: No eliminar nada recibido desde este instante (marca de
+                agua del submuestreo); None = sin límite
+        ahora: Instante de referencia (por defecto datetime.now())
+
+    Returns:
+        list: Lista de Accion
+    """
+    ahora = ahora or datetime.now()
+    acciones = []
+    for tabla in _tablas(cursor):
+        topicos = _topicos_en(cursor, tabla['nombre'])
+        cortes = {}
+        for topico in topicos:
+            dias = dias_retencion(topico, reglas)
+            if dias is not None:
+                corte = ahora - timedelta(days=dias)
+                cortes[topico] = min(corte, limite) if limite else corte
+        if not cortes:
+            continue
+
+        hasta = tabla['hasta']
+        if (not tabla['defecto'] and hasta is not None and len(cortes) == len(topicos)
+                and all(corte >= hasta for corte in cortes.values())):
+            acciones.append(Accion('drop', tabla['nombre'], None, hasta,
+                                   tabla['filas_estimadas'], tabla['bytes']))
+            continue
+
+        bytes_por_fila = tabla['bytes'] / max(tabla['filas_estimadas'], 1)
+        for topico, corte in sorted(cortes.items()):
+            if tabla['desde'] is not None and corte <= tabla['desde']:
+                continue
+            corte = min(corte, hasta) if hasta else corte
+            filas = _estimar_filas(cursor, tabla['nombre'], topico, corte)
+            if filas:
+                acciones.append(Accion('delete', tabla['nombre'], topico, corte,
+                                       filas, int(filas * bytes_por_fila)))
+    return acciones
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+def _eliminar_particion(conn, accion, lock_timeout=RETENCION_LOCK_TIMEOUT):
+    """DROP de una partición; False si no obtuvo el bloqueo a tiempo"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(accion.tabla)))
+        conn.commit()
+        return True
+    except psycopg2.errors.LockNotAvailable:
+        conn.rollback()
+        return False
+    finally:
+        cursor.close()
+
+
+def _borrar_por_lotes(conn, accion, lote=RETENCION_LOTE, pausa=RETENCION_PAUSA):
+    """
+    Borra las filas vencidas de un tópico en lotes cortos
+
+    Cada lote es una transacción propia: los bloqueos de fila duran
+    milisegundos y autovacuum puede reutilizar el espacio mientras
+    tanto. Se trabaja sobre la partición directamente (ctid es único
+    solo dentro de una tabla).
+
+    Returns:
+        int: Filas eliminadas
+    """
+    tabla = sql.Identifier(accion.tabla)
+    sentencia = sql.SQL("""
+        DELETE FROM {0} WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM {0}
+            WHERE topico = %s AND timestamp_recepcion < %s
+            LIMIT %s
+        ))
+    """).format(tabla)
+    total = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute(sentencia, (accion.topico, accion.hasta, lote))
+            borradas = cursor.rowcount
+            conn.commit()
+            total += borradas
+            if borradas < lote:
+                return total
+            time.sleep(pausa)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _formatear_bytes(cantidad):
+    for unidad in ('B', 'KB', 'MB', 'GB'):
+        if cantidad < 1024:
+            return f"{cantidad:.0f} {unidad}"
+        cantidad /= 1024
+    return f"{cantidad:.1f} TB"
+
+
+def retener(reglas=None, simular=False, lote=RETENCION_LOTE, pausa=RETENCION_PAUSA,
+            exigir_submuestreo=True):
+    """
+    Ejecuta una pasada de retención
+
+    Args:
+        reglas: Lista de Regla (por defecto RETENCION_REGLAS)
+        simular: Solo estimar filas y espacio, sin borrar ni submuestrear
+        lote: Filas por DELETE
+        pausa: Segundos entre lotes
+        exigir_submuestreo: No borrar datos aún no resumidos en mensajes_1m
+
+    Returns:
+        list: Acciones ejecutadas (o que se ejecutarían si simular)
+    """
+    reglas = parsear_reglas() if reglas is None else reglas
+    if not reglas:
+        print("ℹ️  Sin reglas de retención (RETENCION_REGLAS vacío)")
+        return []
+
+    if exigir_submuestreo and not simular:
+        submuestrear()
+
+    hechas = []
+    with conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (CLAVE_BLOQUEO,))
+        if not cursor.fetchone()[0]:
+            conn.commit()
+            print("⚠️ Otra pasada de retención está en curso")
+            cursor.close()
+            return hechas
+        try:
+            limite = None
+            if exigir_submuestreo:
+                limite = marcas_de_agua(cursor)[NIVELES[0].nombre]
+                if limite is None:
+                    print("⚠️ mensajes_1m aún no está construido: no se elimina nada "
+                          "(ejecutar database/submuestreo.py o usar --sin-submuestreo)")
+                    return hechas
+            acciones = planificar(cursor, reglas, limite)
+            conn.commit()
+
+            for accion in acciones:
+                if accion.tipo == 'drop':
+                    descripcion = f"partición {accion.tabla}"
+                else:
+                    descripcion = f"{accion.topico} en {accion.tabla} hasta {accion.hasta:%Y-%m-%d %H:%M}"
+                estimado = f"~{accion.filas} filas, {_formatear_bytes(accion.bytes)}"
+
+                if simular:
+                    print(f"🔎 Se eliminaría {descripcion} ({estimado})")
+                    hechas.append(accion)
+                elif accion.tipo == 'drop':
+                    if _eliminar_particion(conn, accion):
+                        print(f"🗑️  Eliminada {descripcion} ({estimado})")
+                        hechas.append(accion)
+                    else:
+                        print(f"⏳ {descripcion} ocupada, se reintenta en la próxima pasada")
+                else:
+                    borradas = _borrar_por_lotes(conn, accion, lote, pausa)
+                    print(f"🗑️  {borradas} filas eliminadas: {descripcion}")
+                    hechas.append(accion._replace(filas=borradas))
+        finally:
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_BLOQUEO,))
+            conn.commit()
+            cursor.close()
+
+    if hechas:
+        filas = sum(a.filas for a in hechas)
+        liberado = sum(a.bytes for a in hechas if a.tipo == 'drop')
+        reutilizable = sum(a.bytes for a in hechas if a.tipo == 'delete')
+        verbo = "Se eliminarían" if simular else "Eliminadas"
+        print(f"📊 {verbo} ~{filas} filas: {_formatear_bytes(liberado)} liberados por DROP, "
+              f"~{_formatear_bytes(reutilizable)} reutilizables tras VACUUM")
+    return hechas
+
+
+# ============================================
+# EJECUCIÓN DIRECTA
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retención por tópico de mensajes_mqtt")
+    parser.add_argument('--reglas', default=RETENCION_REGLAS,
+                        help="patron=dias separados por coma (por defecto RETENCION_REGLAS)")
+    parser.add_argument('--simular', action='store_true', help="Estimar filas y espacio sin borrar")
+    parser.add_argument('--lote', type=int, default=RETENCION_LOTE, help="Filas por DELETE")
+    parser.add_argument('--pausa', type=float, default=RETENCION_PAUSA, help="Segundos entre lotes")
+    parser.add_argument('--continuo', type=float, metavar='HORAS', help="Repetir la pasada cada HORAS")
+    parser.add_argument('--sin-submuestreo', action='store_true',
+                        help="Borrar aunque los datos no estén resumidos en mensajes_1m")
+    args = parser.parse_args()
+
+    reglas = parsear_reglas(args.reglas)
+    print("=" * 50)
+    print("RETENCIÓN POR TÓPICO - mensajes_mqtt")
+    print("=" * 50)
+    for regla in reglas:
+        print(f"   {regla.patron}: {f'{regla.dias:g} días' if regla.dias > 0 else 'conservar'}")
+
+    while True:
+        inicio = time.monotonic()
+        retener(reglas, args.simular, args.lote, args.pausa, not args.sin_submuestreo)
+        print(f"[{datetime.now():%H:%M:%S}] ⏱️  Pasada de retención: {time.monotonic() - inicio:.1f}s")
+        if not args.continuo or args.simular:
+            break
+        time.sleep(args.continuo * 3600)
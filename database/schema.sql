@@ -12,21 +12,30 @@
 -- Luego conectar a la base de datos mqtt_taller:
 -- \c mqtt_taller
 
+-- Todas las sentencias son idempotentes: volver a ejecutar este archivo
+-- sobre una base existente agrega las tablas, columnas e índices nuevos
+
 -- ============================================
 -- TABLA PRINCIPAL: mensajes_mqtt
 -- ============================================
+-- Particionada por rango de timestamp_recepcion (diaria o semanal).
+-- Las particiones las crea por adelantado database/particiones.py y la
+-- retención elimina particiones completas en vez de borrar filas.
+-- Para convertir una tabla existente: database/migracion_particiones.sql
+-- y después database/migracion_jsonb.sql
 CREATE TABLE IF NOT EXISTS mensajes_mqtt (
     -- ID autoincremental
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     
     -- Información del tópico MQTT
     topico VARCHAR(255) NOT NULL,
     
-    -- Contenido del mensaje (formato JSON)
-    mensaje TEXT NOT NULL,
+    -- Contenido del mensaje (JSON; los payloads que no son JSON se
+    -- guardan como cadena JSON)
+    mensaje JSONB NOT NULL,
     
-    -- Timestamp de recepción (automático)
-    timestamp_recepcion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Timestamp de recepción (automático, clave de partición)
+    timestamp_recepcion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     
     -- Información del sensor
     sensor_id VARCHAR(100),
@@ -41,36 +50,79 @@ CREATE TABLE IF NOT EXISTS mensajes_mqtt (
     ip_origen INET,
     
     -- Estado del mensaje
-    procesado BOOLEAN DEFAULT FALSE
-);
+    procesado BOOLEAN DEFAULT FALSE,
+    
+    -- La clave primaria debe incluir la clave de partición
+    PRIMARY KEY (id, timestamp_recepcion)
+) PARTITION BY RANGE (timestamp_recepcion);
+
+-- Partición por defecto: recoge filas fuera de las particiones creadas
+-- (por ejemplo si el mantenimiento no se ha ejecutado a tiempo).
+-- Con una tabla anterior sin particionar solo se avisa: este archivo
+-- se puede ejecutar sobre una base existente y debe llegar hasta el
+-- final (mensajes_claves, ultimo_valor, submuestreo...)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = 'mensajes_mqtt'::regclass AND relkind = 'p') THEN
+        CREATE TABLE IF NOT EXISTS mensajes_mqtt_default PARTITION OF mensajes_mqtt DEFAULT;
+    ELSE
+        RAISE NOTICE 'mensajes_mqtt no está particionada: ejecutar database/migracion_particiones.sql';
+    END IF;
+END $$;
 
 -- ============================================
 -- ÍNDICES PARA OPTIMIZACIÓN
 -- ============================================
-
--- Índice en tópico (búsquedas frecuentes por tópico)
-CREATE INDEX idx_topico ON mensajes_mqtt(topico);
+-- Se crean en cada partición: las escrituras solo tocan los índices
+-- (pequeños) de la partición del día en curso.
+-- Las búsquedas por tópico usan idx_topico_timestamp (tópico es su
+-- primera columna), por eso no hay un índice aparte solo por tópico.
 
 -- Índice en timestamp (consultas temporales)
-CREATE INDEX idx_timestamp ON mensajes_mqtt(timestamp_recepcion DESC);
+CREATE INDEX IF NOT EXISTS idx_timestamp ON mensajes_mqtt(timestamp_recepcion DESC);
 
 -- Índice en sensor_id (seguimiento por sensor)
-CREATE INDEX idx_sensor_id ON mensajes_mqtt(sensor_id);
+CREATE INDEX IF NOT EXISTS idx_sensor_id ON mensajes_mqtt(sensor_id);
 
 -- Índice compuesto (tópico + timestamp)
-CREATE INDEX idx_topico_timestamp ON mensajes_mqtt(topico, timestamp_recepcion DESC);
+CREATE INDEX IF NOT EXISTS idx_topico_timestamp ON mensajes_mqtt(topico, timestamp_recepcion DESC);
 
 -- Índice para mensajes no procesados
-CREATE INDEX idx_procesado ON mensajes_mqtt(procesado) WHERE procesado = FALSE;
+CREATE INDEX IF NOT EXISTS idx_procesado ON mensajes_mqtt(procesado) WHERE procesado = FALSE;
+
+-- Índices de expresión sobre el payload (consultas de database/consultas.py).
+-- El estado llega como 'estado' (simulador) o 'status' (ESP32); solo se
+-- indexan los mensajes que lo traen.
+-- Requieren mensaje JSONB: en una tabla anterior con mensaje TEXT los
+-- crea database/migracion_jsonb.sql
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'mensajes_mqtt'
+          AND column_name = 'mensaje') = 'jsonb' THEN
+        CREATE INDEX IF NOT EXISTS idx_mensaje_estado ON mensajes_mqtt
+            ((COALESCE(mensaje->>'estado', mensaje->>'status')), timestamp_recepcion DESC)
+            WHERE COALESCE(mensaje->>'estado', mensaje->>'status') IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_mensaje_tipo ON mensajes_mqtt((mensaje->>'tipo'), timestamp_recepcion DESC);
+    ELSE
+        RAISE NOTICE 'mensajes_mqtt.mensaje no es JSONB: ejecutar database/migracion_jsonb.sql';
+    END IF;
+END $$;
 
 -- ============================================
--- TABLA DE ESTADÍSTICAS (OPCIONAL)
+-- TABLA DE ESTADÍSTICAS (INCREMENTAL)
 -- ============================================
+-- La mantiene el suscriptor en cada lote (database/estadisticas.py);
+-- sensor_id = '' agrupa los mensajes sin sensor. El promedio se
+-- recalcula como valor_suma / total_valores en cada UPSERT
 CREATE TABLE IF NOT EXISTS estadisticas_sensores (
     id SERIAL PRIMARY KEY,
     sensor_id VARCHAR(100) NOT NULL,
     topico VARCHAR(255) NOT NULL,
-    total_mensajes INTEGER DEFAULT 0,
+    total_mensajes BIGINT DEFAULT 0,
+    total_valores BIGINT NOT NULL DEFAULT 0,
+    valor_suma NUMERIC NOT NULL DEFAULT 0,
+    primer_mensaje TIMESTAMP,
     ultimo_mensaje TIMESTAMP,
     valor_promedio DECIMAL(10,2),
     valor_minimo DECIMAL(10,2),
@@ -78,6 +130,78 @@ CREATE TABLE IF NOT EXISTS estadisticas_sensores (
     UNIQUE(sensor_id, topico)
 );
 
+-- Bases creadas con el schema anterior. La vista estadisticas_topicos
+-- lee total_mensajes y PostgreSQL no cambia el tipo de una columna
+-- usada por una vista: se elimina antes y se vuelve a crear más abajo
+DROP VIEW IF EXISTS estadisticas_topicos;
+ALTER TABLE estadisticas_sensores ALTER COLUMN total_mensajes TYPE BIGINT;
+ALTER TABLE estadisticas_sensores ADD COLUMN IF NOT EXISTS total_valores BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE estadisticas_sensores ADD COLUMN IF NOT EXISTS valor_suma NUMERIC NOT NULL DEFAULT 0;
+ALTER TABLE estadisticas_sensores ADD COLUMN IF NOT EXISTS primer_mensaje TIMESTAMP;
+
+-- Hasta qué id de mensajes_mqtt está agregada estadisticas_sensores
+-- (actualización por marca, con ESTADISTICAS_INCREMENTALES=0)
+CREATE TABLE IF NOT EXISTS estadisticas_estado (
+    tabla VARCHAR(63) PRIMARY KEY,
+    ultimo_id BIGINT NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP
+);
+
+-- Claves de contenido de los mensajes recientes para descartar
+-- reenvíos (suscriptores/deduplicacion.py). mensajes_mqtt está
+-- particionada por fecha y no admite un índice único sin
+-- timestamp_recepcion; esta tabla hace de índice único global
+CREATE TABLE IF NOT EXISTS mensajes_claves (
+    clave BYTEA PRIMARY KEY,
+    recibido TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_claves_recibido ON mensajes_claves(recibido);
+
+-- Último valor por sensor y tópico (suscriptores/ultimo_valor.py).
+-- sensor_id = '' agrupa los mensajes sin sensor
+CREATE TABLE IF NOT EXISTS ultimo_valor (
+    sensor_id VARCHAR(100) NOT NULL,
+    topico VARCHAR(255) NOT NULL,
+    valor JSONB,
+    unidad VARCHAR(20),
+    estado VARCHAR(50),
+    recibido TIMESTAMP NOT NULL,
+    PRIMARY KEY (sensor_id, topico)
+);
+
+-- ============================================
+-- TABLAS SUBMUESTREADAS (1 MINUTO / 1 HORA / 1 DÍA)
+-- ============================================
+-- Una fila por tópico, sensor y periodo. Las construye
+-- database/submuestreo.py: mensajes_1m desde mensajes_mqtt,
+-- mensajes_1h desde mensajes_1m y mensajes_1d desde mensajes_1h.
+-- sensor_id = '' agrupa los mensajes sin sensor
+CREATE TABLE IF NOT EXISTS mensajes_1m (
+    topico VARCHAR(255) NOT NULL,
+    sensor_id VARCHAR(100) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    total_mensajes BIGINT NOT NULL,
+    total_valores BIGINT NOT NULL,
+    valor_suma NUMERIC NOT NULL,
+    valor_minimo DECIMAL(10,2),
+    valor_maximo DECIMAL(10,2),
+    primer_valor DECIMAL(10,2),
+    ultimo_valor DECIMAL(10,2),
+    primer_ts TIMESTAMP NOT NULL,
+    ultimo_ts TIMESTAMP NOT NULL,
+    PRIMARY KEY (topico, sensor_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS mensajes_1h (LIKE mensajes_1m INCLUDING ALL);
+CREATE TABLE IF NOT EXISTS mensajes_1d (LIKE mensajes_1m INCLUDING ALL);
+
+-- Hasta dónde está construido cada nivel (marca de agua temporal)
+CREATE TABLE IF NOT EXISTS submuestreo_estado (
+    nivel VARCHAR(10) PRIMARY KEY,
+    procesado_hasta TIMESTAMP
+);
+
 -- ============================================
 -- VISTA PARA MENSAJES RECIENTES
 -- ============================================
@@ -97,48 +221,78 @@ ORDER BY timestamp_recepcion DESC;
 -- ============================================
 -- VISTA PARA ESTADÍSTICAS POR TÓPICO
 -- ============================================
-CREATE OR REPLACE VIEW estadisticas_topicos AS
+-- Se lee de estadisticas_sensores (una fila por sensor y tópico), sin
+-- recorrer mensajes_mqtt
+DROP VIEW IF EXISTS estadisticas_topicos;
+CREATE VIEW estadisticas_topicos AS
 SELECT 
     topico,
-    COUNT(*) as total_mensajes,
-    COUNT(DISTINCT sensor_id) as sensores_unicos,
-    MIN(timestamp_recepcion) as primer_mensaje,
-    MAX(timestamp_recepcion) as ultimo_mensaje,
-    AVG(valor_numerico) as valor_promedio,
-    MIN(valor_numerico) as valor_minimo,
-    MAX(valor_numerico) as valor_maximo
-FROM mensajes_mqtt
+    SUM(total_mensajes)::BIGINT as total_mensajes,
+    COUNT(NULLIF(sensor_id, '')) as sensores_unicos,
+    MIN(primer_mensaje) as primer_mensaje,
+    MAX(ultimo_mensaje) as ultimo_mensaje,
+    SUM(valor_suma) / NULLIF(SUM(total_valores), 0) as valor_promedio,
+    MIN(valor_minimo) as valor_minimo,
+    MAX(valor_maximo) as valor_maximo
+FROM estadisticas_sensores
 GROUP BY topico
 ORDER BY total_mensajes DESC;
 
 -- ============================================
 -- FUNCIÓN PARA LIMPIAR MENSAJES ANTIGUOS
 -- ============================================
+-- Elimina con DROP las particiones cuyo rango termina antes del corte
+-- (sin DELETE fila a fila, sin bloat) y borra solo en la partición por
+-- defecto las filas sueltas. Retorna el número de filas eliminadas
+-- (estimado para las particiones completas, según pg_class.reltuples).
 CREATE OR REPLACE FUNCTION limpiar_mensajes_antiguos(dias INTEGER)
 RETURNS INTEGER AS $$
 DECLARE
-    registros_eliminados INTEGER;
+    corte TIMESTAMP := NOW() - (dias || ' days')::INTERVAL;
+    particiones REGCLASS[];
+    estimadas BIGINT[];
+    i INTEGER;
+    filas INTEGER;
+    registros_eliminados BIGINT := 0;
 BEGIN
-    DELETE FROM mensajes_mqtt
-    WHERE timestamp_recepcion < NOW() - (dias || ' days')::INTERVAL;
+    SELECT array_agg(c.oid::regclass), array_agg(GREATEST(c.reltuples, 0)::BIGINT)
+    INTO particiones, estimadas
+    FROM pg_inherits inh
+    JOIN pg_class c ON c.oid = inh.inhrelid
+    WHERE inh.inhparent = 'mensajes_mqtt'::regclass
+      AND pg_get_expr(c.relpartbound, c.oid) <> 'DEFAULT'
+      AND substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \(''([^'']+)''\)')::TIMESTAMP <= corte;
+    
+    IF particiones IS NOT NULL THEN
+        FOR i IN 1 .. array_length(particiones, 1) LOOP
+            EXECUTE format('DROP TABLE %s', particiones[i]);
+            registros_eliminados := registros_eliminados + estimadas[i];
+        END LOOP;
+    END IF;
+    
+    DELETE FROM mensajes_mqtt_default
+    WHERE timestamp_recepcion < corte;
     
-    GET DIAGNOSTICS registros_eliminados = ROW_COUNT;
-    RETURN registros_eliminados;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN registros_eliminados + filas;
 END;
 $$ LANGUAGE plpgsql;
 
 -- Ejemplo de uso:
--- SELECT limpiar_mensajes_antiguos(30); -- Elimina mensajes de más de 30 días
+-- SELECT limpiar_mensajes_antiguos(30); -- Elimina particiones de más de 30 días
+-- Retención distinta por tópico, con borrado por lotes: database/retencion.py
 
 -- ============================================
 -- PERMISOS PARA USUARIO mqtt_admin
 -- ============================================
 GRANT ALL PRIVILEGES ON TABLE mensajes_mqtt TO mqtt_admin;
-GRANT ALL PRIVILEGES ON TABLE estadisticas_sensores TO mqtt_admin;
+GRANT ALL PRIVILEGES ON TABLE estadisticas_sensores, estadisticas_estado, ultimo_valor TO mqtt_admin;
+GRANT ALL PRIVILEGES ON TABLE mensajes_claves TO mqtt_admin;
 GRANT USAGE, SELECT ON SEQUENCE mensajes_mqtt_id_seq TO mqtt_admin;
 GRANT USAGE, SELECT ON SEQUENCE estadisticas_sensores_id_seq TO mqtt_admin;
 GRANT SELECT ON mensajes_recientes TO mqtt_admin;
 GRANT SELECT ON estadisticas_topicos TO mqtt_admin;
+GRANT ALL PRIVILEGES ON TABLE mensajes_1m, mensajes_1h, mensajes_1d, submuestreo_estado TO mqtt_admin;
 
 -- ============================================
 -- CONSULTAS ÚTILES
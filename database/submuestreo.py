@@ -0,0 +1,440 @@
+"""
+Submuestreo de Series de Tiempo (1 minuto / 1 hora / 1 día)
+Taller MQTT - Universidad Militar Nueva Granada
+
+Construye tablas de resumen por tópico, sensor y periodo a partir de
+las columnas topico, sensor_id y valor_numerico de mensajes_mqtt:
+
+    mensajes_mqtt → mensajes_1m → mensajes_1h → mensajes_1d
+
+Cada periodo guarda total de mensajes, total de valores numéricos,
+suma, mínimo, máximo y primer/último valor. Cada nivel se construye
+solo con el nivel inferior y solo para periodos ya cerrados: una
+marca de agua por nivel (tabla submuestreo_estado) indica hasta dónde
+está construido, así cada pasada procesa únicamente lo nuevo.
+
+Los mensajes se consideran completos SUBMUESTREO_MARGEN segundos
+después de recibidos (tiempo para que el buffer los escriba). Filas
+que lleguen más tarde (p. ej. reprocesadas) se incorporan con
+reconstruir(desde, hasta).
+
+consultar_serie() elige la resolución según el rango pedido y
+completa el tramo aún no construido con el nivel inferior.
+
+Uso:
+    python database/submuestreo.py                       # una pasada
+    python database/submuestreo.py --continuo 60
+    python database/submuestreo.py --reconstruir 2026-01-01 2026-01-02
+    python database/submuestreo.py --serie clima/temperatura --dias 30
+"""
+
+import argparse
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+import os
+import sys
+
+import psycopg2
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+TABLA_CRUDA = 'mensajes_mqtt'
+
+# Segundos que se esperan antes de dar por completo un minuto
+SUBMUESTREO_MARGEN = float(os.getenv('SUBMUESTREO_MARGEN', 120))
+
+# Segundos entre pasadas del submuestreo periódico (0 = desactivado)
+SUBMUESTREO_INTERVALO = float(os.getenv('SUBMUESTREO_INTERVALO', 60))
+
+# Máximo de puntos que consultar_serie() devuelve al elegir resolución
+SUBMUESTREO_MAX_PUNTOS = int(os.getenv('SUBMUESTREO_MAX_PUNTOS', 1000))
+
+Nivel = namedtuple('Nivel', ['nombre', 'unidad', 'tabla', 'paso', 'bloque'])
+
+# De más fino a más grueso; 'bloque' es el rango procesado por transacción
+NIVELES = (
+    Nivel('1m', 'minute', 'mensajes_1m', timedelta(minutes=1), timedelta(hours=6)),
+    Nivel('1h', 'hour', 'mensajes_1h', timedelta(hours=1), timedelta(days=7)),
+    Nivel('1d', 'day', 'mensajes_1d', timedelta(days=1), timedelta(days=365))
+)
+
+COLUMNAS_SUBMUESTREO = (
+    'topico', 'sensor_id', 'bucket', 'total_mensajes', 'total_valores', 'valor_suma',
+    'valor_minimo', 'valor_maximo', 'primer_valor', 'ultimo_valor', 'primer_ts', 'ultimo_ts'
+)
+
+
+class Periodo(namedtuple('Periodo', COLUMNAS_SUBMUESTREO[2:])):
+    """Un punto de la serie: agregados de un periodo"""
+    __slots__ = ()
+
+    @property
+    def promedio(self):
+        return self.valor_suma / self.total_valores if self.total_valores else None
+
+
+# ============================================
+# SQL
+# ============================================
+def _sql_agregado(origen, unidad, claves=True, filtro=''):
+    """
+    SELECT que agrega 'origen' (mensajes_mqtt o un nivel) por periodo 'unidad'
+
+    Args:
+        origen: Tabla de origen
+        unidad: Unidad de date_trunc ('minute', 'hour', 'day')
+        claves: Agrupar también por topico y sensor_id
+        filtro: Condiciones adicionales (AND ...)
+
+    Returns:
+        str: Consulta con parámetros %(desde)s y %(hasta)s
+    """
+    if origen == TABLA_CRUDA:
+        ts, valor, orden = 'timestamp_recepcion', 'valor_numerico', 'timestamp_recepcion{0}, id{0}'
+        agregados = f"""
+            COUNT(*), COUNT({valor}), COALESCE(SUM({valor}), 0), MIN({valor}), MAX({valor}),
+            (array_agg({valor} ORDER BY {orden.format('')}) FILTER (WHERE {valor} IS NOT NULL))[1],
+            (array_agg({valor} ORDER BY {orden.format(' DESC')}) FILTER (WHERE {valor} IS NOT NULL))[1],
+            MIN({ts}), MAX({ts})"""
+        sensor = "COALESCE(sensor_id, '')"
+    else:
+        ts = 'bucket'
+        agregados = """
+            SUM(total_mensajes), SUM(total_valores), SUM(valor_suma), MIN(valor_minimo), MAX(valor_maximo),
+            (array_agg(primer_valor ORDER BY bucket) FILTER (WHERE primer_valor IS NOT NULL))[1],
+            (array_agg(ultimo_valor ORDER BY bucket DESC) FILTER (WHERE ultimo_valor IS NOT NULL))[1],
+            MIN(primer_ts), MAX(ultimo_ts)"""
+        sensor = 'sensor_id'
+
+    seleccion = f"topico, {sensor}, " if claves else ""
+    grupos = "1, 2, 3" if claves else "1"
+    return f"""
+        SELECT {seleccion}date_trunc('{unidad}', {ts}),{agregados}
+        FROM {origen}
+        WHERE {ts} >= %(desde)s AND {ts} < %(hasta)s {filtro}
+        GROUP BY {grupos}
+    """
+
+
+def _sql_construir(nivel, origen):
+    """INSERT ... SELECT que (re)calcula los periodos de un nivel"""
+    actualizar = ',\n            '.join(f"{c} = EXCLUDED.{c}" for c in COLUMNAS_SUBMUESTREO[3:])
+    return f"""
+        INSERT INTO {nivel.tabla} ({', '.join(COLUMNAS_SUBMUESTREO)})
+        {_sql_agregado(origen, nivel.unidad)}
+        ON CONFLICT (topico, sensor_id, bucket) DO UPDATE SET
+            {actualizar}
+    """
+
+
+# ============================================
+# UTILIDADES DE TIEMPO
+# ============================================
+def truncar(fecha, unidad):
+    """Equivalente en Python de date_trunc para 'minute', 'hour' y 'day'"""
+    if unidad == 'minute':
+        return fecha.replace(second=0, microsecond=0)
+    if unidad == 'hour':
+        return fecha.replace(minute=0, second=0, microsecond=0)
+    if unidad == 'day':
+        return fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unidad desconocida: {unidad}")
+
+
+def _origen(indice):
+    """Tabla desde la que se construye el nivel 'indice'"""
+    return TABLA_CRUDA if indice == 0 else NIVELES[indice - 1].tabla
+
+
+def marcas_de_agua(cursor):
+    """
+    Retorna hasta dónde está construido cada nivel
+
+    Returns:
+        dict: nombre de nivel → datetime (None si aún no se construyó)
+    """
+    cursor.execute("SELECT nivel, procesado_hasta FROM submuestreo_estado")
+    marcas = dict(cursor.fetchall())
+    return {n.nombre: marcas.get(n.nombre) for n in NIVELES}
+
+
+# ============================================
+# CONSTRUCCIÓN INCREMENTAL
+# ============================================
+def _marca_bloqueada(cursor, indice):
+    """
+    Lee (y bloquea hasta el commit) la marca de agua de un nivel
+
+    Si el nivel nunca se construyó, parte del periodo más antiguo de
+    su origen. El bloqueo de fila serializa pasadas concurrentes
+    (p. ej. varios trabajadores del supervisor).
+    """
+    nivel = NIVELES[indice]
+    cursor.execute(
+        "INSERT INTO submuestreo_estado (nivel) VALUES (%s) ON CONFLICT DO NOTHING",
+        (nivel.nombre,)
+    )
+    cursor.execute(
+        "SELECT procesado_hasta FROM submuestreo_estado WHERE nivel = %s FOR UPDATE",
+        (nivel.nombre,)
+    )
+    marca = cursor.fetchone()[0]
+    if marca is None:
+        columna = 'timestamp_recepcion' if indice == 0 else 'bucket'
+        cursor.execute(f"SELECT MIN({columna}) FROM {_origen(indice)}")
+        minimo = cursor.fetchone()[0]
+        marca = truncar(minimo, nivel.unidad) if minimo else None
+    return marca
+
+
+def construir_nivel(conn, indice, limite):
+    """
+    Construye los periodos de un nivel desde su marca de agua hasta 'limite'
+
+    Procesa bloques de nivel.bloque, con un commit por bloque que
+    incluye el avance de la marca de agua.
+
+    Args:
+        conn: Conexión psycopg2
+        indice: Posición del nivel en NIVELES
+        limite: Inicio del primer periodo aún no cerrado
+
+    Returns:
+        int: Periodos insertados o actualizados
+    """
+    nivel = NIVELES[indice]
+    sentencia = _sql_construir(nivel, _origen(indice))
+    total = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            desde = _marca_bloqueada(cursor, indice)
+            if desde is None or desde >= limite:
+                conn.commit()
+                return total
+            hasta = min(desde + nivel.bloque, limite)
+            cursor.execute(sentencia, {'desde': desde, 'hasta': hasta})
+            total += cursor.rowcount
+            cursor.execute(
+                "UPDATE submuestreo_estado SET procesado_hasta = %s WHERE nivel = %s",
+                (hasta, nivel.nombre)
+            )
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def submuestrear(margen=SUBMUESTREO_MARGEN):
+    """
+    Ejecuta una pasada incremental de todos los niveles
+
+    El nivel de 1 minuto llega hasta now() - margen; cada nivel
+    superior llega hasta el último periodo completo del inferior.
+
+    Returns:
+        dict: nombre de nivel → periodos insertados o actualizados
+    """
+    resultado = {}
+    limite = truncar(datetime.now() - timedelta(seconds=margen), NIVELES[0].unidad)
+    with conexion() as conn:
+        for indice, nivel in enumerate(NIVELES):
+            if indice > 0:
+                cursor = conn.cursor()
+                marca = marcas_de_agua(cursor)[NIVELES[indice - 1].nombre]
+                cursor.close()
+                if marca is None:
+                    break
+                limite = truncar(marca, nivel.unidad)
+            resultado[nivel.nombre] = construir_nivel(conn, indice, limite)
+    return resultado
+
+
+def reconstruir(desde, hasta):
+    """
+    Recalcula los periodos de todos los niveles que tocan [desde, hasta)
+
+    Sirve para incorporar mensajes guardados después de que su minuto
+    ya se había construido. Solo actualiza periodos que tienen datos
+    en el origen, así no borra resúmenes de mensajes ya eliminados por
+    la retención. No avanza las marcas de agua.
+
+    Returns:
+        dict: nombre de nivel → periodos recalculados
+    """
+    resultado = {}
+    with conexion() as conn:
+        cursor = conn.cursor()
+        marcas = marcas_de_agua(cursor)
+        for indice, nivel in enumerate(NIVELES):
+            marca = marcas[nivel.nombre]
+            if marca is None:
+                break
+            inicio = truncar(desde, nivel.unidad)
+            fin = min(truncar(hasta, nivel.unidad) + nivel.paso, marca)
+            if inicio >= fin:
+                resultado[nivel.nombre] = 0
+                continue
+            cursor.execute(_sql_construir(nivel, _origen(indice)), {'desde': inicio, 'hasta': fin})
+            resultado[nivel.nombre] = cursor.rowcount
+        cursor.close()
+    return resultado
+
+
+def iniciar_submuestreo_periodico(segundos=SUBMUESTREO_INTERVALO):
+    """
+    Ejecuta submuestrear() cada 'segundos' en un hilo daemon
+
+    Returns:
+        threading.Event: Evento que detiene el hilo al activarlo
+    """
+    detener = threading.Event()
+
+    def bucle():
+        while not detener.wait(segundos):
+            try:
+                submuestrear()
+            except psycopg2.Error as e:
+                print(f"⚠️ Error en submuestreo: {e}")
+
+    threading.Thread(target=bucle, name="submuestreo", daemon=True).start()
+    return detener
+
+
+# ============================================
+# CONSULTA DE SERIES
+# ============================================
+def elegir_nivel(desde, hasta, max_puntos=SUBMUESTREO_MAX_PUNTOS):
+    """Nivel más fino que devuelve como máximo max_puntos periodos"""
+    for nivel in NIVELES:
+        if (hasta - desde) / nivel.paso <= max_puntos:
+            return nivel
+    return NIVELES[-1]
+
+
+def _combinar(a, b):
+    """Combina dos agregados del mismo periodo (a es anterior en el tiempo)"""
+    def extremo(funcion, x, y):
+        valores = [v for v in (x, y) if v is not None]
+        return funcion(valores) if valores else None
+
+    return Periodo(
+        a.bucket,
+        a.total_mensajes + b.total_mensajes,
+        a.total_valores + b.total_valores,
+        a.valor_suma + b.valor_suma,
+        extremo(min, a.valor_minimo, b.valor_minimo),
+        extremo(max, a.valor_maximo, b.valor_maximo),
+        a.primer_valor if a.primer_valor is not None else b.primer_valor,
+        b.ultimo_valor if b.ultimo_valor is not None else a.ultimo_valor,
+        min(a.primer_ts, b.primer_ts),
+        max(a.ultimo_ts, b.ultimo_ts)
+    )
+
+
+def consultar_serie(cursor, topico, desde, hasta, sensor_id=None, nivel=None,
+                    max_puntos=SUBMUESTREO_MAX_PUNTOS):
+    """
+    Serie de un tópico entre dos fechas, a la resolución adecuada
+
+    Lee del nivel elegido hasta su marca de agua y completa el resto
+    con los niveles más finos (y finalmente mensajes_mqtt), agregando
+    todo a la misma resolución.
+
+    Args:
+        cursor: Cursor psycopg2
+        topico: Tópico a consultar
+        desde, hasta: Rango [desde, hasta)
+        sensor_id: Filtrar por sensor (None = todos los sensores del tópico)
+        nivel: Nombre del nivel ('1m', '1h', '1d'); None = automático
+        max_puntos: Máximo de periodos al elegir el nivel automáticamente
+
+    Returns:
+        tuple: (nombre del nivel usado, lista de Periodo ordenada por bucket)
+    """
+    if nivel is None:
+        elegido = elegir_nivel(desde, hasta, max_puntos)
+    else:
+        elegido = next(n for n in NIVELES if n.nombre == nivel)
+
+    marcas = marcas_de_agua(cursor)
+    parametros = {'topico': topico, 'sensor_id': sensor_id}
+    filtro = "AND topico = %(topico)s" + (" AND sensor_id = %(sensor_id)s" if sensor_id is not None else "")
+
+    # Tramos: el nivel elegido, luego los inferiores y por último los mensajes crudos
+    indice = NIVELES.index(elegido)
+    origenes = [(n.tabla, marcas[n.nombre]) for n in reversed(NIVELES[:indice + 1])]
+    origenes.append((TABLA_CRUDA, hasta))
+
+    periodos = {}
+    inicio = desde
+    for tabla, marca in origenes:
+        fin = min(hasta, marca) if marca else inicio
+        if fin <= inicio:
+            continue
+        parametros.update(desde=inicio, hasta=fin)
+        cursor.execute(_sql_agregado(tabla, elegido.unidad, claves=False, filtro=filtro), parametros)
+        for fila in cursor.fetchall():
+            periodo = Periodo(*fila)
+            anterior = periodos.get(periodo.bucket)
+            periodos[periodo.bucket] = _combinar(anterior, periodo) if anterior else periodo
+        inicio = fin
+
+    return elegido.nombre, [periodos[b] for b in sorted(periodos)]
+
+
+# ============================================
+# EJECUCIÓN DIRECTA
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submuestreo de mensajes_mqtt a 1m / 1h / 1d")
+    parser.add_argument('--continuo', type=float, metavar='SEGUNDOS',
+                        help="Repetir la pasada cada SEGUNDOS")
+    parser.add_argument('--reconstruir', nargs=2, metavar=('DESDE', 'HASTA'),
+                        help="Recalcular un rango de fechas (ISO 8601)")
+    parser.add_argument('--serie', metavar='TOPICO', help="Mostrar la serie de un tópico")
+    parser.add_argument('--sensor', help="Filtrar la serie por sensor")
+    parser.add_argument('--dias', type=float, default=1.0, help="Días hacia atrás de la serie")
+    parser.add_argument('--nivel', choices=[n.nombre for n in NIVELES], help="Resolución de la serie")
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        desde, hasta = (datetime.fromisoformat(f) for f in args.reconstruir)
+        print(f"🔄 Recalculando {desde} → {hasta}...")
+        for nombre, filas in reconstruir(desde, hasta).items():
+            print(f"   {nombre}: {filas} periodos")
+
+    elif args.serie:
+        hasta = datetime.now()
+        desde = hasta - timedelta(days=args.dias)
+        with conexion() as conn:
+            cursor = conn.cursor()
+            nombre, serie = consultar_serie(cursor, args.serie, desde, hasta, args.sensor, args.nivel)
+            cursor.close()
+        print(f"📈 {args.serie}: {len(serie)} periodos de {nombre}")
+        print(f"{'Periodo':<20} {'Mensajes':>9} {'Promedio':>10} {'Min':>8} {'Max':>8} {'Último':>8}")
+        for p in serie:
+            promedio = f"{p.promedio:.1f}" if p.promedio is not None else "N/A"
+            minimo = f"{p.valor_minimo:.1f}" if p.valor_minimo is not None else "N/A"
+            maximo = f"{p.valor_maximo:.1f}" if p.valor_maximo is not None else "N/A"
+            ultimo = f"{p.ultimo_valor:.1f}" if p.ultimo_valor is not None else "N/A"
+            print(f"{p.bucket:%Y-%m-%d %H:%M}     {p.total_mensajes:>9} {promedio:>10} {minimo:>8} {maximo:>8} {ultimo:>8}")
+
+    else:
+        while True:
+            inicio = time.monotonic()
+            resultado = submuestrear()
+            resumen = ', '.join(f"{n}: {f}" for n, f in resultado.items()) or "sin datos"
+            print(f"[{datetime.now():%H:%M:%S}] 📉 Submuestreo ({time.monotonic() - inicio:.1f}s) → {resumen}")
+            if not args.continuo:
+                break
+            time.sleep(args.continuo)
@@ -3,13 +3,21 @@
 Script para Limpiar Base de Datos MQTT
 Uso: python limpiar_db.py
 o desde el venv: .venv/bin/python limpiar_db.py
+
+Vacía todo con TRUNCATE (instantáneo, sin dejar filas muertas). Para
+borrar solo los datos antiguos por tópico usar database/retencion.py.
 """
 
 import sys
 from database.db_config import crear_conexion
 
+# Tabla cruda y tablas derivadas de ella (estadísticas y submuestreo)
+TABLAS = ('mensajes_mqtt', 'estadisticas_sensores', 'estadisticas_estado', 'mensajes_1m',
+          'mensajes_1h', 'mensajes_1d', 'submuestreo_estado', 'ultimo_valor',
+          'mensajes_claves')
+
 def limpiar_base_datos():
-    """Borra todos los datos de la tabla mensajes_mqtt"""
+    """Borra todos los mensajes y sus estadísticas y resúmenes"""
     try:
         print("=" * 70)
         print("🗑️  LIMPIEZA DE BASE DE DATOS - SISTEMA MQTT")
@@ -47,8 +55,11 @@ def limpiar_base_datos():
         print()
         print("🗑️  Borrando todos los mensajes...")
         
-        # Borrar todos los datos de la tabla
-        cursor.execute("DELETE FROM mensajes_mqtt;")
+        # TRUNCATE necesita un bloqueo exclusivo breve: si el suscriptor
+        # tiene una transacción abierta, fallar en vez de quedar en cola
+        # bloqueando sus escrituras. RESTART IDENTITY reinicia los IDs.
+        cursor.execute("SET lock_timeout = '5s';")
+        cursor.execute(f"TRUNCATE {', '.join(TABLAS)} RESTART IDENTITY;")
         
         # Confirmar cambios
         conn.commit()
@@ -59,13 +70,7 @@ def limpiar_base_datos():
         
         print(f"✅ Se borraron {total_antes} mensajes exitosamente")
         print(f"📊 Mensajes actuales en la base de datos: {total_despues}")
-        
-        # Resetear secuencia de ID (opcional)
-        print()
-        print("🔄 Reseteando secuencia de IDs...")
-        cursor.execute("ALTER SEQUENCE mensajes_mqtt_id_seq RESTART WITH 1;")
-        conn.commit()
-        print("✅ Secuencia de IDs reseteada")
+        print("✅ Estadísticas, resúmenes y secuencia de IDs reiniciados")
         
         cursor.close()
         conn.close()
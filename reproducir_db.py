@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+"""
+Reproducción del historial de mensajes MQTT
+Uso: python reproducir_db.py [opciones]
+o desde el venv: .venv/bin/python reproducir_db.py [opciones]
+
+Lee mensajes guardados y los vuelve a pasar por el camino de ingesta,
+para cargar pruebas con datos reales o rellenar otra base de datos y
+reconstruir sus resúmenes.
+
+Origen:
+- mensajes_mqtt en orden de recepción, con un cursor con nombre (del
+  lado del servidor) que trae REPRODUCIR_ITERSIZE filas por viaje
+- --archivo: un volcado en formato texto de COPY (columnas de
+  COLUMNAS_MENSAJES, opcionalmente .gz) hecho con --exportar o con
+  \\copy desde psql; se lee línea a línea
+
+Destino:
+- broker: publica el JSON guardado en su tópico (con --topico-prefijo
+  para no mezclarlo con el tráfico real). Lo recibe el suscriptor como
+  cualquier mensaje; los mensajes compactos y por lote ya se guardaron
+  separados y en JSON. "enviado_ms" se reescribe con la hora de envío
+  para que el tránsito medido sea el de la reproducción; "seq" se
+  conserva.
+- escritor: encola las filas en un BufferEscritura con el escritor de
+  suscriptor_admin (INGESTA_MODO, deduplicación y estadísticas), sin
+  broker, en la base de datos de DB_NAME. Conserva timestamp_recepcion
+  (o usa la hora actual con --recepcion-actual). Con DEDUP_ACTIVO=1 las
+  filas cuya clave sigue en mensajes_claves se omiten: repetir un
+  relleno reciente no duplica filas.
+  Leyendo de la base de datos hay que indicar el origen con
+  --db-origen y debe ser otra base: las claves de mensajes_claves se
+  purgan pasadas DEDUP_VENTANA_HORAS, así que reescribir el historial
+  en la misma tabla duplicaría filas y resúmenes.
+
+Velocidad:
+- --velocidad N: respeta los intervalos originales entre mensajes
+  divididos por N (1 = tiempo real); --max-pausa acota los huecos
+  largos (noches, caídas)
+- --tasa R: R mensajes por segundo constantes
+- sin ninguna: lo más rápido posible
+Los instantes se calculan en lazo abierto desde el arranque (reloj
+monotónico, como sensores/planificador.py): si el destino se atrasa
+los mensajes siguientes salen apenas se pueda y el atraso se reporta.
+
+La memoria no depende del tamaño del historial: se lee por tandas y
+el destino está acotado (cola del buffer o MAX_PENDIENTES mensajes
+sin confirmar por paho); con el destino lleno se frena la lectura.
+Con el broker se publica solo estando conectado; si no hay conexión ni
+confirmaciones durante ESPERA_BROKER segundos la reproducción se corta.
+
+    python reproducir_db.py --desde 2026-01-01 --hasta 2026-01-02 --velocidad 60 --topico-prefijo replay/
+    python reproducir_db.py --exportar enero.copy.gz --desde 2026-01-01 --hasta 2026-02-01
+    python reproducir_db.py --archivo enero.copy.gz --destino escritor --reconstruir
+    DB_NAME=mqtt_pruebas python reproducir_db.py --db-origen mqtt_taller --destino escritor
+"""
+
+import argparse
+import gzip
+import os
+import re
+import threading
+import time
+from datetime import datetime
+import paho.mqtt.client as mqtt
+import psycopg2
+
+from database.db_config import (
+    crear_conexion, inicializar_pool, obtener_conexion_pool, liberar_conexion_pool, cerrar_pool,
+    ESCRITORES_INGESTA, COLUMNAS_MENSAJES, FilaMensaje, DB_CONFIG
+)
+from database.submuestreo import reconstruir
+from suscriptores.buffer_escritura import BufferEscritura, CAPACIDAD_DEFECTO
+from suscriptores.spool import fila_copy
+from suscriptores.suscriptor_admin import (
+    crear_escritor, INGESTA_MODO, BUFFER_TAM_LOTE, BUFFER_LATENCIA_MAX, BUFFER_HILOS, BUFFER_CAPACIDAD,
+    MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD
+)
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# Filas por viaje del cursor con nombre
+REPRODUCIR_ITERSIZE = int(os.getenv('REPRODUCIR_ITERSIZE', 5000))
+
+# Mensajes publicados sin on_publish; por encima se frena la lectura
+MAX_PENDIENTES = 5000
+
+# Segundos máximos sin conexión al broker o sin confirmaciones
+ESPERA_BROKER = 30
+
+# Segundos que se espera con la cola del buffer llena antes de
+# descartar (solo pasa si la base de datos dejó de responder)
+TIMEOUT_COLA = 300
+
+# Segundos entre reportes de avance
+INTERVALO_REPORTE = 5
+
+# Columnas leídas de mensajes_mqtt: el JSON como texto (sin que
+# psycopg2 lo decodifique) y el valor como float (no Decimal)
+_SELECT_MENSAJES = """
+    SELECT topico, mensaje::text, timestamp_recepcion, sensor_id,
+           valor_numerico::float8, unidad, ip_origen
+    FROM mensajes_mqtt
+"""
+
+_PATRON_ENVIADO = re.compile(r'("enviado_ms":\s*)\d+')
+
+
+# ============================================
+# ORIGEN DE LAS FILAS
+# ============================================
+def _consulta(desde=None, hasta=None, topico=None):
+    """
+    SELECT de mensajes_mqtt en orden de recepción con los filtros pedidos
+
+    Args:
+        desde: Inicio del rango (datetime, incluido)
+        hasta: Fin del rango (datetime, excluido)
+        topico: Patrón de tópico con * como comodín (p. ej. 'clima/*')
+
+    Returns:
+        tuple: (sql, parámetros)
+    """
+    condiciones = []
+    parametros = {}
+    if desde is not None:
+        condiciones.append("timestamp_recepcion >= %(desde)s")
+        parametros['desde'] = desde
+    if hasta is not None:
+        condiciones.append("timestamp_recepcion < %(hasta)s")
+        parametros['hasta'] = hasta
+    if topico:
+        condiciones.append("topico LIKE %(topico)s")
+        parametros['topico'] = topico.replace('*', '%')
+
+    sql = _SELECT_MENSAJES
+    if condiciones:
+        sql += "    WHERE " + " AND ".join(condiciones) + "\n"
+    # Solo timestamp_recepcion: así se recorre idx_timestamp de cada
+    # partición sin ordenar todo el rango en el servidor
+    return sql + "    ORDER BY timestamp_recepcion", parametros
+
+
+def filas_db(desde=None, hasta=None, topico=None, itersize=REPRODUCIR_ITERSIZE, base_datos=None):
+    """
+    Recorre mensajes_mqtt con un cursor del lado del servidor
+
+    La transacción (de solo lectura) queda abierta mientras dura el
+    recorrido: el cursor con nombre vive dentro de ella.
+
+    Args:
+        base_datos: Base de datos de origen (por defecto DB_NAME)
+
+    Yields:
+        FilaMensaje: Filas en orden de timestamp_recepcion
+    """
+    conn = crear_conexion(base_datos)
+    if not conn:
+        raise ConnectionError("No se pudo conectar a PostgreSQL")
+    try:
+        conn.set_session(readonly=True)
+        sql, parametros = _consulta(desde, hasta, topico)
+        cursor = conn.cursor(name='reproducir_mensajes')
+        cursor.itersize = max(1, int(itersize))
+        cursor.execute(sql, parametros)
+        for fila in cursor:
+            yield FilaMensaje(*fila)
+        cursor.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _abrir(ruta, modo):
+    """Abre un volcado de texto, con gzip si termina en .gz"""
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, modo + 't', encoding='utf-8')
+    return open(ruta, modo, encoding='utf-8')
+
+
+def filas_archivo(ruta):
+    """
+    Recorre un volcado en formato texto de COPY línea a línea
+
+    Yields:
+        FilaMensaje: Filas en el orden del archivo
+    """
+    with _abrir(ruta, 'r') as archivo:
+        for linea in archivo:
+            linea = linea.rstrip('\n')
+            # \. es el fin de datos que agregan algunas versiones de psql
+            if linea and linea != '\\.':
+                yield fila_copy(linea)
+
+
+def exportar(ruta, desde=None, hasta=None, topico=None, base_datos=None):
+    """
+    Vuelca mensajes_mqtt a un archivo en formato texto de COPY
+
+    COPY ... TO STDOUT escribe al archivo a medida que el servidor
+    produce las filas, sin pasar por objetos de Python.
+
+    Returns:
+        int: Filas exportadas
+    """
+    conn = crear_conexion(base_datos)
+    if not conn:
+        raise ConnectionError("No se pudo conectar a PostgreSQL")
+    try:
+        conn.set_session(readonly=True)
+        cursor = conn.cursor()
+        sql, parametros = _consulta(desde, hasta, topico)
+        consulta = cursor.mogrify(sql, parametros).decode('utf-8')
+        with _abrir(ruta, 'w') as archivo:
+            cursor.copy_expert(f"COPY ({consulta}) TO STDOUT", archivo)
+        return cursor.rowcount
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+# ============================================
+# RITMO DE REPRODUCCIÓN
+# ============================================
+class Ritmo:
+    """
+    Instantes de envío en lazo abierto sobre el reloj monotónico
+
+    Args:
+        velocidad: Factor sobre los intervalos originales (0 = no respetarlos)
+        tasa: Mensajes por segundo constantes si no hay velocidad (0 = sin límite)
+        max_pausa: Máximo de segundos originales entre dos mensajes (None = sin tope)
+        reloj: Función que retorna segundos monotónicos
+    """
+
+    def __init__(self, velocidad=0.0, tasa=0.0, max_pausa=None, reloj=time.monotonic):
+        self.velocidad = float(velocidad or 0.0)
+        self.tasa = float(tasa or 0.0)
+        self.max_pausa = max_pausa
+        self.reloj = reloj
+        self.inicio = None
+        self.nominal = 0.0
+        self.anterior = None
+        self.atraso = 0.0
+        self.atraso_max = 0.0
+
+    def esperar(self, recepcion):
+        """
+        Espera hasta el instante previsto del próximo mensaje
+
+        Args:
+            recepcion: timestamp_recepcion original del mensaje
+        """
+        if self.inicio is None:
+            self.inicio = self.reloj()
+            self.anterior = recepcion
+            return
+
+        if self.velocidad > 0:
+            # Filas fuera de orden (archivos) salen sin pausa
+            hueco = max(0.0, (recepcion - self.anterior).total_seconds())
+            if self.max_pausa is not None:
+                hueco = min(hueco, self.max_pausa)
+            self.nominal += hueco / self.velocidad
+            self.anterior = max(recepcion, self.anterior)
+        elif self.tasa > 0:
+            self.nominal += 1.0 / self.tasa
+        else:
+            return
+
+        espera = self.inicio + self.nominal - self.reloj()
+        if espera > 0:
+            self.atraso = 0.0
+            time.sleep(espera)
+        else:
+            self.atraso = -espera
+            if self.atraso > self.atraso_max:
+                self.atraso_max = self.atraso
+
+
+# ============================================
+# DESTINOS
+# ============================================
+class DestinoBroker:
+    """
+    Publica cada fila en el broker
+
+    Args:
+        qos: QoS de las publicaciones
+        prefijo: Prefijo agregado a los tópicos
+    """
+
+    def __init__(self, qos=0, prefijo=''):
+        self.qos = qos
+        self.prefijo = prefijo
+        self.enviados = 0
+        self.confirmados = 0
+        self.perdidos = 0
+        self.rechazados = 0
+        self.rc_conexion = None
+        self._conectado = threading.Event()
+        self._lock = threading.Lock()
+        self.cliente = mqtt.Client(client_id=f"reproductor_{os.getpid()}")
+        if MQTT_USERNAME and MQTT_PASSWORD:
+            self.cliente.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        self.cliente.on_connect = self._on_connect
+        self.cliente.on_disconnect = self._on_disconnect
+        self.cliente.on_publish = self._on_publish
+        self.cliente.max_queued_messages_set(0)
+        if qos > 0:
+            self.cliente.max_inflight_messages_set(MAX_PENDIENTES)
+        self.cliente.connect(MQTT_BROKER, MQTT_PORT, 60)
+        self.cliente.loop_start()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.rc_conexion = rc
+        if rc == 0:
+            self._conectado.set()
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._conectado.clear()
+        if self.qos == 0:
+            # paho descarta los QoS 0 sin enviar al reconectar y nunca
+            # llama a on_publish por ellos (los QoS 1/2 los reenvía)
+            with self._lock:
+                self.perdidos += self.enviados - self.confirmados
+                self.enviados = self.confirmados
+
+    def _on_publish(self, client, userdata, mid):
+        with self._lock:
+            self.confirmados += 1
+
+    def _esperar(self, condicion):
+        """Espera a que se cumpla la condición; corta si el broker no avanza en ESPERA_BROKER"""
+        confirmados = self.confirmados
+        limite = time.monotonic() + ESPERA_BROKER
+        while not condicion():
+            if self.confirmados != confirmados:
+                confirmados = self.confirmados
+                limite = time.monotonic() + ESPERA_BROKER
+            elif time.monotonic() > limite:
+                if not self._conectado.is_set():
+                    motivo = mqtt.connack_string(self.rc_conexion) if self.rc_conexion else "sin respuesta"
+                    raise ConnectionError(f"Sin conexión al broker {MQTT_BROKER}:{MQTT_PORT} "
+                                          f"en {ESPERA_BROKER}s ({motivo})")
+                raise ConnectionError(f"El broker no confirmó publicaciones en {ESPERA_BROKER}s "
+                                      f"({self.pendientes()} pendientes)")
+            time.sleep(0.001)
+
+    def enviar(self, fila):
+        """
+        Publica el mensaje de la fila, esperando conexión y sitio entre los pendientes
+
+        Raises:
+            ConnectionError: Si el broker no responde en ESPERA_BROKER segundos
+        """
+        self._esperar(lambda: self._conectado.is_set() and self.pendientes() <= MAX_PENDIENTES)
+        mensaje = fila.mensaje
+        if '"enviado_ms"' in mensaje:
+            mensaje = _PATRON_ENVIADO.sub(rf'\g<1>{int(time.time() * 1000)}', mensaje, count=1)
+        info = self.cliente.publish(self.prefijo + fila.topico, mensaje, qos=self.qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # No entró a la cola de paho: no habrá on_publish
+            self.rechazados += 1
+            return
+        with self._lock:
+            self.enviados += 1
+
+    def pendientes(self):
+        """Publicaciones sin on_publish"""
+        return self.enviados - self.confirmados
+
+    def cerrar(self, timeout=10):
+        """Espera las publicaciones pendientes y desconecta"""
+        limite = time.monotonic() + timeout
+        while self.pendientes() > 0 and self._conectado.is_set() and time.monotonic() < limite:
+            time.sleep(0.05)
+        self.cliente.loop_stop()
+        self.cliente.disconnect()
+
+    def resumen(self):
+        return (f"{self.confirmados} confirmados por el broker, {self.pendientes()} sin confirmar, "
+                f"{self.perdidos} perdidos en desconexiones, {self.rechazados} rechazados por paho")
+
+
+class DestinoEscritor:
+    """
+    Encola cada fila en un BufferEscritura con el escritor del suscriptor
+
+    Args:
+        recepcion_actual: Reemplazar timestamp_recepcion por la hora actual
+    """
+
+    def __init__(self, recepcion_actual=False):
+        self.recepcion_actual = recepcion_actual
+        self.fallidas = 0
+        self.primera = None
+        self.ultima = None
+        guardar = ESCRITORES_INGESTA.get(INGESTA_MODO, ESCRITORES_INGESTA['copy'])
+        self.escritor = crear_escritor(guardar)
+        # Una conexión por hilo escritor y una libre para reconexiones
+        inicializar_pool(BUFFER_HILOS, BUFFER_HILOS + 1)
+        self.buffer = BufferEscritura(
+            self.escritor,
+            tam_lote=BUFFER_TAM_LOTE,
+            latencia_max=BUFFER_LATENCIA_MAX,
+            hilos=BUFFER_HILOS,
+            # Siempre acotada: es lo que frena la lectura
+            capacidad=BUFFER_CAPACIDAD or CAPACIDAD_DEFECTO,
+            politica='bloquear',
+            timeout_bloqueo=TIMEOUT_COLA,
+            conectar=obtener_conexion_pool,
+            liberar=liberar_conexion_pool,
+            al_fallar=self._al_fallar
+        )
+        self.buffer.iniciar()
+
+    def _al_fallar(self, filas, error):
+        self.fallidas += len(filas)
+        print(f"❌ Error al guardar {len(filas)} mensaje(s): {error}")
+
+    def enviar(self, fila):
+        """Encola la fila (bloquea con la cola llena)"""
+        if self.recepcion_actual:
+            fila = fila._replace(timestamp_recepcion=datetime.now())
+        if self.primera is None or fila.timestamp_recepcion < self.primera:
+            self.primera = fila.timestamp_recepcion
+        if self.ultima is None or fila.timestamp_recepcion > self.ultima:
+            self.ultima = fila.timestamp_recepcion
+        self.buffer.agregar(fila)
+
+    def pendientes(self):
+        """Filas en cola"""
+        return self.buffer.pendientes()
+
+    def cerrar(self):
+        """Escribe lo pendiente y detiene los hilos escritores"""
+        self.buffer.detener()
+
+    def resumen(self):
+        metricas = self.buffer.metricas()
+        return (f"{metricas['filas_escritas']} escritas ({self.escritor.__name__}), "
+                f"{metricas['filas_fallidas']} fallidas, {metricas['filas_descartadas']} descartadas")
+
+
+# ============================================
+# REPRODUCCIÓN
+# ============================================
+def reproducir(filas, destino, ritmo, limite=0):
+    """
+    Pasa las filas al destino al ritmo pedido, con reportes de avance
+
+    Args:
+        filas: Iterable de FilaMensaje
+        destino: DestinoBroker o DestinoEscritor
+        ritmo: Ritmo de envío
+        limite: Máximo de filas (0 = todas)
+
+    Returns:
+        tuple: (filas enviadas, segundos)
+    """
+    enviados = 0
+    anterior = 0
+    inicio = ultimo_reporte = time.monotonic()
+    try:
+        for fila in filas:
+            ritmo.esperar(fila.timestamp_recepcion)
+            destino.enviar(fila)
+            enviados += 1
+
+            ahora = time.monotonic()
+            if ahora - ultimo_reporte >= INTERVALO_REPORTE:
+                tasa = (enviados - anterior) / (ahora - ultimo_reporte)
+                anterior = enviados
+                ultimo_reporte = ahora
+                timestamp = datetime.now().strftime('%H:%M:%S')
+                print(f"[{timestamp}] 🔁 Reproducidos: {enviados} | {tasa:.0f} msgs/s | "
+                      f"historial en {fila.timestamp_recepcion:%Y-%m-%d %H:%M:%S} | atraso {ritmo.atraso:.2f}s | "
+                      f"pendientes {destino.pendientes()}")
+            if limite and enviados >= limite:
+                break
+    except KeyboardInterrupt:
+        print("\n\n⏹️  Deteniendo reproducción...")
+    except ConnectionError as e:
+        print(f"\n❌ {e}")
+    return enviados, time.monotonic() - inicio
+
+
+def _fecha(texto):
+    """Tipo de argparse para fechas ISO (2026-01-01 o 2026-01-01T12:00)"""
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {texto}") from None
+
+
+# ============================================
+# FUNCIÓN PRINCIPAL
+# ============================================
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Reproduce el historial de mensajes MQTT")
+    parser.add_argument('--archivo', help="Volcado en formato texto de COPY (.gz opcional) en lugar de la DB")
+    parser.add_argument('--exportar', metavar='ARCHIVO',
+                        help="Solo volcar el rango de mensajes_mqtt al archivo (.gz opcional)")
+    parser.add_argument('--destino', choices=('broker', 'escritor'), default='broker')
+    parser.add_argument('--db-origen', metavar='BASE',
+                        help="Base de datos de la que se lee (por defecto DB_NAME; con --destino "
+                             "escritor es obligatoria y distinta de DB_NAME)")
+    parser.add_argument('--desde', type=_fecha, help="Inicio del rango de recepción (incluido)")
+    parser.add_argument('--hasta', type=_fecha, help="Fin del rango de recepción (excluido)")
+    parser.add_argument('--topico', help="Patrón de tópico con * como comodín (p. ej. 'clima/*')")
+    ritmo = parser.add_mutually_exclusive_group()
+    ritmo.add_argument('--velocidad', type=float, default=0.0,
+                       help="Respetar los intervalos originales, N veces más rápido (1 = tiempo real)")
+    ritmo.add_argument('--tasa', type=float, default=0.0,
+                       help="Mensajes por segundo constantes")
+    parser.add_argument('--max-pausa', type=float,
+                        help="Segundos originales máximos entre mensajes con --velocidad")
+    parser.add_argument('--limite', type=int, default=0, help="Máximo de mensajes (0 = todos)")
+    parser.add_argument('--itersize', type=int, default=REPRODUCIR_ITERSIZE,
+                        help="Filas por viaje del cursor del lado del servidor")
+    parser.add_argument('--qos', type=int, choices=(0, 1), default=0)
+    parser.add_argument('--topico-prefijo', default='',
+                        help="Prefijo para los tópicos publicados (p. ej. 'replay/')")
+    parser.add_argument('--recepcion-actual', action='store_true',
+                        help="Destino escritor: guardar con la hora actual en lugar de la original")
+    parser.add_argument('--reconstruir', action='store_true',
+                        help="Destino escritor: reconstruir el submuestreo del rango escrito al terminar")
+    args = parser.parse_args()
+    if args.velocidad < 0 or args.tasa < 0:
+        parser.error("--velocidad y --tasa deben ser positivas")
+    if args.archivo and (args.exportar or args.desde or args.hasta or args.topico or args.db_origen):
+        parser.error("--archivo no admite --exportar, --desde, --hasta, --topico ni --db-origen")
+    if args.destino == 'escritor' and not args.archivo and not args.exportar \
+            and args.db_origen in (None, DB_CONFIG['database']):
+        parser.error(f"--destino escritor escribe en DB_NAME ({DB_CONFIG['database']}): indicar con "
+                     "--db-origen otra base de datos de origen, o usar --archivo")
+
+    print("=" * 60)
+    print("🔁 REPRODUCCIÓN DEL HISTORIAL MQTT")
+    print("=" * 60)
+
+    if args.exportar:
+        inicio = time.monotonic()
+        filas = exportar(args.exportar, args.desde, args.hasta, args.topico, args.db_origen)
+        tamano = os.path.getsize(args.exportar)
+        print(f"✅ {filas} mensaje(s) exportados a {args.exportar} "
+              f"({tamano / 1024 / 1024:.1f} MB, {time.monotonic() - inicio:.1f}s)")
+        print(f"   Columnas: {', '.join(COLUMNAS_MENSAJES)}")
+        return
+
+    if args.archivo:
+        print(f"📂 Origen: {args.archivo}")
+        filas = filas_archivo(args.archivo)
+    else:
+        rango = f"{args.desde or 'inicio'} → {args.hasta or 'fin'}"
+        print(f"🗄️  Origen: {args.db_origen or DB_CONFIG['database']}.mensajes_mqtt ({rango}, "
+              f"{args.topico or 'todos los tópicos'}, itersize {args.itersize})")
+        filas = filas_db(args.desde, args.hasta, args.topico, args.itersize, args.db_origen)
+
+    if args.velocidad:
+        pausa = f", pausas de hasta {args.max_pausa:g}s" if args.max_pausa is not None else ""
+        print(f"⏱️  Ritmo: intervalos originales a {args.velocidad:g}x{pausa}")
+    elif args.tasa:
+        print(f"⏱️  Ritmo: {args.tasa:g} msgs/s")
+    else:
+        print("⏱️  Ritmo: lo más rápido posible")
+
+    if args.destino == 'broker':
+        print(f"📡 Destino: broker {MQTT_BROKER}:{MQTT_PORT} | QoS {args.qos} | "
+              f"prefijo '{args.topico_prefijo}'")
+        destino = DestinoBroker(args.qos, args.topico_prefijo)
+    else:
+        print(f"📦 Destino: escritor del suscriptor en {DB_CONFIG['database']} "
+              f"(lotes de {BUFFER_TAM_LOTE}, {BUFFER_HILOS} hilos)")
+        destino = DestinoEscritor(args.recepcion_actual)
+    print("=" * 60 + "\n")
+
+    try:
+        enviados, segundos = reproducir(filas, destino, Ritmo(args.velocidad, args.tasa, args.max_pausa),
+                                        args.limite)
+    finally:
+        filas.close()
+        destino.cerrar()
+
+    print(f"\n📊 Total reproducidos: {enviados} en {segundos:.1f}s "
+          f"({enviados / segundos if segundos else 0:.0f} msgs/s)")
+    print(f"   {destino.resumen()}")
+
+    if args.destino == 'escritor' and args.reconstruir and destino.primera is not None:
+        print("🔄 Reconstruyendo submuestreo del rango escrito...")
+        try:
+            periodos = reconstruir(destino.primera, destino.ultima)
+            print(f"✅ Periodos recalculados: {periodos}")
+        except psycopg2.Error as e:
+            print(f"❌ No se pudo reconstruir el submuestreo: {e}")
+    if args.destino == 'escritor':
+        cerrar_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,19 @@
  *   "timestamp": 12345
  * }
  * 
+ * FORMATO COMPACTO (FORMATO_COMPACTO = 1): binario de
+ * sensores/formato_compacto.py publicado en <tópico>/c
+ * (~24 bytes en lugar de ~90)
+ * 
+ * MENSAJE POR LOTE (PUBLICAR_LOTE = 1): todas las lecturas de un
+ * ciclo en un solo JSON a dispositivos/<device_id>/lote
+ * (sensores/formato_lote.py); el suscriptor lo separa en una fila
+ * por sensor con su tópico:
+ * {
+ *   "device_id": "ESP32_01",
+ *   "lecturas": [{"tipo": "temperatura", "valor": 25.5, "unidad": "°C", "timestamp": 12345}, ...]
+ * }
+ * 
  * POTENCIÓMETROS IMPLEMENTADOS (8 sensores):
  * 1. GPIO 1 (ADC1_CH0) -> Temperatura (0-50°C) -> clima/temperatura
  * 2. GPIO 2 (ADC1_CH1) -> Humedad (0-100%) -> clima/humedad
@@ -80,11 +93,34 @@ const char* TOPIC_MOVIMIENTO = "seguridad/movimiento";
 const char* TOPIC_LUZ = "iluminacion/luz";
 const char* TOPIC_STATUS = "sistema/estado";
 
+// ============================================
+// FORMATO COMPACTO (sensores/formato_compacto.py)
+// ============================================
+// 1 = binario en <tópico>/c, 0 = JSON
+#define FORMATO_COMPACTO 0
+#define FORMATO_COMPACTO_VERSION 1
+
+// Mismo orden que TIPOS y ESTADOS en formato_compacto.py (el índice es el código)
+const char* TIPOS_COMPACTO[] = {
+  "temperatura", "humedad", "humo", "luz", "viento", "puerta", "movimiento", "alarma_manual"
+};
+const char* ESTADOS_COMPACTO[] = {
+  "", "normal", "alerta", "abierta", "cerrada", "detectado", "sin_movimiento", "activada"
+};
+
+// ============================================
+// MENSAJE POR LOTE (sensores/formato_lote.py)
+// ============================================
+// 1 = un JSON por ciclo en dispositivos/<device_id>/lote, 0 = un mensaje por sensor
+#define PUBLICAR_LOTE 0
+#define LOTE_BUFFER 1024  // 8 lecturas de ~100 bytes; PubSubClient trae 256 por defecto
+
 // ============================================
 // OBJETOS GLOBALES
 // ============================================
 WiFiClient espClient;
 PubSubClient client(espClient);
+StaticJsonDocument<LOTE_BUFFER> loteDoc;
 
 // ============================================
 // VARIABLES GLOBALES
@@ -128,6 +164,9 @@ void setup() {
   // Configurar MQTT
   client.setServer(mqtt_server, mqtt_port);
   client.setCallback(callback);
+#if PUBLICAR_LOTE
+  client.setBufferSize(LOTE_BUFFER + 64);  // payload + cabecera MQTT y tópico
+#endif
 
   Serial.println("\n✅ Sistema listo");
   digitalWrite(LED_STATUS, HIGH);
@@ -208,10 +247,105 @@ void reconnect() {
   digitalWrite(LED_STATUS, HIGH);
 }
 
+// ============================================
+// PUBLICAR MENSAJE COMPACTO
+// ============================================
+uint8_t codigoCompacto(const char* const* tabla, size_t total, const char* nombre) {
+  for (size_t i = 0; i < total; i++) {
+    if (strcmp(tabla[i], nombre) == 0) return i;
+  }
+  return 0;
+}
+
+void publishSensorCompact(const char* topic, const char* tipo, float valor, const char* estado) {
+  // Cabecera (versión, lecturas) + lectura little-endian:
+  // tipo u8, estado u8, timestamp_ms u64, centésimas i32, largo u8, device_id
+  uint8_t payload[64];
+  size_t largo = strlen(device_id);
+  uint64_t timestamp_ms = millis();  // tiempo desde el arranque, como el JSON
+  int32_t centesimas = lroundf(valor * 100.0f);
+  size_t n = 0;
+
+  payload[n++] = FORMATO_COMPACTO_VERSION;
+  payload[n++] = 1;
+  payload[n++] = codigoCompacto(TIPOS_COMPACTO, 8, tipo);
+  payload[n++] = codigoCompacto(ESTADOS_COMPACTO, 8, estado);
+  memcpy(payload + n, &timestamp_ms, 8);  // el ESP32 es little-endian
+  n += 8;
+  memcpy(payload + n, &centesimas, 4);
+  n += 4;
+  payload[n++] = largo;
+  memcpy(payload + n, device_id, largo);
+  n += largo;
+
+  char topicCompacto[64];
+  snprintf(topicCompacto, sizeof(topicCompacto), "%s/c", topic);
+
+  if (client.publish(topicCompacto, payload, n)) {
+    Serial.print("📤 [");
+    Serial.print(topicCompacto);
+    Serial.print("] ");
+    Serial.print(n);
+    Serial.println(" bytes");
+  } else {
+    Serial.print("❌ Error publicando en: ");
+    Serial.println(topicCompacto);
+  }
+}
+
+// ============================================
+// MENSAJE POR LOTE
+// ============================================
+void iniciarLote() {
+  loteDoc.clear();
+  loteDoc["device_id"] = device_id;
+  loteDoc.createNestedArray("lecturas");
+}
+
+void agregarALote(const char* tipo, float valor, const char* unidad, const char* estado) {
+  JsonObject lectura = loteDoc["lecturas"].createNestedObject();
+  lectura["tipo"] = tipo;
+  lectura["valor"] = valor;
+  lectura["unidad"] = unidad;
+  if (strlen(estado) > 0) {
+    lectura["estado"] = estado;
+  }
+  lectura["timestamp"] = millis() / 1000;
+}
+
+void publicarLote() {
+  char topic[64];
+  snprintf(topic, sizeof(topic), "dispositivos/%s/lote", device_id);
+
+  char buffer[LOTE_BUFFER];
+  size_t n = serializeJson(loteDoc, buffer);
+
+  if (client.publish(topic, (const uint8_t*)buffer, n)) {
+    Serial.print("📦 [");
+    Serial.print(topic);
+    Serial.print("] ");
+    Serial.print(loteDoc["lecturas"].size());
+    Serial.print(" lecturas, ");
+    Serial.print(n);
+    Serial.println(" bytes");
+  } else {
+    Serial.print("❌ Error publicando lote en: ");
+    Serial.println(topic);
+  }
+}
+
 // ============================================
 // PUBLICAR MENSAJE JSON
 // ============================================
 void publishSensor(const char* topic, const char* tipo, float valor, const char* unidad, const char* estado = "") {
+#if PUBLICAR_LOTE
+  agregarALote(tipo, valor, unidad, estado);
+  return;
+#endif
+#if FORMATO_COMPACTO
+  publishSensorCompact(topic, tipo, valor, estado);
+  return;
+#endif
   StaticJsonDocument<256> doc;
   
   // Formato compatible con el simulador y suscriptor_admin.py
@@ -266,6 +400,9 @@ void publishStatus(const char* estado) {
 void readSensors() {
   int adcValue;
   float mappedValue;
+#if PUBLICAR_LOTE
+  iniciarLote();
+#endif
 
   // 1. Potenciómetro Temperatura (0-50°C)
   adcValue = analogRead(TEMP_POT_PIN);
@@ -321,6 +458,10 @@ void readSensors() {
   mappedValue = map(adcValue, 0, ADC_RESOLUTION, 0, 10000) / 100.0; // 0.0 - 100.0 km/h
   publishSensor(TOPIC_VIENTO, "viento", mappedValue, "km/h");
   delay(50);
+
+#if PUBLICAR_LOTE
+  publicarLote();
+#endif
 }
 
 // ============================================
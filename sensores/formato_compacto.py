@@ -0,0 +1,208 @@
+"""
+============================================
+FORMATO BINARIO COMPACTO DE LECTURAS
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Alternativa al JSON de crear_mensaje() (~130 bytes por lectura):
+el tipo, la unidad y el estado viajan como índices en tablas fijas,
+el valor como entero en centésimas y el timestamp en milisegundos.
+Una lectura ocupa 16 bytes más el sensor_id.
+
+Un payload compacto se reconoce por el sufijo '/c' del tópico
+(clima/temperatura/c) o, con MQTT v5, por el content-type
+TIPO_CONTENIDO. El suscriptor lo convierte al mismo JSON que envía el
+simulador, así la fila guardada no depende del formato.
+
+Estructura (little-endian):
+
+    cabecera:  versión (u8), número de lecturas (u8)
+    lectura:   tipo (u8), estado (u8, 0 = sin estado),
+               timestamp en ms (u64), valor en centésimas (i32),
+               largo del sensor_id (u8), sensor_id (UTF-8)
+
+Timestamps menores a EPOCA_MINIMA_MS se interpretan como tiempo
+desde el arranque (ESP32 sin NTP), igual que su JSON.
+
+Las tablas TIPOS y ESTADOS solo crecen al final: cambiar el orden
+cambia el significado de los payloads ya publicados.
+
+Solo usa la biblioteca estándar (lo importan el simulador y el
+suscriptor).
+
+Uso:
+    payload = codificar([('ESP32_01', 'temperatura', 23.5, None, time.time())])
+    for lectura in decodificar(payload):
+        texto = a_json(lectura)
+"""
+
+import json
+import struct
+from collections import namedtuple
+from datetime import datetime
+
+# ============================================
+# CONFIGURACIÓN DEL FORMATO
+# ============================================
+VERSION = 1
+SUFIJO_COMPACTO = '/c'
+TIPO_CONTENIDO = 'application/x-taller-compacto'
+
+CABECERA = struct.Struct('<BB')      # versión, lecturas
+LECTURA = struct.Struct('<BBQiB')    # tipo, estado, timestamp_ms, centésimas, largo sensor_id
+MAX_LECTURAS = 255
+
+# 2000-01-01: valores menores son segundos desde el arranque del dispositivo
+EPOCA_MINIMA_MS = 946684800000
+
+# (tipo, unidad); el índice es el código en el payload
+TIPOS = (
+    ('temperatura', '°C'),
+    ('humedad', '%'),
+    ('humo', '%'),
+    ('luz', '%'),
+    ('viento', 'km/h'),
+    ('puerta', ''),
+    ('movimiento', ''),
+    ('alarma_manual', ''),
+)
+
+# Código 0 = sin estado
+ESTADOS = (
+    None,
+    'normal',
+    'alerta',
+    'abierta',
+    'cerrada',
+    'detectado',
+    'sin_movimiento',
+    'activada',
+)
+
+_CODIGO_TIPO = {tipo: i for i, (tipo, _) in enumerate(TIPOS)}
+_CODIGO_ESTADO = {estado: i for i, estado in enumerate(ESTADOS)}
+
+# Fragmentos JSON ya serializados de a_json(): las tablas son fijas,
+# así solo el sensor_id, el valor y el timestamp se arman por lectura
+_JSON_TIPO = {tipo: f'"tipo": {json.dumps(tipo)}, ' for tipo, _ in TIPOS}
+_JSON_UNIDAD = {unidad: f'"unidad": {json.dumps(unidad)}, ' for _, unidad in TIPOS}
+_JSON_ESTADO = {estado: f', "estado": {json.dumps(estado)}' if estado else '' for estado in ESTADOS}
+_json_sensores = {}
+MAX_SENSORES_JSON = 100000
+
+# Payload mal formado, versión o código desconocido
+ErrorFormato = ValueError
+
+Lectura = namedtuple('Lectura', ['sensor_id', 'tipo', 'valor', 'unidad', 'estado', 'timestamp_ms'])
+
+
+# ============================================
+# CODIFICACIÓN
+# ============================================
+def codificar(lecturas):
+    """
+    Empaqueta lecturas en un payload compacto
+
+    Args:
+        lecturas: Iterable de (sensor_id, tipo, valor, estado, timestamp);
+                  timestamp en segundos (time.time() o desde el arranque)
+
+    Returns:
+        bytes: Payload
+
+    Raises:
+        ValueError: Tipo o estado sin código, valor fuera de rango o más
+                    de MAX_LECTURAS lecturas
+    """
+    partes = []
+    for sensor_id, tipo, valor, estado, timestamp in lecturas:
+        sensor = sensor_id.encode('utf-8')
+        try:
+            codigos = (_CODIGO_TIPO[tipo], _CODIGO_ESTADO[estado or None])
+            partes.append(LECTURA.pack(*codigos, int(round(timestamp * 1000)),
+                                       int(round(valor * 100)), len(sensor)) + sensor)
+        except KeyError as e:
+            raise ErrorFormato(f"Sin código en el formato compacto: {e}") from None
+        except struct.error as e:
+            raise ErrorFormato(f"Lectura fuera de rango ({tipo}={valor}, {sensor_id}): {e}") from None
+    if len(partes) > MAX_LECTURAS:
+        raise ErrorFormato(f"Máximo {MAX_LECTURAS} lecturas por payload")
+    return CABECERA.pack(VERSION, len(partes)) + b''.join(partes)
+
+
+# ============================================
+# DECODIFICACIÓN
+# ============================================
+def decodificar(payload):
+    """
+    Desempaqueta todas las lecturas de un payload compacto
+
+    Returns:
+        list: Lista de Lectura
+
+    Raises:
+        ValueError: Payload truncado, versión o código desconocido
+    """
+    try:
+        version, cantidad = CABECERA.unpack_from(payload, 0)
+        if version != VERSION:
+            raise ErrorFormato(f"Versión de formato compacto desconocida: {version}")
+        lecturas = []
+        posicion = CABECERA.size
+        for _ in range(cantidad):
+            tipo, estado, timestamp_ms, centesimas, largo = LECTURA.unpack_from(payload, posicion)
+            posicion += LECTURA.size
+            sensor = payload[posicion:posicion + largo]
+            if len(sensor) < largo:
+                raise ErrorFormato("sensor_id truncado")
+            posicion += largo
+            nombre, unidad = TIPOS[tipo]
+            lecturas.append(Lectura(sensor.decode('utf-8'), nombre, centesimas / 100, unidad,
+                                    ESTADOS[estado], timestamp_ms))
+    except (struct.error, IndexError) as e:
+        raise ErrorFormato(f"Payload compacto inválido: {e}") from None
+    if posicion != len(payload):
+        raise ErrorFormato(f"{len(payload) - posicion} byte(s) sobrantes en el payload compacto")
+    return lecturas
+
+
+def primera_lectura(payload):
+    """
+    sensor_id y timestamp_ms de la primera lectura, sin decodificar el resto
+
+    Returns:
+        tuple: (sensor_id, timestamp_ms), o None si el payload no trae
+               lecturas o está truncado
+    """
+    try:
+        version, cantidad = CABECERA.unpack_from(payload, 0)
+        _, _, timestamp_ms, _, largo = LECTURA.unpack_from(payload, CABECERA.size)
+    except struct.error:
+        return None
+    if version != VERSION or not cantidad:
+        return None
+    inicio = CABECERA.size + LECTURA.size
+    return bytes(payload[inicio:inicio + largo]), timestamp_ms
+
+
+def a_json(lectura):
+    """
+    JSON canónico de una lectura, con las claves de crear_mensaje()
+
+    Returns:
+        str: Mensaje JSON
+    """
+    if lectura.timestamp_ms >= EPOCA_MINIMA_MS:
+        timestamp = f'"{datetime.fromtimestamp(lectura.timestamp_ms / 1000).isoformat()}"'
+    else:
+        timestamp = lectura.timestamp_ms // 1000
+
+    sensor = _json_sensores.get(lectura.sensor_id)
+    if sensor is None:
+        if len(_json_sensores) >= MAX_SENSORES_JSON:
+            _json_sensores.clear()
+        sensor = _json_sensores[lectura.sensor_id] = json.dumps(lectura.sensor_id)
+
+    # Mismo texto que json.dumps() del diccionario de crear_mensaje()
+    return (f'{{"sensor_id": {sensor}, {_JSON_TIPO[lectura.tipo]}"valor": {lectura.valor!r}, '
+            f'{_JSON_UNIDAD[lectura.unidad]}"timestamp": {timestamp}{_JSON_ESTADO[lectura.estado]}}}')
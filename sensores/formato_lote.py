@@ -0,0 +1,162 @@
+"""
+============================================
+MENSAJES POR LOTE DE UN DISPOSITIVO
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+En lugar de un mensaje por tópico de sensor (7-8 por ciclo), un
+dispositivo puede publicar todas las lecturas de un ciclo, o de
+varios ciclos, en un solo mensaje a dispositivos/<id>/lote.
+
+El suscriptor separa el lote en una fila por lectura, con el tópico
+del sensor (TOPICOS_POR_TIPO) y el mismo JSON que crear_mensaje(), y
+encola las filas juntas para que queden en la misma transacción.
+
+Formatos:
+- JSON en dispositivos/<id>/lote:
+
+    {"sensor_id": "ESP32_01",
+     "lecturas": [{"tipo": "temperatura", "valor": 23.4, "unidad": "°C", "timestamp": ...},
+                  {"tipo": "humo", "valor": 55.0, "unidad": "%", "estado": "alerta", "timestamp": ...}]}
+
+- Compacto en dispositivos/<id>/lote/c: un payload de
+  formato_compacto.py con varias lecturas
+
+Si los tópicos llevan un prefijo (generador_carga.py --topico-prefijo),
+el prefijo delante de dispositivos/ se conserva en los tópicos de las
+lecturas.
+
+Solo usa la biblioteca estándar.
+
+Uso:
+    topico = topico_lote('ESP32_01')
+    texto = crear_lote('ESP32_01', [('temperatura', 23.4, '°C', None, '2026-01-01T00:00:00')])
+    for topico, mensaje, sensor_id, valor, unidad, estado in separar_lote(topico, json.loads(texto)):
+        ...
+"""
+
+import json
+
+# ============================================
+# TÓPICOS
+# ============================================
+SEGMENTO_DISPOSITIVOS = 'dispositivos/'
+SUFIJO_LOTE = '/lote'
+
+# Tópico de cada tipo de lectura (los mismos de TOPICS en sensor_simulator.py)
+TOPICOS_POR_TIPO = {
+    'temperatura': 'clima/temperatura',
+    'humedad': 'clima/humedad',
+    'viento': 'clima/viento',
+    'humo': 'incendio/sensor_humo',
+    'alarma_manual': 'incendio/alarma',
+    'puerta': 'seguridad/puerta',
+    'movimiento': 'seguridad/movimiento',
+    'luz': 'iluminacion/luz',
+}
+
+# Lote JSON sin la estructura esperada
+ErrorLote = ValueError
+
+
+def topico_lote(sensor_id, prefijo=''):
+    """Tópico de lotes del dispositivo"""
+    return f"{prefijo}{SEGMENTO_DISPOSITIVOS}{sensor_id}{SUFIJO_LOTE}"
+
+
+def es_topico_lote(topico):
+    """Indica si el tópico (sin el sufijo /c) es de lotes"""
+    return topico.endswith(SUFIJO_LOTE)
+
+
+def topico_de_lectura(topico, tipo, sensor_id):
+    """
+    Tópico con el que se guarda una lectura de un lote
+
+    Args:
+        topico: Tópico del lote (sin el sufijo /c)
+        tipo: Tipo de la lectura
+        sensor_id: Dispositivo del lote
+
+    Returns:
+        str: Tópico del sensor, con el prefijo del lote si lo tiene;
+             dispositivos/<id>/<tipo> para tipos desconocidos
+    """
+    inicio = topico.rfind(SEGMENTO_DISPOSITIVOS)
+    prefijo = topico[:inicio] if inicio > 0 else ''
+    destino = TOPICOS_POR_TIPO.get(tipo)
+    if destino is None:
+        return f"{prefijo}{SEGMENTO_DISPOSITIVOS}{sensor_id}/{tipo}"
+    return prefijo + destino
+
+
+# ============================================
+# LOTES JSON
+# ============================================
+def crear_lote(sensor_id, lecturas, secuencia=None, enviado_ms=None):
+    """
+    Crea un mensaje de lote JSON
+
+    Args:
+        sensor_id: ID del dispositivo
+        lecturas: Iterable de (tipo, valor, unidad, estado, timestamp)
+        secuencia: "seq" del lote (opcional, ver sensores/instrumentacion.py)
+        enviado_ms: Hora de envío en ms desde epoch (opcional)
+
+    Returns:
+        str: Mensaje JSON
+    """
+    documento = []
+    for tipo, valor, unidad, estado, timestamp in lecturas:
+        lectura = {'tipo': tipo, 'valor': valor, 'unidad': unidad, 'timestamp': timestamp}
+        if estado:
+            lectura['estado'] = estado
+        documento.append(lectura)
+    mensaje = {'sensor_id': sensor_id, 'lecturas': documento}
+    if secuencia is not None:
+        mensaje['seq'] = secuencia
+    if enviado_ms is not None:
+        mensaje['enviado_ms'] = enviado_ms
+    return json.dumps(mensaje)
+
+
+def separar_lote(topico, datos):
+    """
+    Separa un lote JSON ya decodificado en lecturas individuales
+
+    Args:
+        topico: Tópico del lote
+        datos: dict decodificado del payload
+
+    Returns:
+        list: Tuplas (topico, mensaje_texto, sensor_id, valor, unidad, estado);
+              mensaje_texto tiene las claves de crear_mensaje()
+
+    Raises:
+        ValueError: Si el documento no tiene la forma de un lote
+    """
+    try:
+        sensor_id = datos.get('sensor_id') or datos.get('device_id')
+        lecturas = datos['lecturas']
+        if sensor_id is not None and not isinstance(sensor_id, str):
+            sensor_id = str(sensor_id)
+    except (AttributeError, KeyError):
+        raise ErrorLote("El lote debe ser un objeto con 'lecturas'") from None
+    if not isinstance(lecturas, list):
+        raise ErrorLote("'lecturas' debe ser una lista")
+
+    resultado = []
+    for lectura in lecturas:
+        if not isinstance(lectura, dict) or 'tipo' not in lectura:
+            raise ErrorLote("Cada lectura debe ser un objeto con 'tipo'")
+        mensaje = {'sensor_id': sensor_id}
+        mensaje.update(lectura)
+        resultado.append((
+            topico_de_lectura(topico, lectura['tipo'], sensor_id),
+            json.dumps(mensaje),
+            sensor_id,
+            lectura.get('valor'),
+            lectura.get('unidad'),
+            lectura.get('estado')
+        ))
+    return resultado
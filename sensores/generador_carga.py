@@ -0,0 +1,264 @@
+"""
+============================================
+GENERADOR DE CARGA MQTT
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Simula N dispositivos virtuales (10k+) publicando el mismo formato
+que sensor_simulator.py, con los mismos generadores y un estado
+Dispositivo por cada uno.
+
+- Tasa objetivo agregada en mensajes por segundo (todas las
+  conexiones y procesos sumados)
+- Rampa lineal de 0 a la tasa objetivo en --rampa segundos
+- Varios procesos, cada uno con varias conexiones MQTT; los
+  dispositivos se reparten entre procesos y conexiones
+
+Los dispositivos se recorren en orden: cada turno publica el ciclo
+completo de lecturas de un dispositivo (7-8 mensajes), así que cada
+uno publica aproximadamente cada N * 7.5 / tasa segundos.
+
+Con --lote C cada turno publica un solo mensaje por lote del
+dispositivo (dispositivos/<id>/lote, ver formato_lote.py) con C
+ciclos de lecturas, separados PUBLISH_INTERVAL segundos en sus
+timestamps. La tasa se sigue contando en lecturas, así las filas por
+segundo en la base de datos son comparables con y sin lotes.
+
+Uso:
+    python generador_carga.py --dispositivos 10000 --tasa 20000
+    python generador_carga.py --dispositivos 50000 --tasa 50000 --procesos 4 --conexiones 8 --rampa 60
+    python generador_carga.py --dispositivos 10000 --tasa 20000 --lote 1
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import paho.mqtt.client as mqtt
+from datetime import datetime
+
+# Agregar path raíz del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sensores.sensor_simulator import (
+    Dispositivo, generar_lecturas, publicar_lectura, publicar_lote, TOPICS, FORMATO_MENSAJE,
+    PUBLISH_INTERVAL, MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD
+)
+from sensores.formato_compacto import MAX_LECTURAS
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+CARGA_DISPOSITIVOS = int(os.getenv('CARGA_DISPOSITIVOS', 1000))
+CARGA_TASA = float(os.getenv('CARGA_TASA', 5000))
+CARGA_PROCESOS = int(os.getenv('CARGA_PROCESOS', os.cpu_count() or 2))
+CARGA_CONEXIONES = int(os.getenv('CARGA_CONEXIONES', 4))
+
+# Mensajes publicados pero aún no escritos al socket por conexión;
+# por encima se frena la generación en lugar de acumular memoria
+MAX_PENDIENTES = 5000
+
+# Segundos entre reportes agregados
+INTERVALO_REPORTE = 5
+
+
+# ============================================
+# PERFIL DE TASA
+# ============================================
+def mensajes_permitidos(transcurrido, tasa, rampa):
+    """
+    Mensajes que se pueden haber enviado tras 'transcurrido' segundos
+
+    Integral de una tasa que sube linealmente de 0 a 'tasa' durante
+    'rampa' segundos y luego se mantiene constante.
+    """
+    if rampa <= 0:
+        return tasa * transcurrido
+    if transcurrido < rampa:
+        return tasa * transcurrido * transcurrido / (2 * rampa)
+    return tasa * (rampa / 2 + transcurrido - rampa)
+
+
+def tasa_actual(transcurrido, tasa, rampa):
+    """Tasa objetivo en el instante 'transcurrido'"""
+    if rampa <= 0 or transcurrido >= rampa:
+        return tasa
+    return tasa * transcurrido / rampa
+
+
+# ============================================
+# PROCESO PUBLICADOR
+# ============================================
+def _crear_cliente(nombre, qos):
+    """Cliente MQTT con contador de publicaciones confirmadas en userdata"""
+    publicados = [0]
+
+    def on_publish(client, userdata, mid):
+        publicados[0] += 1
+
+    client = mqtt.Client(client_id=nombre, userdata=publicados)
+    if MQTT_USERNAME and MQTT_PASSWORD:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    client.on_publish = on_publish
+    client.max_queued_messages_set(0)
+    if qos > 0:
+        client.max_inflight_messages_set(MAX_PENDIENTES)
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+    return client, publicados
+
+
+def publicador(indice, args, contadores):
+    """
+    Punto de entrada de cada proceso publicador
+
+    Args:
+        indice: Número del proceso
+        args: Argumentos de línea de comandos
+        contadores: multiprocessing.Array con las lecturas enviadas por proceso
+    """
+    dispositivos = [
+        Dispositivo(f"{args.prefijo}_{i:05d}")
+        for i in range(indice, args.dispositivos, args.procesos)
+    ]
+    if not dispositivos:
+        return
+
+    tasa = args.tasa / args.procesos
+    sufijo = random.randint(0, 100000)
+    clientes = [
+        _crear_cliente(f"carga_{indice}_{c}_{sufijo}", args.qos)
+        for c in range(max(1, args.conexiones))
+    ]
+    topicos = {clave: f"{args.topico_prefijo}{topico}" for clave, topico in TOPICS.items()}
+
+    enviados = 0
+    enviados_por_cliente = [0] * len(clientes)
+    turno = 0
+    inicio = time.monotonic()
+    try:
+        while True:
+            transcurrido = time.monotonic() - inicio
+            if args.duracion and transcurrido >= args.duracion:
+                break
+
+            # Publicar solo lo que permite el perfil de tasa
+            if enviados >= mensajes_permitidos(transcurrido, tasa, args.rampa):
+                time.sleep(0.002)
+                continue
+
+            # Cada dispositivo usa siempre la misma conexión (orden por dispositivo)
+            j = turno % len(dispositivos)
+            k = j % len(clientes)
+            client, publicados = clientes[k]
+            if enviados_por_cliente[k] - publicados[0] > MAX_PENDIENTES:
+                time.sleep(0.001)
+                turno += 1
+                continue
+
+            disp = dispositivos[j]
+            if args.lote:
+                ahora = time.time()
+                ciclos = [(generar_lecturas(disp), ahora - (args.lote - 1 - c) * PUBLISH_INTERVAL)
+                          for c in range(args.lote)]
+                publicar_lote(client, ciclos, disp.device_id, args.formato, args.qos,
+                              args.topico_prefijo)
+                enviados += sum(len(lecturas) for lecturas, _ in ciclos)
+                enviados_por_cliente[k] += 1
+            else:
+                for lectura in generar_lecturas(disp):
+                    publicar_lectura(client, topicos[lectura.clave], lectura, disp.device_id,
+                                     args.formato, args.qos)
+                    enviados += 1
+                    enviados_por_cliente[k] += 1
+            contadores[indice] = enviados
+            turno += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        contadores[indice] = enviados
+        for client, _ in clientes:
+            client.loop_stop()
+            client.disconnect()
+
+
+# ============================================
+# FUNCIÓN PRINCIPAL
+# ============================================
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Generador de carga MQTT con dispositivos virtuales")
+    parser.add_argument('--dispositivos', type=int, default=CARGA_DISPOSITIVOS,
+                        help="Número de dispositivos virtuales")
+    parser.add_argument('--tasa', type=float, default=CARGA_TASA,
+                        help="Mensajes por segundo agregados (objetivo)")
+    parser.add_argument('--rampa', type=float, default=0.0,
+                        help="Segundos para subir linealmente hasta la tasa objetivo")
+    parser.add_argument('--duracion', type=float, default=0.0,
+                        help="Segundos de prueba (0 = hasta Ctrl+C)")
+    parser.add_argument('--procesos', type=int, default=CARGA_PROCESOS,
+                        help="Procesos publicadores")
+    parser.add_argument('--conexiones', type=int, default=CARGA_CONEXIONES,
+                        help="Conexiones MQTT por proceso")
+    parser.add_argument('--qos', type=int, choices=(0, 1), default=0)
+    parser.add_argument('--formato', choices=('json', 'compacto'), default=FORMATO_MENSAJE,
+                        help="Formato de los mensajes (compacto: binario en <tópico>/c)")
+    parser.add_argument('--lote', type=int, default=0,
+                        help="Ciclos por mensaje por lote de cada dispositivo (0 = un mensaje por lectura)")
+    parser.add_argument('--prefijo', default='SIM', help="Prefijo del ID de los dispositivos")
+    parser.add_argument('--topico-prefijo', default='',
+                        help="Prefijo para los tópicos (p. ej. 'carga/')")
+    args = parser.parse_args()
+    args.procesos = max(1, min(args.procesos, args.dispositivos))
+    if args.formato == 'compacto' and args.lote * len(TOPICS) > MAX_LECTURAS:
+        parser.error(f"--lote compacto admite hasta {MAX_LECTURAS // len(TOPICS)} ciclos")
+
+    print("=" * 60)
+    print("🏭 GENERADOR DE CARGA MQTT")
+    print("   Universidad Militar Nueva Granada")
+    print("=" * 60)
+    print(f"📡 Broker: {MQTT_BROKER}:{MQTT_PORT}")
+    print(f"🔬 Dispositivos virtuales: {args.dispositivos}")
+    print(f"🎯 Tasa objetivo: {args.tasa:.0f} msgs/s (rampa {args.rampa:.0f}s)")
+    print(f"👷 Procesos: {args.procesos} x {args.conexiones} conexiones | QoS {args.qos} | {args.formato}")
+    if args.lote:
+        print(f"🗃️  Mensajes por lote: {args.lote} ciclo(s) por mensaje (tasa en lecturas/s)")
+    print("=" * 60 + "\n")
+
+    contadores = multiprocessing.Array('q', args.procesos, lock=False)
+    procesos = [
+        multiprocessing.Process(target=publicador, args=(i, args, contadores), name=f"carga_{i}")
+        for i in range(args.procesos)
+    ]
+    for proceso in procesos:
+        proceso.start()
+
+    inicio = time.monotonic()
+    anterior = 0
+    try:
+        while any(p.is_alive() for p in procesos):
+            time.sleep(INTERVALO_REPORTE)
+            enviados = sum(contadores)
+            transcurrido = time.monotonic() - inicio
+            tasa = (enviados - anterior) / INTERVALO_REPORTE
+            anterior = enviados
+            objetivo = tasa_actual(transcurrido, args.tasa, args.rampa)
+            timestamp = datetime.now().strftime('%H:%M:%S')
+            print(f"[{timestamp}] 📤 Enviados: {enviados} | {tasa:.0f} msgs/s (objetivo {objetivo:.0f})")
+    except KeyboardInterrupt:
+        print("\n\n⏹️  Deteniendo generador...")
+    finally:
+        for proceso in procesos:
+            proceso.join(timeout=10)
+            if proceso.is_alive():
+                proceso.terminate()
+
+    segundos = time.monotonic() - inicio
+    enviados = sum(contadores)
+    print(f"\n📊 Total enviados: {enviados} en {segundos:.1f}s ({enviados / segundos:.0f} msgs/s)")
+    print("👋 Generador detenido")
+
+
+if __name__ == "__main__":
+    main()
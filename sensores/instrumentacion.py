@@ -0,0 +1,145 @@
+"""
+============================================
+INSTRUMENTACIÓN DEL CAMINO DE PUBLICACIÓN
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Marcas que el simulador agrega a cada mensaje JSON para medir el
+camino completo:
+
+- "seq": número de secuencia por flujo (dispositivo y tópico),
+  empieza en 0 y crece de a uno. El suscriptor detecta con él los
+  mensajes perdidos (suscriptores/secuencias.py).
+- "enviado_ms": hora de envío en milisegundos desde epoch. El
+  suscriptor calcula el tránsito publicador → broker → suscriptor.
+  Es hora de pared y no monotónica porque se compara en otro proceso.
+
+RastreadorPublicaciones mide en el simulador la latencia de
+publicación de cada mid: de publish() a on_publish(). Con QoS 0
+on_publish llega cuando el mensaje se escribió en el socket; con
+QoS 1, cuando el broker responde PUBACK.
+
+Los histogramas usan sensores/metricas.py (sin dependencias
+externas) y se pueden exponer en /metrics.
+
+Uso:
+    inicio = time.monotonic()
+    info = cliente.publish(topico, crear_mensaje(..., secuencia=secuencias.siguiente(sensor_id, topico)))
+    rastreador.registrar(info.mid, inicio)
+    ...
+    def on_publish(client, userdata, mid):
+        rastreador.confirmar(mid)
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Agregar path raíz del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sensores.metricas import Contador, Histograma
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# mids sin confirmar que se recuerdan (QoS 1 con el broker caído)
+MAX_PENDIENTES = 100000
+
+CUBETAS_PUBLICACION = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                       0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class Secuencias:
+    """
+    Contador de secuencia de cada flujo (sensor_id, tópico)
+
+    Lo usa solo el hilo que publica, por eso no lleva lock.
+    """
+
+    def __init__(self):
+        self._siguientes = {}
+
+    def siguiente(self, sensor_id, topico):
+        """Retorna el seq del próximo mensaje del flujo y lo avanza"""
+        flujo = (sensor_id, topico)
+        seq = self._siguientes.get(flujo, 0)
+        self._siguientes[flujo] = seq + 1
+        return seq
+
+
+def marca_envio():
+    """Hora de envío para "enviado_ms" (ms desde epoch)"""
+    return int(time.time() * 1000)
+
+
+class RastreadorPublicaciones:
+    """
+    Latencia de publish() a on_publish() por mid
+
+    registrar() se llama desde el hilo que publica y confirmar() desde
+    el hilo de red de paho; on_publish puede llegar antes de que
+    publish() retorne, por eso también se guardan las confirmaciones
+    adelantadas.
+
+    Args:
+        prefijo: Prefijo de los nombres de las métricas
+    """
+
+    def __init__(self, prefijo='simulador'):
+        self.histograma = Histograma(f'{prefijo}_publicacion_segundos',
+                                     'publish() a on_publish() (socket con QoS 0, PUBACK con QoS 1)',
+                                     CUBETAS_PUBLICACION)
+        self.sin_confirmar = Contador(f'{prefijo}_publicaciones_sin_confirmar_total',
+                                      'Publicaciones olvidadas sin on_publish (MAX_PENDIENTES)')
+        self._enviados = {}
+        self._adelantados = {}
+        self._lock = threading.Lock()
+        self.latencia_max = 0.0
+
+    def registrar(self, mid, inicio):
+        """
+        Registra una publicación
+
+        Args:
+            mid: mid de MQTTMessageInfo
+            inicio: time.monotonic() tomado antes de publish()
+        """
+        with self._lock:
+            confirmado = self._adelantados.pop(mid, None)
+            if confirmado is None:
+                if len(self._enviados) >= MAX_PENDIENTES:
+                    self._enviados.pop(next(iter(self._enviados)))
+                    self.sin_confirmar.inc()
+                self._enviados[mid] = inicio
+                return
+        self._observar(confirmado - inicio)
+
+    def confirmar(self, mid):
+        """Registra el on_publish de un mid"""
+        ahora = time.monotonic()
+        with self._lock:
+            inicio = self._enviados.pop(mid, None)
+            if inicio is None:
+                if len(self._adelantados) >= MAX_PENDIENTES:
+                    self._adelantados.clear()
+                self._adelantados[mid] = ahora
+                return
+        self._observar(ahora - inicio)
+
+    def _observar(self, segundos):
+        self.histograma.observar(segundos)
+        if segundos > self.latencia_max:
+            self.latencia_max = segundos
+
+    def pendientes(self):
+        """Publicaciones sin on_publish todavía"""
+        with self._lock:
+            return len(self._enviados)
+
+    def reporte(self):
+        """Línea de consola con la latencia de publicación"""
+        resumen = self.histograma.resumen()
+        return (f"📮 Publicación→ack: {resumen['total']} confirmadas, {self.pendientes()} pendientes | "
+                f"medio {resumen['media'] * 1000:.2f} ms, p50 ≤{resumen['p50'] * 1000:g} ms, "
+                f"p99 ≤{resumen['p99'] * 1000:g} ms, máx {self.latencia_max * 1000:.1f} ms")
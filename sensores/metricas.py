@@ -0,0 +1,218 @@
+"""
+============================================
+MÉTRICAS FORMATO PROMETHEUS
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Contadores, medidores e histogramas en memoria, seguros entre
+hilos, expuestos en formato de texto de Prometheus en /metrics del
+servidor HTTP interno (servidor_http.py). Sin dependencias externas.
+
+Las métricas con etiquetas limitan el número de series
+(MAX_SERIES); los valores de etiqueta que exceden el límite se
+acumulan en la serie '_otros'.
+
+Uso:
+    recibidos = Contador('mqtt_mensajes_recibidos_total', 'Mensajes recibidos', ('topico',))
+    recibidos.inc(1, ('clima/temperatura',))
+    iniciar_exportador(9108)
+"""
+
+import math
+import os
+import sys
+import threading
+
+# Agregar path para importar el servidor HTTP
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sensores.servidor_http import registrar_ruta, iniciar_servidor
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+MAX_SERIES = 1000
+ETIQUETA_DESBORDE = '_otros'
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Métricas registradas, en orden de creación
+_registro = []
+_lock_registro = threading.Lock()
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatear(valor):
+    if valor == math.inf:
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+# ============================================
+# TIPOS DE MÉTRICA
+# ============================================
+class _Metrica:
+    """
+    Base de las métricas: nombre, ayuda, etiquetas y series por valor de etiquetas
+
+    Args:
+        nombre: Nombre Prometheus de la métrica
+        ayuda: Descripción (# HELP)
+        etiquetas: Nombres de las etiquetas
+        funcion: Callable sin argumentos que da el valor al exponer (sin etiquetas)
+    """
+    tipo = 'untyped'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.funcion = funcion
+        self._series = {}
+        self._lock = threading.Lock()
+        with _lock_registro:
+            _registro.append(self)
+
+    def _clave(self, valores):
+        """Clave de serie respetando el límite de cardinalidad (llamar con el lock)"""
+        valores = tuple(valores)
+        if valores in self._series or len(self._series) < MAX_SERIES:
+            return valores
+        return (ETIQUETA_DESBORDE,) * len(self.etiquetas)
+
+    def _etiquetas_texto(self, valores, extra=None):
+        pares = [f'{n}="{_escapar(v)}"' for n, v in zip(self.etiquetas, valores)]
+        if extra:
+            pares.append(extra)
+        return '{' + ','.join(pares) + '}' if pares else ''
+
+    def muestras(self):
+        """Líneas de exposición de la métrica (sin HELP/TYPE)"""
+        if self.funcion is not None:
+            return [f"{self.nombre} {_formatear(self.funcion())}"]
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.nombre}{self._etiquetas_texto(v)} {_formatear(x)}" for v, x in series]
+
+    def exponer(self):
+        """Bloque completo en formato de texto Prometheus"""
+        return '\n'.join([f"# HELP {self.nombre} {self.ayuda}",
+                          f"# TYPE {self.nombre} {self.tipo}"] + self.muestras())
+
+
+class Contador(_Metrica):
+    """Valor que solo aumenta"""
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, etiquetas=()):
+        with self._lock:
+            clave = self._clave(etiquetas)
+            self._series[clave] = self._series.get(clave, 0) + cantidad
+
+    def valor(self, etiquetas=()):
+        with self._lock:
+            return self._series.get(tuple(etiquetas), 0)
+
+    def total(self):
+        """Suma de todas las series"""
+        with self._lock:
+            return sum(self._series.values())
+
+
+class Medidor(_Metrica):
+    """Valor que sube y baja (o se calcula al exponer con 'funcion')"""
+    tipo = 'gauge'
+
+    def set(self, valor, etiquetas=()):
+        with self._lock:
+            self._series[self._clave(etiquetas)] = valor
+
+
+class Histograma(_Metrica):
+    """
+    Distribución de observaciones en cubetas acumuladas
+
+    Args:
+        cubetas: Límites superiores (le) en orden creciente; +Inf se agrega solo
+    """
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, cubetas, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.cubetas = tuple(sorted(cubetas)) + (math.inf,)
+
+    def observar(self, valor, etiquetas=()):
+        with self._lock:
+            clave = self._clave(etiquetas)
+            serie = self._series.get(clave)
+            if serie is None:
+                # [conteos por cubeta..., suma, total]
+                serie = self._series[clave] = [0] * len(self.cubetas) + [0.0, 0]
+            for i, limite in enumerate(self.cubetas):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def resumen(self, etiquetas=()):
+        """
+        Conteo, media y percentiles aproximados de una serie (para la consola)
+
+        Returns:
+            dict: total, media, p50 y p99; los percentiles son el límite
+                  superior de su cubeta (inf si caen en la última)
+        """
+        with self._lock:
+            serie = list(self._series.get(tuple(etiquetas), ()))
+        if not serie or not serie[-1]:
+            return {'total': 0, 'media': 0.0, 'p50': 0.0, 'p99': 0.0}
+        total = serie[-1]
+        resultado = {'total': total, 'media': serie[-2] / total}
+        for nombre, fraccion in (('p50', 0.5), ('p99', 0.99)):
+            acumulado = 0
+            for limite, cantidad in zip(self.cubetas, serie):
+                acumulado += cantidad
+                if acumulado >= total * fraccion:
+                    resultado[nombre] = limite
+                    break
+        return resultado
+
+    def muestras(self):
+        with self._lock:
+            series = [(v, list(s)) for v, s in self._series.items()]
+        lineas = []
+        for valores, serie in series:
+            acumulado = 0
+            for i, limite in enumerate(self.cubetas):
+                acumulado += serie[i]
+                le = f'le="{_formatear(float(limite))}"'
+                lineas.append(f"{self.nombre}_bucket{self._etiquetas_texto(valores, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{self._etiquetas_texto(valores)} {_formatear(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{self._etiquetas_texto(valores)} {serie[-1]}")
+        return lineas
+
+
+# ============================================
+# EXPOSICIÓN
+# ============================================
+def exponer_todo():
+    """Texto de todas las métricas registradas"""
+    with _lock_registro:
+        metricas = list(_registro)
+    return '\n'.join(m.exponer() for m in metricas) + '\n'
+
+
+def iniciar_exportador(puerto, host='127.0.0.1'):
+    """
+    Publica /metrics en el servidor HTTP interno
+
+    Returns:
+        bool: True si el servidor quedó escuchando
+    """
+    registrar_ruta('/metrics', lambda parametros: (200, TIPO_CONTENIDO, exponer_todo()))
+    return iniciar_servidor(puerto, host) is not None
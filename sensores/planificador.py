@@ -0,0 +1,250 @@
+"""
+============================================
+PLANIFICADOR DE LLEGADAS A TASA FIJA
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Ejecuta tareas periódicas en lazo abierto: cada tarea tiene una
+secuencia de instantes nominales (reloj monotónico) que no depende de
+cuánto tarda cada ejecución. "publicar y luego dormir el intervalo"
+suma el tiempo de publicación a cada período y la tasa real se
+desvía; aquí el próximo instante se calcula desde el nominal anterior.
+
+Si una ejecución se atrasa (broker lento, GIL, máquina cargada) las
+siguientes no se corren de lugar: se ejecutan apenas se pueda y el
+retraso se mide contra su instante nominal. Así la tasa lograda y el
+retraso reportados muestran la carga que de verdad se generó, sin
+omisión coordinada.
+
+Tipos de llegada (por tarea):
+- 'constante': una ejecución cada 1/tasa segundos
+- 'poisson': intervalos exponenciales de media 1/tasa
+- 'rafaga': 'rafaga' ejecuciones seguidas cada rafaga/tasa segundos
+
+El jitter desplaza cada ejecución al azar hasta ±jitter períodos
+sin acumularse: la tasa media no cambia.
+
+Las tareas pendientes viven en un heap ordenado por instante.
+
+Solo usa la biblioteca estándar.
+
+Uso:
+    planificador = Planificador()
+    planificador.agregar('temperatura', publicar_temperatura, tasa=0.2, llegada='poisson')
+    planificador.ejecutar(duracion=60)
+    print(planificador.reporte())
+"""
+
+import heapq
+import random
+import threading
+import time
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+LLEGADAS = ('constante', 'poisson', 'rafaga')
+
+# Límites (segundos) de los buckets de retraso para el percentil 99
+BUCKETS_RETRASO = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Tarea:
+    """Tarea periódica y sus estadísticas de ejecución"""
+    __slots__ = ('nombre', 'funcion', 'tasa', 'llegada', 'jitter', 'rafaga', 'medir',
+                 'fase', 'nominal', 'en_rafaga', 'ejecuciones', 'retraso_total', 'retraso_max', 'buckets')
+
+    def __init__(self, nombre, funcion, tasa, llegada, jitter, rafaga, medir):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.tasa = tasa
+        self.llegada = llegada
+        self.jitter = jitter
+        self.rafaga = rafaga
+        self.medir = medir
+        self.fase = 0.0
+        self.nominal = 0.0
+        self.en_rafaga = 0
+        self.ejecuciones = 0
+        self.retraso_total = 0.0
+        self.retraso_max = 0.0
+        self.buckets = [0] * (len(BUCKETS_RETRASO) + 1)
+
+    def avanzar(self, aleatorio):
+        """Calcula el próximo instante nominal a partir del anterior"""
+        if self.llegada == 'poisson':
+            self.nominal += aleatorio.expovariate(self.tasa)
+        elif self.llegada == 'rafaga':
+            self.en_rafaga += 1
+            if self.en_rafaga >= self.rafaga:
+                self.en_rafaga = 0
+                self.nominal += self.rafaga / self.tasa
+        else:
+            self.nominal += 1.0 / self.tasa
+
+    def registrar(self, retraso):
+        """Registra una ejecución y el retraso de su inicio respecto al instante previsto"""
+        self.ejecuciones += 1
+        self.retraso_total += retraso
+        if retraso > self.retraso_max:
+            self.retraso_max = retraso
+        for i, limite in enumerate(BUCKETS_RETRASO):
+            if retraso <= limite:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentil_retraso(self, percentil):
+        """Límite superior del bucket que contiene el percentil (None si supera el último)"""
+        objetivo = self.ejecuciones * percentil
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_RETRASO, self.buckets):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return limite
+        return None
+
+
+class Planificador:
+    """
+    Heap de tareas con instantes en reloj monotónico
+
+    Args:
+        semilla: Semilla para las llegadas Poisson y el jitter (opcional)
+        reloj: Función que retorna segundos monotónicos
+    """
+
+    def __init__(self, semilla=None, reloj=time.monotonic):
+        self.reloj = reloj
+        self._aleatorio = random.Random(semilla)
+        self._tareas = []
+        self._heap = []
+        self._secuencia = 0
+        self.inicio = None
+
+    def agregar(self, nombre, funcion, tasa, llegada='constante', jitter=0.0, rafaga=1,
+                fase=0.0, medir=True):
+        """
+        Agrega una tarea periódica
+
+        Args:
+            nombre: Nombre para el reporte
+            funcion: Callable sin argumentos
+            tasa: Ejecuciones por segundo (media)
+            llegada: Tipo de llegada (ver LLEGADAS)
+            jitter: Desplazamiento aleatorio máximo en fracción del período (0-0.5)
+            rafaga: Ejecuciones por ráfaga con llegada 'rafaga'
+            fase: Segundos desde el arranque hasta la primera ejecución
+            medir: Incluir la tarea en metricas() y reporte()
+
+        Returns:
+            Tarea: La tarea agregada
+
+        Raises:
+            ValueError: Tasa no positiva o llegada desconocida
+        """
+        if tasa <= 0:
+            raise ValueError(f"La tasa de '{nombre}' debe ser positiva: {tasa}")
+        if llegada not in LLEGADAS:
+            raise ValueError(f"Tipo de llegada desconocido: {llegada}")
+
+        tarea = Tarea(nombre, funcion, float(tasa), llegada,
+                      min(max(0.0, float(jitter)), 0.5), max(1, int(rafaga)), medir)
+        tarea.fase = float(fase)
+        if self.inicio is not None:
+            tarea.fase += self.reloj() - self.inicio
+        tarea.nominal = tarea.fase
+        self._tareas.append(tarea)
+        if self.inicio is not None:
+            self._programar(tarea)
+        return tarea
+
+    def ejecutar(self, duracion=None, detener=None):
+        """
+        Ejecuta las tareas en el hilo actual
+
+        Args:
+            duracion: Segundos máximos (None = hasta 'detener')
+            detener: threading.Event que termina el bucle al activarlo
+        """
+        detener = detener or threading.Event()
+        if self.inicio is None:
+            self.inicio = self.reloj()
+            for tarea in self._tareas:
+                self._programar(tarea)
+        fin = self.inicio + duracion if duracion else None
+
+        while self._heap and not detener.is_set():
+            instante, _, tarea = self._heap[0]
+            if fin is not None and instante > fin:
+                break
+            espera = instante - self.reloj()
+            if espera > 0 and detener.wait(espera):
+                break
+
+            heapq.heappop(self._heap)
+            tarea.avanzar(self._aleatorio)
+            self._programar(tarea)
+
+            if tarea.medir:
+                tarea.registrar(max(0.0, self.reloj() - instante))
+            tarea.funcion()
+
+    def _programar(self, tarea):
+        """Agrega al heap la próxima ejecución de la tarea, con jitter"""
+        instante = self.inicio + tarea.nominal
+        if tarea.jitter:
+            instante += self._aleatorio.uniform(-tarea.jitter, tarea.jitter) / tarea.tasa
+        self._secuencia += 1
+        heapq.heappush(self._heap, (instante, self._secuencia, tarea))
+
+    # ============================================
+    # REPORTE
+    # ============================================
+    def metricas(self):
+        """
+        Tasa objetivo y lograda y retraso de cada tarea medida
+
+        Returns:
+            list: Un dict por tarea (nombre, tasa_objetivo, tasa_lograda,
+                  ejecuciones, retraso_medio, retraso_p99, retraso_max)
+        """
+        transcurrido = self.reloj() - self.inicio if self.inicio is not None else 0.0
+        resultado = []
+        for tarea in self._tareas:
+            if not tarea.medir:
+                continue
+            # La tasa de cada tarea se cuenta desde su primera ejecución prevista
+            activa = transcurrido - tarea.fase
+            resultado.append({
+                'nombre': tarea.nombre,
+                'tasa_objetivo': tarea.tasa,
+                'tasa_lograda': tarea.ejecuciones / activa if activa > 0 else 0.0,
+                'ejecuciones': tarea.ejecuciones,
+                'retraso_medio': tarea.retraso_total / tarea.ejecuciones if tarea.ejecuciones else 0.0,
+                'retraso_p99': tarea.percentil_retraso(0.99),
+                'retraso_max': tarea.retraso_max
+            })
+        return resultado
+
+    def reporte(self):
+        """Tabla de tasa lograda vs objetivo y retrasos, para la consola"""
+        metricas = self.metricas()
+        lineas = []
+        for m in metricas:
+            p99 = f"≤{m['retraso_p99'] * 1000:g} ms" if m['retraso_p99'] is not None \
+                else f">{BUCKETS_RETRASO[-1]:g} s"
+            lineas.append(
+                f"   {m['nombre']:<14} {m['tasa_lograda']:8.3f}/{m['tasa_objetivo']:.3f} por s "
+                f"({_porcentaje(m['tasa_lograda'], m['tasa_objetivo'])}) | retraso medio "
+                f"{m['retraso_medio'] * 1000:.1f} ms, p99 {p99}, máx {m['retraso_max'] * 1000:.1f} ms"
+            )
+        objetivo = sum(m['tasa_objetivo'] for m in metricas)
+        lograda = sum(m['tasa_lograda'] for m in metricas)
+        lineas.append(f"   {'TOTAL':<14} {lograda:8.3f}/{objetivo:.3f} por s "
+                      f"({_porcentaje(lograda, objetivo)})")
+        return "\n".join(lineas)
+
+
+def _porcentaje(lograda, objetivo):
+    return f"{100 * lograda / objetivo:.1f}%" if objetivo else "-"
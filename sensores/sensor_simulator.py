@@ -7,6 +7,27 @@ Taller Comunicaciones - Universidad Militar Nueva Granada
 Este script simula 7 sensores publicando datos a un broker MQTT
 en 5 tópicos diferentes. Útil para pruebas sin hardware físico.
 
+El estado de los sensores digitales vive en un objeto Dispositivo,
+así generador_carga.py reutiliza los mismos generadores para miles
+de dispositivos virtuales.
+
+Con FORMATO_MENSAJE=compacto publica el formato binario de
+formato_compacto.py en <tópico>/c en lugar de JSON.
+
+Con PUBLICAR_LOTE=1 publica cada CICLOS_POR_LOTE ciclos un solo
+mensaje con todas las lecturas en dispositivos/<id>/lote (ver
+formato_lote.py) en lugar de un mensaje por sensor.
+
+Las publicaciones las programa planificador.py en lazo abierto: cada
+sensor tiene su tasa (PUBLISH_INTERVAL o PERIODOS_SENSORES) y sus
+instantes no se corren aunque una publicación se atrase. El tipo de
+llegada (LLEGADA_MENSAJES) y el jitter son configurables, y cada
+INTERVALO_REPORTE segundos se muestra la tasa lograda vs objetivo.
+
+Los mensajes JSON llevan "seq" y "enviado_ms" para que el suscriptor
+mida el tránsito y los mensajes perdidos, y el simulador mide la
+latencia de publish() a on_publish() por mid (ver instrumentacion.py).
+
 Uso:
     python sensor_simulator.py
 """
@@ -15,10 +36,20 @@ import paho.mqtt.client as mqtt
 import json
 import time
 import random
+from collections import namedtuple
 from datetime import datetime
 import os
+import sys
 from dotenv import load_dotenv
 
+# Agregar path raíz del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sensores.formato_compacto import codificar, SUFIJO_COMPACTO
+from sensores.formato_lote import crear_lote, topico_lote
+from sensores.planificador import Planificador, LLEGADAS
+from sensores.instrumentacion import Secuencias, RastreadorPublicaciones, marca_envio
+from sensores.metricas import iniciar_exportador
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -31,8 +62,42 @@ MQTT_USERNAME = os.getenv('MQTT_USERNAME', '')
 MQTT_PASSWORD = os.getenv('MQTT_PASSWORD', '')
 DEVICE_ID = os.getenv('DEVICE_ID', 'SIMULATOR_01')
 
-# Intervalo de publicación (segundos)
-PUBLISH_INTERVAL = 5
+# Intervalo de publicación de cada sensor (segundos)
+PUBLISH_INTERVAL = float(os.getenv('PUBLISH_INTERVAL', 5))
+
+# Períodos propios de algunos sensores, p. ej. "temperatura=1,humo=0.5"
+PERIODOS_SENSORES = os.getenv('PERIODOS_SENSORES', '')
+
+# Desfase entre los sensores de un mismo dispositivo (segundos)
+PAUSA_ENTRE_SENSORES = 0.1
+
+# Llegadas: constante | poisson | rafaga (ver planificador.py)
+LLEGADA_MENSAJES = os.getenv('LLEGADA_MENSAJES', 'constante').lower()
+
+# Desplazamiento aleatorio de cada publicación, en fracción del período (0-0.5)
+JITTER_MENSAJES = float(os.getenv('JITTER_MENSAJES', 0))
+
+# Publicaciones seguidas por ráfaga con LLEGADA_MENSAJES=rafaga
+RAFAGA_MENSAJES = int(os.getenv('RAFAGA_MENSAJES', 5))
+
+# Segundos entre reportes de tasa lograda vs objetivo
+INTERVALO_REPORTE = 60
+
+# QoS de las publicaciones (con 1 la latencia de publicación incluye el PUBACK)
+QOS_PUBLICACION = int(os.getenv('SIMULADOR_QOS', 0))
+
+# Puerto HTTP para /metrics del simulador (0 = deshabilitado) e interfaz
+SIMULADOR_METRICAS_PUERTO = int(os.getenv('SIMULADOR_METRICAS_PUERTO', 0))
+METRICAS_HOST = os.getenv('METRICAS_HOST', '127.0.0.1')
+
+# Formato de los mensajes: json | compacto (ver formato_compacto.py)
+FORMATO_MENSAJE = os.getenv('FORMATO_MENSAJE', 'json').lower()
+
+# Publicar todas las lecturas del dispositivo en un mensaje por lote (1 = sí, 0 = no)
+PUBLICAR_LOTE = os.getenv('PUBLICAR_LOTE', '0') == '1'
+
+# Ciclos de lectura que se juntan en cada mensaje por lote
+CICLOS_POR_LOTE = max(1, int(os.getenv('CICLOS_POR_LOTE', 1)))
 
 # ============================================
 # TÓPICOS MQTT
@@ -48,6 +113,23 @@ TOPICS = {
     'movimiento': 'seguridad/movimiento'
 }
 
+# ============================================
+# ESTADO DE DISPOSITIVOS
+# ============================================
+class Dispositivo:
+    """Estado de los sensores digitales de un dispositivo simulado"""
+    __slots__ = ('device_id', 'puerta_abierta', 'movimiento_detectado', 'alarma_activa')
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.puerta_abierta = False
+        self.movimiento_detectado = False
+        self.alarma_activa = False
+
+
+# Lectura de un sensor: clave en TOPICS, tipo, valor, unidad y estado opcional
+Lectura = namedtuple('Lectura', ['clave', 'tipo', 'valor', 'unidad', 'estado'])
+
 # ============================================
 # VARIABLES GLOBALES
 # ============================================
@@ -55,10 +137,15 @@ client = None
 connected = False
 message_count = 0
 
-# Estados de sensores digitales
-puerta_abierta = False
-movimiento_detectado = False
-alarma_activa = False
+# Dispositivo simulado en modo interactivo
+dispositivo = Dispositivo(DEVICE_ID)
+
+# Ciclos acumulados para el próximo mensaje por lote
+ciclos_pendientes = []
+
+# seq por flujo y latencia de publicación por mid
+secuencias = Secuencias()
+rastreador = RastreadorPublicaciones()
 
 # ============================================
 # CALLBACKS MQTT
@@ -87,6 +174,7 @@ def on_publish(client, userdata, mid):
     """Callback al publicar un mensaje"""
     global message_count
     message_count += 1
+    rastreador.confirmar(mid)
 
 
 # ============================================
@@ -129,36 +217,96 @@ def generar_viento():
     return round(random.uniform(0, 50), 1)
 
 
-def generar_puerta():
+def generar_puerta(disp):
     """Simula cambio de estado de puerta"""
-    global puerta_abierta
     if random.random() < 0.1:  # 10% probabilidad de cambio
-        puerta_abierta = not puerta_abierta
-    return puerta_abierta
+        disp.puerta_abierta = not disp.puerta_abierta
+    return disp.puerta_abierta
 
 
-def generar_movimiento():
+def generar_movimiento(disp):
     """Simula detección de movimiento"""
-    global movimiento_detectado
     if random.random() < 0.15:  # 15% probabilidad de cambio
-        movimiento_detectado = not movimiento_detectado
-    return movimiento_detectado
+        disp.movimiento_detectado = not disp.movimiento_detectado
+    return disp.movimiento_detectado
 
 
-def generar_alarma():
+def generar_alarma(disp):
     """Simula activación de alarma manual"""
-    global alarma_activa
     if random.random() < 0.02:  # 2% probabilidad de activación
-        alarma_activa = True
-    elif alarma_activa and random.random() < 0.5:
-        alarma_activa = False
-    return alarma_activa
+        disp.alarma_activa = True
+    elif disp.alarma_activa and random.random() < 0.5:
+        disp.alarma_activa = False
+    return disp.alarma_activa
+
+
+def _lectura_humo(disp):
+    humo = generar_humo()
+    return Lectura('humo', 'humo', humo, '%', 'alerta' if humo > 50 else 'normal')
+
+
+def _lectura_puerta(disp):
+    puerta = generar_puerta(disp)
+    return Lectura('puerta', 'puerta', 1 if puerta else 0, '', 'abierta' if puerta else 'cerrada')
+
+
+def _lectura_movimiento(disp):
+    movimiento = generar_movimiento(disp)
+    return Lectura('movimiento', 'movimiento', 1 if movimiento else 0, '',
+                   'detectado' if movimiento else 'sin_movimiento')
+
+
+def _lectura_alarma(disp):
+    return Lectura('alarma', 'alarma_manual', 1, '', 'activada') if generar_alarma(disp) else None
+
+
+# Generador de lectura de cada sensor (clave en TOPICS), en orden de publicación
+GENERADORES = {
+    'temperatura': lambda disp: Lectura('temperatura', 'temperatura', generar_temperatura(), '°C', None),
+    'humedad': lambda disp: Lectura('humedad', 'humedad', generar_humedad(), '%', None),
+    'humo': _lectura_humo,
+    'luz': lambda disp: Lectura('luz', 'luz', generar_luz(), '%', None),
+    'viento': lambda disp: Lectura('viento', 'viento', generar_viento(), 'km/h', None),
+    'puerta': _lectura_puerta,
+    'movimiento': _lectura_movimiento,
+    'alarma': _lectura_alarma,
+}
+
+
+def generar_lectura(disp, clave):
+    """
+    Genera la lectura de un solo sensor de un dispositivo
+    
+    Args:
+        disp: Dispositivo (su estado digital se actualiza)
+        clave: Clave del sensor en TOPICS
+    
+    Returns:
+        Lectura: La lectura, o None para la alarma si no está activa
+    """
+    return GENERADORES[clave](disp)
+
+
+def generar_lecturas(disp):
+    """
+    Genera un ciclo completo de lecturas de un dispositivo
+    
+    Args:
+        disp: Dispositivo (su estado digital se actualiza)
+    
+    Returns:
+        list: Lecturas en orden de publicación (la alarma solo si está activa)
+    """
+    lecturas = [generar(disp) for generar in GENERADORES.values()]
+    if lecturas[-1] is None:
+        lecturas.pop()
+    return lecturas
 
 
 # ============================================
 # PUBLICACIÓN DE MENSAJES
 # ============================================
-def crear_mensaje(tipo, valor, unidad, estado=None):
+def crear_mensaje(tipo, valor, unidad, estado=None, sensor_id=None, secuencia=None):
     """
     Crea un mensaje JSON para publicar
     
@@ -167,12 +315,14 @@ def crear_mensaje(tipo, valor, unidad, estado=None):
         valor: Valor medido
         unidad: Unidad de medida
         estado: Estado adicional (opcional)
+        sensor_id: ID del dispositivo (por defecto DEVICE_ID)
+        secuencia: "seq" del flujo; con él se agregan "seq" y "enviado_ms"
     
     Returns:
         str: Mensaje JSON
     """
     mensaje = {
-        'sensor_id': DEVICE_ID,
+        'sensor_id': sensor_id or DEVICE_ID,
         'tipo': tipo,
         'valor': valor,
         'unidad': unidad,
@@ -182,11 +332,136 @@ def crear_mensaje(tipo, valor, unidad, estado=None):
     if estado:
         mensaje['estado'] = estado
     
+    if secuencia is not None:
+        mensaje['seq'] = secuencia
+        mensaje['enviado_ms'] = marca_envio()
+    
     return json.dumps(mensaje)
 
 
+def crear_mensaje_compacto(tipo, valor, estado=None, sensor_id=None):
+    """
+    Crea el mismo mensaje en formato binario compacto
+    
+    Args:
+        tipo: Tipo de sensor (debe estar en formato_compacto.TIPOS)
+        valor: Valor medido
+        estado: Estado adicional (opcional)
+        sensor_id: ID del dispositivo (por defecto DEVICE_ID)
+    
+    Returns:
+        bytes: Payload para <tópico>/c
+    """
+    return codificar([(sensor_id or DEVICE_ID, tipo, valor, estado, time.time())])
+
+
+def publicar_lectura(cliente, topico, lectura, sensor_id, formato=FORMATO_MENSAJE, qos=0,
+                     rastreo=None):
+    """
+    Publica una lectura en el formato elegido
+    
+    Los mensajes JSON llevan "seq" (por sensor_id y tópico) y "enviado_ms".
+    
+    Args:
+        cliente: Cliente MQTT conectado
+        topico: Tópico del sensor (sin sufijo)
+        lectura: Lectura de generar_lecturas()
+        sensor_id: ID del dispositivo
+        formato: 'json' o 'compacto'
+        qos: QoS de la publicación
+        rastreo: RastreadorPublicaciones para medir hasta on_publish (opcional)
+    
+    Returns:
+        MQTTMessageInfo: Resultado de publish()
+    """
+    if formato == 'compacto':
+        topico += SUFIJO_COMPACTO
+        payload = crear_mensaje_compacto(lectura.tipo, lectura.valor, lectura.estado, sensor_id)
+    else:
+        payload = crear_mensaje(lectura.tipo, lectura.valor, lectura.unidad, lectura.estado, sensor_id,
+                                secuencias.siguiente(sensor_id, topico))
+    return _publicar(cliente, topico, payload, qos, rastreo)
+
+
+def _publicar(cliente, topico, payload, qos, rastreo):
+    """publish() registrando el mid en el rastreador si hay uno"""
+    if rastreo is None:
+        return cliente.publish(topico, payload, qos=qos)
+    inicio = time.monotonic()
+    info = cliente.publish(topico, payload, qos=qos)
+    rastreo.registrar(info.mid, inicio)
+    return info
+
+
+def publicar_lote(cliente, ciclos, sensor_id, formato=FORMATO_MENSAJE, qos=0, prefijo='',
+                  rastreo=None):
+    """
+    Publica uno o varios ciclos de lecturas en un solo mensaje por lote
+    
+    Args:
+        cliente: Cliente MQTT conectado
+        ciclos: Lista de (lecturas, timestamp); lecturas de generar_lecturas()
+                y timestamp en segundos (time.time()) del ciclo
+        sensor_id: ID del dispositivo
+        formato: 'json' o 'compacto'
+        qos: QoS de la publicación
+        prefijo: Prefijo del tópico (generador_carga.py --topico-prefijo)
+        rastreo: RastreadorPublicaciones para medir hasta on_publish (opcional)
+    
+    Returns:
+        MQTTMessageInfo: Resultado de publish()
+    """
+    topico = topico_lote(sensor_id, prefijo)
+    if formato == 'compacto':
+        payload = codificar((sensor_id, lectura.tipo, lectura.valor, lectura.estado, timestamp)
+                            for lecturas, timestamp in ciclos for lectura in lecturas)
+        return _publicar(cliente, topico + SUFIJO_COMPACTO, payload, qos, rastreo)
+    payload = crear_lote(sensor_id, [
+        (lectura.tipo, lectura.valor, lectura.unidad, lectura.estado,
+         datetime.fromtimestamp(timestamp).isoformat())
+        for lecturas, timestamp in ciclos for lectura in lecturas
+    ], secuencias.siguiente(sensor_id, topico), marca_envio())
+    return _publicar(cliente, topico, payload, qos, rastreo)
+
+
+def describir_lectura(lectura):
+    """Línea de consola para una lectura publicada"""
+    topico = TOPICS[lectura.clave]
+    valor, estado = lectura.valor, lectura.estado
+    if lectura.clave == 'temperatura':
+        return f"🌡️  Temperatura: {valor}°C -> {topico}"
+    if lectura.clave == 'humedad':
+        return f"💧 Humedad: {valor}% -> {topico}"
+    if lectura.clave == 'humo':
+        icono = '🔥' if valor > 50 else '✅'
+        return f"{icono} Humo: {valor}% ({estado}) -> {topico}"
+    if lectura.clave == 'luz':
+        return f"💡 Luz: {valor}% -> {topico}"
+    if lectura.clave == 'viento':
+        return f"🌬️  Viento: {valor} km/h -> {topico}"
+    if lectura.clave == 'puerta':
+        return f"{'🔓' if valor else '🔒'} Puerta: {estado} -> {topico}"
+    if lectura.clave == 'movimiento':
+        return f"{'🚶' if valor else '🚫'} Movimiento: {estado} -> {topico}"
+    return f"🚨 ALARMA ACTIVADA -> {topico}"
+
+
+def publicar_sensor(clave):
+    """Publica la lectura de un sensor"""
+    if not connected:
+        print("⚠️ No conectado. Esperando conexión...")
+        return
+    
+    lectura = generar_lectura(dispositivo, clave)
+    if lectura is None:
+        return
+    publicar_lectura(client, TOPICS[lectura.clave], lectura, dispositivo.device_id,
+                     qos=QOS_PUBLICACION, rastreo=rastreador)
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {describir_lectura(lectura)}")
+
+
 def publicar_sensores():
-    """Publica datos de todos los sensores"""
+    """Publica un ciclo con todos los sensores"""
     if not connected:
         print("⚠️ No conectado. Esperando conexión...")
         return
@@ -195,73 +470,92 @@ def publicar_sensores():
     print(f"📊 Publicando sensores - {datetime.now().strftime('%H:%M:%S')}")
     print(f"{'='*60}")
     
-    # 1. Temperatura
-    temp = generar_temperatura()
-    mensaje = crear_mensaje('temperatura', temp, '°C')
-    result = client.publish(TOPICS['temperatura'], mensaje)
-    print(f"🌡️  Temperatura: {temp}°C -> {TOPICS['temperatura']}")
+    lecturas = generar_lecturas(dispositivo)
+    if PUBLICAR_LOTE:
+        ciclos_pendientes.append((lecturas, time.time()))
+        for lectura in lecturas:
+            print(describir_lectura(lectura))
+        if len(ciclos_pendientes) < CICLOS_POR_LOTE:
+            print(f"\n⏳ Ciclo {len(ciclos_pendientes)}/{CICLOS_POR_LOTE} del lote")
+            return
+        publicar_lote(client, ciclos_pendientes, dispositivo.device_id, qos=QOS_PUBLICACION,
+                      rastreo=rastreador)
+        print(f"\n📦 Lote de {sum(len(l) for l, _ in ciclos_pendientes)} lecturas "
+              f"-> {topico_lote(dispositivo.device_id)}")
+        ciclos_pendientes.clear()
+    else:
+        for lectura in lecturas:
+            publicar_lectura(client, TOPICS[lectura.clave], lectura, dispositivo.device_id,
+                             qos=QOS_PUBLICACION, rastreo=rastreador)
+            print(describir_lectura(lectura))
     
-    time.sleep(0.1)
+    print(f"\n✅ Total de mensajes publicados: {message_count}")
+
+
+# ============================================
+# PLANIFICACIÓN
+# ============================================
+def leer_periodos(texto):
+    """
+    Lee PERIODOS_SENSORES
     
-    # 2. Humedad
-    hum = generar_humedad()
-    mensaje = crear_mensaje('humedad', hum, '%')
-    client.publish(TOPICS['humedad'], mensaje)
-    print(f"💧 Humedad: {hum}% -> {TOPICS['humedad']}")
+    Args:
+        texto: "clave=segundos,..." con claves de TOPICS
     
-    time.sleep(0.1)
+    Returns:
+        dict: clave -> período en segundos
     
-    # 3. Humo
-    humo = generar_humo()
-    estado = 'alerta' if humo > 50 else 'normal'
-    mensaje = crear_mensaje('humo', humo, '%', estado)
-    client.publish(TOPICS['humo'], mensaje)
-    icono = '🔥' if humo > 50 else '✅'
-    print(f"{icono} Humo: {humo}% ({estado}) -> {TOPICS['humo']}")
-    
-    time.sleep(0.1)
-    
-    # 4. Luz
-    luz = generar_luz()
-    mensaje = crear_mensaje('luz', luz, '%')
-    client.publish(TOPICS['luz'], mensaje)
-    print(f"💡 Luz: {luz}% -> {TOPICS['luz']}")
-    
-    time.sleep(0.1)
-    
-    # 5. Viento
-    viento = generar_viento()
-    mensaje = crear_mensaje('viento', viento, 'km/h')
-    client.publish(TOPICS['viento'], mensaje)
-    print(f"🌬️  Viento: {viento} km/h -> {TOPICS['viento']}")
-    
-    time.sleep(0.1)
-    
-    # 6. Puerta
-    puerta = generar_puerta()
-    estado = 'abierta' if puerta else 'cerrada'
-    mensaje = crear_mensaje('puerta', 1 if puerta else 0, '', estado)
-    client.publish(TOPICS['puerta'], mensaje)
-    icono = '🔓' if puerta else '🔒'
-    print(f"{icono} Puerta: {estado} -> {TOPICS['puerta']}")
-    
-    time.sleep(0.1)
-    
-    # 7. Movimiento
-    movimiento = generar_movimiento()
-    estado = 'detectado' if movimiento else 'sin_movimiento'
-    mensaje = crear_mensaje('movimiento', 1 if movimiento else 0, '', estado)
-    client.publish(TOPICS['movimiento'], mensaje)
-    icono = '🚶' if movimiento else '🚫'
-    print(f"{icono} Movimiento: {estado} -> {TOPICS['movimiento']}")
-    
-    # 8. Alarma (solo si está activa)
-    if generar_alarma() and alarma_activa:
-        mensaje = crear_mensaje('alarma_manual', 1, '', 'activada')
-        client.publish(TOPICS['alarma'], mensaje)
-        print(f"🚨 ALARMA ACTIVADA -> {TOPICS['alarma']}")
+    Raises:
+        ValueError: Clave desconocida o período no positivo
+    """
+    periodos = {}
+    for parte in texto.split(','):
+        if not parte.strip():
+            continue
+        clave, _, segundos = parte.partition('=')
+        clave = clave.strip()
+        if clave not in GENERADORES:
+            raise ValueError(f"Sensor desconocido en PERIODOS_SENSORES: {clave}")
+        periodos[clave] = float(segundos)
+        if periodos[clave] <= 0:
+            raise ValueError(f"Período no positivo en PERIODOS_SENSORES: {parte}")
+    return periodos
+
+
+def crear_planificador():
+    """
+    Programa las publicaciones del dispositivo
     
-    print(f"\n✅ Total de mensajes publicados: {message_count}")
+    Con PUBLICAR_LOTE una tarea publica el ciclo completo cada
+    PUBLISH_INTERVAL; si no, cada sensor es una tarea con su período,
+    desfasadas PAUSA_ENTRE_SENSORES entre sí.
+    
+    Returns:
+        Planificador: Listo para ejecutar()
+    """
+    planificador = Planificador()
+    opciones = {'llegada': LLEGADA_MENSAJES, 'jitter': JITTER_MENSAJES, 'rafaga': RAFAGA_MENSAJES}
+    if PUBLICAR_LOTE:
+        planificador.agregar('dispositivo', publicar_sensores, 1 / PUBLISH_INTERVAL, **opciones)
+    else:
+        periodos = leer_periodos(PERIODOS_SENSORES)
+        for i, clave in enumerate(GENERADORES):
+            periodo = periodos.get(clave, PUBLISH_INTERVAL)
+            planificador.agregar(clave, lambda clave=clave: publicar_sensor(clave), 1 / periodo,
+                                 fase=i * PAUSA_ENTRE_SENSORES, **opciones)
+    planificador.agregar('reporte', lambda: mostrar_reporte(planificador), 1 / INTERVALO_REPORTE,
+                         fase=INTERVALO_REPORTE, medir=False)
+    return planificador
+
+
+def mostrar_reporte(planificador):
+    """Muestra la tasa lograda vs objetivo de cada tarea"""
+    print(f"\n{'='*60}")
+    print(f"📈 Tasa lograda / objetivo - {datetime.now().strftime('%H:%M:%S')}")
+    print(planificador.reporte())
+    print(rastreador.reporte())
+    print(f"✅ Total de mensajes publicados: {message_count}")
+    print(f"{'='*60}\n")
 
 
 # ============================================
@@ -277,9 +571,21 @@ def main():
     print("=" * 60)
     print(f"📡 Broker: {MQTT_BROKER}:{MQTT_PORT}")
     print(f"🆔 Device ID: {DEVICE_ID}")
-    print(f"⏱️  Intervalo: {PUBLISH_INTERVAL}s")
+    print(f"⏱️  Intervalo: {PUBLISH_INTERVAL}s | llegadas {LLEGADA_MENSAJES} | jitter {JITTER_MENSAJES:g}")
+    if PERIODOS_SENSORES:
+        print(f"🎚️  Períodos por sensor: {PERIODOS_SENSORES}")
+    print(f"📦 Formato: {FORMATO_MENSAJE}")
+    if PUBLICAR_LOTE:
+        print(f"🗃️  Lotes: {CICLOS_POR_LOTE} ciclo(s) por mensaje -> {topico_lote(DEVICE_ID)}")
     print("=" * 60)
     
+    if SIMULADOR_METRICAS_PUERTO and iniciar_exportador(SIMULADOR_METRICAS_PUERTO, METRICAS_HOST):
+        print(f"📈 Métricas en http://{METRICAS_HOST}:{SIMULADOR_METRICAS_PUERTO}/metrics")
+    
+    if LLEGADA_MENSAJES not in LLEGADAS:
+        print(f"❌ LLEGADA_MENSAJES debe ser una de: {', '.join(LLEGADAS)}")
+        return
+    
     # Crear cliente MQTT
     client = mqtt.Client(client_id=f"{DEVICE_ID}_{random.randint(0, 1000)}")
     
@@ -293,6 +599,7 @@ def main():
     client.on_publish = on_publish
     
     # Conectar al broker
+    planificador = None
     try:
         print("\n🔄 Conectando al broker...")
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
@@ -307,10 +614,9 @@ def main():
         
         print("\n✅ Simulador iniciado. Presiona Ctrl+C para detener.\n")
         
-        # Loop principal
-        while True:
-            publicar_sensores()
-            time.sleep(PUBLISH_INTERVAL)
+        # Loop principal: instantes fijos en reloj monotónico
+        planificador = crear_planificador()
+        planificador.ejecutar()
     
     except KeyboardInterrupt:
         print("\n\n⏹️  Deteniendo simulador...")
@@ -322,6 +628,9 @@ def main():
             client.disconnect()
         print("👋 Simulador detenido")
         print(f"📊 Total de mensajes publicados: {message_count}")
+        if planificador:
+            print(planificador.reporte())
+        print(rastreador.reporte())
 
 
 if __name__ == "__main__":
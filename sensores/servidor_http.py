@@ -0,0 +1,119 @@
+"""
+============================================
+SERVIDOR HTTP INTERNO
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Servidor HTTP mínimo (solo biblioteca estándar) que corre en un hilo
+daemon dentro del suscriptor o del simulador. Está en sensores/ junto
+con metricas.py, como los formatos compartidos: los publicadores no
+dependen del paquete del suscriptor. Los módulos registran rutas GET con
+registrar_ruta(); cada manejador recibe los parámetros de la consulta
+y retorna (estado, tipo de contenido, cuerpo).
+
+Uso:
+    registrar_ruta('/metrics', lambda parametros: (200, 'text/plain', texto))
+    iniciar_servidor(9108)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# ============================================
+# RUTAS
+# ============================================
+# ruta → manejador(parametros) -> (estado, tipo_contenido, cuerpo)
+_rutas = {}
+
+servidor = None
+
+
+def registrar_ruta(ruta, manejador):
+    """
+    Registra un manejador GET para una ruta exacta o un prefijo
+
+    Args:
+        ruta: Ruta exacta ('/metrics') o prefijo terminado en '/' ('/ultimo/')
+        manejador: Función (parametros) -> (estado, tipo_contenido, cuerpo);
+                   parametros incluye '_ruta' con la ruta pedida
+    """
+    _rutas[ruta] = manejador
+
+
+def respuesta_json(datos, estado=200):
+    """Arma una respuesta JSON para un manejador"""
+    return estado, 'application/json; charset=utf-8', json.dumps(datos, default=str)
+
+
+def _buscar_manejador(ruta):
+    if ruta in _rutas:
+        return _rutas[ruta]
+    prefijos = [r for r in _rutas if r.endswith('/') and ruta.startswith(r)]
+    return _rutas[max(prefijos, key=len)] if prefijos else None
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    """Despacha las peticiones GET a las rutas registradas"""
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        manejador = _buscar_manejador(partes.path)
+        if manejador is None:
+            estado, tipo, cuerpo = respuesta_json({'error': 'ruta no encontrada'}, 404)
+        else:
+            parametros = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+            parametros['_ruta'] = partes.path
+            try:
+                estado, tipo, cuerpo = manejador(parametros)
+            except Exception as e:
+                estado, tipo, cuerpo = respuesta_json({'error': str(e)}, 500)
+
+        if isinstance(cuerpo, str):
+            cuerpo = cuerpo.encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        # Sin registro por petición (los scrapes son frecuentes)
+        pass
+
+
+# ============================================
+# CICLO DE VIDA
+# ============================================
+def iniciar_servidor(puerto, host='127.0.0.1'):
+    """
+    Arranca el servidor en un hilo daemon (una sola vez por proceso)
+
+    Args:
+        puerto: Puerto TCP
+        host: Interfaz de escucha (por defecto solo local; '0.0.0.0' para todas)
+
+    Returns:
+        ThreadingHTTPServer: Servidor en ejecución, o None si no se pudo abrir el puerto
+    """
+    global servidor
+    if servidor:
+        return servidor
+    try:
+        servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    except OSError as e:
+        print(f"⚠️ No se pudo abrir el servidor HTTP en el puerto {puerto}: {e}")
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="servidor_http", daemon=True).start()
+    return servidor
+
+
+def detener_servidor():
+    """Detiene el servidor si está en ejecución"""
+    global servidor
+    if servidor:
+        servidor.shutdown()
+        servidor.server_close()
+        servidor = None
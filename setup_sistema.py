@@ -20,6 +20,10 @@ import time
 import psycopg2
 from pathlib import Path
 
+# Tablas que debe dejar database/schema.sql
+TABLAS_ESQUEMA = ('mensajes_mqtt', 'estadisticas_sensores', 'estadisticas_estado', 'mensajes_claves',
+                  'ultimo_valor', 'mensajes_1m', 'mensajes_1h', 'mensajes_1d', 'submuestreo_estado')
+
 # Colores para terminal
 class Colors:
     HEADER = '\033[95m'
@@ -289,6 +293,9 @@ def create_database_schema():
             cursor.execute(sql_content)
             conn.commit()
             print_success("Esquema de base de datos creado exitosamente")
+            # Avisos de schema.sql sobre tablas anteriores (migraciones pendientes)
+            for aviso in conn.notices:
+                print_warning(aviso.replace('NOTICE:', '').strip())
         except psycopg2.errors.DuplicateTable as e:
             print_warning("Las tablas ya existen")
             conn.rollback()
@@ -308,7 +315,23 @@ def create_database_schema():
             ORDER BY table_name;
         """)
         
+        # Crear las particiones de mensajes_mqtt de hoy y los próximos días
+        try:
+            sys.path.append(str(Path(__file__).parent))
+            from database.particiones import crear_particiones_futuras
+            creadas = crear_particiones_futuras()
+            print_success(f"Particiones de mensajes_mqtt listas ({len(creadas)} nuevas)")
+        except psycopg2.Error as e:
+            print_warning(f"No se pudieron crear las particiones: {e}")
+        
         tables = cursor.fetchall()
+        from database.db_config import tablas_faltantes
+        faltantes = tablas_faltantes(conn, TABLAS_ESQUEMA)
+        if faltantes:
+            print_error(f"El esquema quedó incompleto, faltan: {', '.join(faltantes)}")
+            cursor.close()
+            conn.close()
+            return False
         if tables:
             print_success(f"Tablas en la base de datos ({len(tables)}):")
             for table in tables:
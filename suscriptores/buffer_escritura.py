@@ -0,0 +1,453 @@
+"""
+============================================
+BUFFER DE ESCRITURA POR LOTES
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Desacopla la recepción de mensajes MQTT de la escritura en
+PostgreSQL. Los mensajes se acumulan en una cola acotada en memoria
+y un grupo de hilos escritores los guarda en lotes, con un único
+commit por lote. Cada hilo usa su propia conexión.
+
+Cada hilo escribe su lote cuando ocurre lo primero de:
+- Se alcanza el tamaño de lote configurado
+- Se cumple la latencia máxima desde el primer mensaje del lote
+
+Si la cola se llena (base de datos lenta o caída) se aplica la
+política de desbordamiento:
+- 'bloquear': el productor espera hasta timeout_bloqueo segundos
+  (contrapresión hacia el broker) y luego descarta el mensaje
+- 'descartar_nuevo': se descarta el mensaje entrante
+- 'descartar_antiguo': se descarta el mensaje más viejo de la cola
+
+Un grupo de filas (lista) entra a la cola como un solo elemento y
+se escribe completo en el mismo lote, aunque lo haga pasar del
+tamaño configurado: las lecturas de un mensaje por lote de un
+dispositivo quedan en la misma transacción. Con la cola llena el
+grupo se descarta entero. La capacidad y la profundidad se cuentan en
+filas: un grupo ocupa tantas como lecturas trae (y se acepta si la
+cola aún no llegó a la capacidad, aunque la pase).
+
+Al detener el buffer se vacía todo lo pendiente antes de salir.
+
+Uso:
+    buffer = BufferEscritura(copiar_mensajes_lote, tam_lote=500, hilos=2)
+    buffer.iniciar()
+    buffer.agregar(fila)
+    ...
+    buffer.detener()
+"""
+
+import logging
+import queue
+import threading
+import time
+import psycopg2
+import os
+import sys
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import crear_conexion
+
+# ============================================
+# CONFIGURACIÓN POR DEFECTO
+# ============================================
+TAM_LOTE_DEFECTO = 500
+LATENCIA_MAX_DEFECTO = 0.5     # segundos
+HILOS_DEFECTO = 1
+CAPACIDAD_DEFECTO = 10000      # filas en cola (0 = sin límite)
+TIMEOUT_BLOQUEO_DEFECTO = 1.0  # segundos
+
+POLITICAS_DESBORDE = ('bloquear', 'descartar_nuevo', 'descartar_antiguo')
+
+log = logging.getLogger('buffer_escritura')
+
+# Marca de fin para los hilos escritores
+_FIN = object()
+
+
+class _ColaFilas(queue.Queue):
+    """
+    queue.Queue cuyo tamaño se mide en filas
+
+    Queue compara maxsize con _qsize() al encolar y espera mientras
+    _qsize() sea 0 al desencolar: basta con llevar la cuenta en _put y
+    _get (siempre bajo el lock de la cola). Un grupo cuenta len(grupo)
+    filas; una fila suelta o la marca de fin, una.
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._filas = 0
+
+    def _qsize(self):
+        return self._filas
+
+    def _put(self, elemento):
+        self.queue.append(elemento)
+        self._filas += _filas_de(elemento)
+
+    def _get(self):
+        elemento = self.queue.popleft()
+        self._filas -= _filas_de(elemento)
+        return elemento
+
+
+def _filas_de(elemento):
+    return max(1, len(elemento)) if isinstance(elemento, list) else 1
+
+
+class BufferEscritura:
+    """
+    Cola acotada en memoria con vaciado por lotes hacia PostgreSQL
+
+    Args:
+        escritor: Función (conexion, filas) que escribe el lote sin hacer commit
+        tam_lote: Número máximo de filas por lote
+        latencia_max: Segundos máximos que una fila espera en el lote
+        hilos: Número de hilos escritores (cada uno con su conexión)
+        capacidad: Filas máximas en cola (0 = sin límite)
+        politica: Política de desbordamiento (ver POLITICAS_DESBORDE)
+        timeout_bloqueo: Espera máxima del productor con política 'bloquear'
+        conectar: Función que retorna una conexión a PostgreSQL
+        liberar: Función (conexion) que devuelve la conexión (None = cerrarla)
+        al_confirmar: Callback (filas) tras un commit exitoso (opcional)
+        al_fallar: Callback (filas, error) cuando un lote no se pudo guardar (opcional)
+        al_descartar: Callback (fila) por cada fila descartada al desbordar la cola (opcional)
+        al_medir: Callback (filas, segundos) con la duración de cada lote
+                  confirmado, escritura más commit (opcional)
+    """
+
+    def __init__(self, escritor, tam_lote=TAM_LOTE_DEFECTO, latencia_max=LATENCIA_MAX_DEFECTO,
+                 hilos=HILOS_DEFECTO, capacidad=CAPACIDAD_DEFECTO, politica='bloquear',
+                 timeout_bloqueo=TIMEOUT_BLOQUEO_DEFECTO, conectar=crear_conexion, liberar=None,
+                 al_confirmar=None, al_fallar=None, al_descartar=None, al_medir=None):
+        if politica not in POLITICAS_DESBORDE:
+            raise ValueError(f"Política de desbordamiento desconocida: {politica}")
+
+        self.escritor = escritor
+        self.tam_lote = max(1, int(tam_lote))
+        self.latencia_max = float(latencia_max)
+        self.num_hilos = max(1, int(hilos))
+        self.capacidad = max(0, int(capacidad))
+        self.politica = politica
+        self.timeout_bloqueo = float(timeout_bloqueo)
+        self.conectar = conectar
+        self.liberar = liberar
+        self.al_confirmar = al_confirmar
+        self.al_fallar = al_fallar
+        self.al_descartar = al_descartar
+        self.al_medir = al_medir
+
+        self._cola = _ColaFilas(maxsize=self.capacidad)
+        self._hilos = []
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self.filas_escritas = 0
+        self.filas_fallidas = 0
+        self.filas_descartadas = 0
+        self.lotes_escritos = 0
+        self.profundidad_max = 0
+        self.esperas_bloqueo = 0
+        self.tiempo_bloqueado = 0.0
+        self.reconexiones = 0
+
+    # ============================================
+    # API PÚBLICA
+    # ============================================
+    def iniciar(self):
+        """Arranca los hilos escritores"""
+        if self._hilos:
+            return
+        for i in range(self.num_hilos):
+            hilo = threading.Thread(target=self._bucle, name=f"buffer_escritura_{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def agregar(self, fila):
+        """
+        Encola una fila para escritura aplicando la política de desbordamiento
+
+        Args:
+            fila: FilaMensaje a guardar, o lista de FilaMensaje que debe
+                  escribirse en el mismo lote
+
+        Returns:
+            bool: True si la fila (o el grupo) quedó en cola, False si se descartó
+        """
+        try:
+            self._cola.put_nowait(fila)
+        except queue.Full:
+            if not self._desbordar(fila):
+                return False
+
+        profundidad = self._cola.qsize()
+        if profundidad > self.profundidad_max:
+            self.profundidad_max = profundidad
+        return True
+
+    def pendientes(self):
+        """Retorna el número aproximado de filas en cola"""
+        return self._cola.qsize()
+
+    def metricas(self):
+        """
+        Retorna un resumen de métricas del buffer
+
+        Returns:
+            dict: Profundidad de cola, filas escritas/fallidas/descartadas, etc.
+        """
+        with self._lock:
+            return {
+                'profundidad': self._cola.qsize(),
+                'profundidad_max': self.profundidad_max,
+                'capacidad': self.capacidad,
+                'hilos': self.num_hilos,
+                'filas_escritas': self.filas_escritas,
+                'filas_fallidas': self.filas_fallidas,
+                'filas_descartadas': self.filas_descartadas,
+                'lotes_escritos': self.lotes_escritos,
+                'esperas_bloqueo': self.esperas_bloqueo,
+                'tiempo_bloqueado': round(self.tiempo_bloqueado, 3),
+                'reconexiones': self.reconexiones
+            }
+
+    def detener(self, timeout=None):
+        """
+        Detiene los hilos escritores escribiendo antes todo lo pendiente
+
+        Args:
+            timeout: Segundos máximos de espera por hilo (None = sin límite)
+        """
+        if not self._hilos:
+            return
+        # Las marcas de fin entran detrás de lo pendiente (la cola es FIFO).
+        # Con la cola llena se espera a que los hilos la vacíen, pero sin
+        # ningún hilo vivo nadie la vaciaría: se abandona lo pendiente
+        for _ in self._hilos:
+            while True:
+                try:
+                    self._cola.put(_FIN, timeout=0.5)
+                    break
+                except queue.Full:
+                    if not any(hilo.is_alive() for hilo in self._hilos):
+                        log.error("❌ Sin hilos escritores: %d fila(s) sin escribir", self._cola.qsize())
+                        break
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    # ============================================
+    # DESBORDAMIENTO
+    # ============================================
+    def _desbordar(self, fila):
+        """Aplica la política de desbordamiento con la cola llena"""
+        if self.politica == 'bloquear':
+            inicio = time.monotonic()
+            try:
+                self._cola.put(fila, timeout=self.timeout_bloqueo)
+                aceptada = True
+            except queue.Full:
+                aceptada = False
+            with self._lock:
+                self.esperas_bloqueo += 1
+                self.tiempo_bloqueado += time.monotonic() - inicio
+            if not aceptada:
+                self._registrar_descarte(fila)
+            return aceptada
+
+        if self.politica == 'descartar_antiguo':
+            while True:
+                try:
+                    antigua = self._cola.get_nowait()
+                except queue.Empty:
+                    antigua = None
+                if antigua is _FIN:
+                    # Nunca se descarta una marca de fin
+                    self._cola.put(antigua)
+                    break
+                if antigua is not None:
+                    self._registrar_descarte(antigua)
+                try:
+                    self._cola.put_nowait(fila)
+                    return True
+                except queue.Full:
+                    continue
+
+        self._registrar_descarte(fila)
+        return False
+
+    def _registrar_descarte(self, fila):
+        filas = fila if isinstance(fila, list) else [fila]
+        with self._lock:
+            self.filas_descartadas += len(filas)
+        if self.al_descartar:
+            for descartada in filas:
+                self.al_descartar(descartada)
+
+    # ============================================
+    # HILOS ESCRITORES
+    # ============================================
+    def _bucle(self):
+        """Recolecta lotes de la cola y los escribe hasta recibir la marca de fin"""
+        estado = {'conexion': None, 'perdida': False}
+        terminar = False
+        try:
+            while not terminar:
+                lote, terminar = self._recolectar_lote()
+                if not lote:
+                    continue
+                try:
+                    self._escribir(estado, lote)
+                except Exception as e:
+                    # El hilo no debe morir: se perdería la cola entera
+                    log.exception("❌ Error inesperado en el hilo escritor")
+                    self._registrar_fallo(lote, e)
+        finally:
+            self._soltar_conexion(estado)
+
+    def _recolectar_lote(self):
+        """
+        Espera el primer elemento y acumula hasta llenar el lote o vencer el plazo
+
+        Returns:
+            tuple: (lote, terminar)
+        """
+        primero = self._cola.get()
+        if primero is _FIN:
+            return [], True
+
+        lote = list(primero) if isinstance(primero, list) else [primero]
+        limite = time.monotonic() + self.latencia_max
+
+        while len(lote) < self.tam_lote:
+            restante = limite - time.monotonic()
+            try:
+                if restante > 0:
+                    fila = self._cola.get(timeout=restante)
+                else:
+                    fila = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if fila is _FIN:
+                return lote, True
+            if isinstance(fila, list):
+                lote.extend(fila)
+            else:
+                lote.append(fila)
+
+        return lote, False
+
+    def _escribir(self, estado, lote):
+        """Escribe un lote en una sola transacción"""
+        try:
+            conexion = self._obtener_conexion(estado)
+            inicio = time.monotonic()
+            self.escritor(conexion, lote)
+            conexion.commit()
+            segundos = time.monotonic() - inicio
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # Conexión perdida: se descarta y se reintenta en el próximo lote
+            log.error("❌ Conexión a DB perdida al escribir lote: %s", e)
+            self._soltar_conexion(estado, cerrar=True)
+            self._registrar_fallo(lote, e)
+            return
+        except psycopg2.Error as e:
+            # Alguna fila inválida: se reintenta fila por fila para aislarla
+            self._rollback(estado)
+            self._escribir_individual(estado, lote, e)
+            return
+        except Exception as e:
+            # Error del escritor fuera de PostgreSQL: el lote no se confirmó
+            log.exception("❌ Error inesperado al escribir lote")
+            self._rollback(estado)
+            self._registrar_fallo(lote, e)
+            return
+
+        self._registrar_exito(lote)
+        self._notificar(self.al_medir, lote, segundos)
+
+    def _escribir_individual(self, estado, lote, error_lote):
+        """Escribe las filas de un lote rechazado una a una"""
+        log.warning("⚠️ Lote rechazado (%s), reintentando fila por fila", error_lote.pgcode)
+        for fila in lote:
+            try:
+                conexion = self._obtener_conexion(estado)
+                self.escritor(conexion, [fila])
+                conexion.commit()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                self._soltar_conexion(estado, cerrar=True)
+                self._registrar_fallo([fila], e)
+                continue
+            except Exception as e:
+                self._rollback(estado)
+                self._registrar_fallo([fila], e)
+                continue
+            self._registrar_exito([fila])
+
+    def _registrar_exito(self, filas):
+        with self._lock:
+            self.filas_escritas += len(filas)
+            self.lotes_escritos += 1
+        self._notificar(self.al_confirmar, filas)
+
+    def _registrar_fallo(self, filas, error):
+        with self._lock:
+            self.filas_fallidas += len(filas)
+        self._notificar(self.al_fallar, filas, error)
+
+    def _notificar(self, callback, *args):
+        """Llama un callback del hilo escritor sin dejar que su error lo detenga"""
+        if not callback:
+            return
+        try:
+            callback(*args)
+        except Exception:
+            log.exception("❌ Error en el callback %s del buffer", getattr(callback, '__name__', callback))
+
+    # ============================================
+    # MANEJO DE CONEXIÓN (UNA POR HILO)
+    # ============================================
+    def _obtener_conexion(self, estado):
+        """Retorna la conexión del hilo, reconectando si hace falta"""
+        conexion = estado['conexion']
+        if not conexion or conexion.closed:
+            if conexion:
+                self._soltar_conexion(estado)
+            conexion = self.conectar()
+            if not conexion:
+                raise psycopg2.OperationalError("No se pudo conectar a PostgreSQL")
+            estado['conexion'] = conexion
+            if estado['perdida']:
+                estado['perdida'] = False
+                with self._lock:
+                    self.reconexiones += 1
+        return conexion
+
+    def _rollback(self, estado):
+        try:
+            conexion = estado['conexion']
+            if conexion and not conexion.closed:
+                conexion.rollback()
+        except psycopg2.Error:
+            self._soltar_conexion(estado, cerrar=True)
+
+    def _soltar_conexion(self, estado, cerrar=False):
+        """Cierra o devuelve al pool la conexión del hilo"""
+        conexion = estado['conexion']
+        estado['conexion'] = None
+        if cerrar:
+            estado['perdida'] = True
+        if not conexion:
+            return
+        try:
+            if cerrar and not conexion.closed:
+                conexion.close()
+            if self.liberar:
+                self.liberar(conexion)
+            elif not conexion.closed:
+                conexion.close()
+        except psycopg2.Error:
+            pass
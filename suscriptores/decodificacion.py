@@ -0,0 +1,175 @@
+"""
+============================================
+DECODIFICACIÓN DE PAYLOADS JSON
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Capa de decodificación usada por procesar_mensaje_json:
+
+- Usa orjson o pysimdjson si están instalados y json (biblioteca
+  estándar) si no; DECODIFICADOR_JSON fuerza uno en particular.
+- orjson y simdjson parsean el payload en bytes directamente, sin
+  copiarlo a str; json (que solo parsea str) lo decodifica primero.
+- Guarda por tópico qué claves usa el publicador: el simulador envía
+  sensor_id/valor/unidad/estado y el ESP32 (publishSensor)
+  device_id/value/unit/status.
+  La detección se hace con el primer mensaje del tópico y se repite
+  solo si el formato cambia.
+- Extrae también "seq" y "enviado_ms" (secuencia y hora de envío del
+  simulador, ver suscriptores/secuencias.py); None si no vienen.
+
+Uso:
+    sensor_id, valor, unidad, estado, seq, enviado_ms = extraer_campos(msg.topic, msg.payload)
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# auto | orjson | simdjson | json
+DECODIFICADOR_JSON = os.getenv('DECODIFICADOR_JSON', 'auto').lower()
+
+# Claves aceptadas para cada campo, en orden de preferencia
+ALIAS_CAMPOS = (
+    ('sensor_id', 'device_id'),
+    ('valor', 'value'),
+    ('unidad', 'unit'),
+    ('estado', 'status'),
+    ('seq',),
+    ('enviado_ms',),
+)
+
+# Tópicos con extractor en caché antes de vaciarla
+MAX_TOPICOS = 10000
+
+# json/orjson lanzan JSONDecodeError, simdjson ValueError y los bytes
+# que no son UTF-8 UnicodeDecodeError: todos derivan de ValueError
+ErrorDecodificacion = ValueError
+
+_SIN_CAMPOS = (None,) * len(ALIAS_CAMPOS)
+
+
+# ============================================
+# BACKENDS
+# ============================================
+def _backends_disponibles():
+    backends = {}
+    if orjson is not None:
+        backends['orjson'] = orjson.loads
+    if simdjson is not None:
+        backends['simdjson'] = simdjson.loads
+    backends['json'] = _loads_json
+    return backends
+
+
+def _rechazar_constante(nombre):
+    # NaN/Infinity no son JSON estándar y la columna JSONB los rechaza
+    raise json.JSONDecodeError(f"constante no válida: {nombre}", nombre, 0)
+
+
+def _loads_json(payload):
+    # json.loads(bytes) detecta la codificación en cada llamada; con
+    # UTF-8 (MQTT) es más rápido decodificar aquí
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode('utf-8')
+    return json.loads(payload, parse_constant=_rechazar_constante)
+
+
+BACKENDS = _backends_disponibles()
+
+
+def elegir_backend(nombre=DECODIFICADOR_JSON):
+    """
+    Selecciona la función de decodificación
+
+    Args:
+        nombre: 'auto' (el más rápido disponible) o el nombre de un backend
+
+    Returns:
+        tuple: (nombre, función loads)
+    """
+    if nombre == 'auto':
+        nombre = next(n for n in ('orjson', 'simdjson', 'json') if n in BACKENDS)
+    elif nombre not in BACKENDS:
+        print(f"⚠️ Decodificador '{nombre}' no disponible, usando 'json'")
+        nombre = 'json'
+    return nombre, BACKENDS[nombre]
+
+
+BACKEND, decodificar = elegir_backend()
+
+
+# ============================================
+# EXTRACCIÓN DE CAMPOS
+# ============================================
+# tópico → claves (sensor_id, valor, unidad, estado, seq, enviado_ms) usadas por su publicador
+_extractores = {}
+
+
+def detectar_claves(datos):
+    """Claves de cada campo presentes en un mensaje (la primera del alias si falta)"""
+    return tuple(next((k for k in alias if k in datos), alias[0]) for alias in ALIAS_CAMPOS)
+
+
+def campos_de(topico, datos):
+    """
+    Extrae (sensor_id, valor, unidad, estado, seq, enviado_ms) de un mensaje ya decodificado
+
+    Args:
+        topico: Tópico MQTT (clave de la caché de extractores)
+        datos: Objeto decodificado
+
+    Returns:
+        tuple: (sensor_id, valor, unidad, estado, seq, enviado_ms); None en los campos ausentes
+    """
+    if not isinstance(datos, dict):
+        return _SIN_CAMPOS
+
+    # Se vuelve a detectar si falta la clave del valor (formato distinto)
+    claves = _extractores.get(topico)
+    if claves is None or claves[1] not in datos:
+        if len(_extractores) >= MAX_TOPICOS:
+            _extractores.clear()
+        claves = _extractores[topico] = detectar_claves(datos)
+
+    clave_sensor, clave_valor, clave_unidad, clave_estado, clave_seq, clave_enviado = claves
+    sensor_id = datos.get(clave_sensor)
+    # Un ID numérico ("device_id": 7) se guarda y agrupa como texto
+    if sensor_id is not None and not isinstance(sensor_id, str):
+        sensor_id = str(sensor_id)
+    return (sensor_id, datos.get(clave_valor), datos.get(clave_unidad),
+            datos.get(clave_estado), datos.get(clave_seq), datos.get(clave_enviado))
+
+
+def como_cadena_json(texto):
+    """Texto que no es JSON convertido en cadena JSON (para la columna JSONB)"""
+    return json.dumps(texto, ensure_ascii=False)
+
+
+def extraer_campos(topico, payload):
+    """
+    Decodifica un payload y extrae (sensor_id, valor, unidad, estado, seq, enviado_ms)
+
+    Args:
+        topico: Tópico MQTT
+        payload: Mensaje en bytes (o str)
+
+    Returns:
+        tuple: (sensor_id, valor, unidad, estado, seq, enviado_ms)
+
+    Raises:
+        ErrorDecodificacion: Si el payload no es JSON válido
+    """
+    return campos_de(topico, decodificar(payload))
@@ -0,0 +1,280 @@
+"""
+============================================
+DEDUPLICACIÓN DE MENSAJES (INGESTA IDEMPOTENTE)
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Con QoS 1 el broker reenvía los mensajes sin confirmar después de
+una reconexión, y el spool puede volver a cargar un segmento ya
+confirmado. Para no guardar dos veces el mismo mensaje:
+
+1. Clave de contenido: BLAKE2b (16 bytes) de tópico, sensor_id, el
+   timestamp del dispositivo y el payload. Solo se deduplican los
+   mensajes con timestamp de hora de pared (ISO o epoch): sin
+   timestamp, o con el tiempo desde el arranque del ESP32 sin NTP
+   (millis()/1000), dos lecturas iguales pueden ser legítimas, por
+   ejemplo después de un reinicio. Los campos se buscan en los bytes
+   del payload sin decodificar el JSON.
+2. Caché LRU en memoria de las claves recientes: descarta el
+   reenvío en on_message sin tocar la base de datos.
+3. Tabla mensajes_claves (clave PRIMARY KEY): el escritor inserta las
+   claves del lote con ON CONFLICT DO NOTHING RETURNING en una sola
+   sentencia y guarda solo las filas cuya clave fue nueva, en la
+   misma transacción. Cubre lo que la caché no ve (reinicios, otro
+   trabajador del supervisor, el spool).
+
+mensajes_mqtt está particionada por fecha: un índice único ahí tendría
+que incluir timestamp_recepcion, que cambia en cada reenvío. Por eso
+las claves van en una tabla aparte, que se purga pasadas
+DEDUP_VENTANA_HORAS.
+
+Uso:
+    clave = clave_mensaje(topico, payload)
+    if clave is not None and claves_recientes.visto(clave):
+        return   # duplicado
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import psycopg2
+
+# Agregar path para importar db_config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+from sensores.formato_compacto import primera_lectura, EPOCA_MINIMA_MS
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# Descartar mensajes repetidos (1 = sí, 0 = no)
+DEDUP_ACTIVO = os.getenv('DEDUP_ACTIVO', '1') == '1'
+
+# Claves recientes en memoria
+DEDUP_CACHE = int(os.getenv('DEDUP_CACHE', 100000))
+
+# Horas que se conserva cada clave en mensajes_claves
+DEDUP_VENTANA_HORAS = float(os.getenv('DEDUP_VENTANA_HORAS', 6))
+
+# Minutos entre purgas de mensajes_claves desde el suscriptor (0 = nunca)
+DEDUP_PURGA_MINUTOS = float(os.getenv('DEDUP_PURGA_MINUTOS', 10))
+
+# Filas borradas por sentencia al purgar
+LOTE_PURGA = 10000
+
+log = logging.getLogger('deduplicacion')
+
+# Filas descartadas por el escritor (clave ya presente en la tabla)
+duplicados_db = 0
+_lock_contador = threading.Lock()
+
+
+# ============================================
+# CLAVE DE CONTENIDO
+# ============================================
+# Primer "timestamp" y "sensor_id"/"device_id" del JSON (en un lote, los de
+# su primera lectura): valor entre comillas o número
+_PATRON_TIMESTAMP = re.compile(rb'"timestamp"\s*:\s*("[^"]*"|[-+0-9.eE]+)')
+_PATRON_SENSOR = re.compile(rb'"(?:sensor_id|device_id)"\s*:\s*("[^"]*"|[^,}\s]+)')
+
+# Timestamps numéricos menores son segundos desde el arranque (en
+# segundos o milisegundos, un epoch posterior a 2000 es mayor)
+EPOCA_MINIMA_S = EPOCA_MINIMA_MS // 1000
+
+
+def marca_dispositivo(payload):
+    """
+    Timestamp del dispositivo si es hora de pared
+
+    Args:
+        payload: Mensaje JSON en bytes
+
+    Returns:
+        bytes: Valor tal como viene en el JSON, o None si falta o es
+               tiempo desde el arranque
+    """
+    encontrado = _PATRON_TIMESTAMP.search(payload)
+    if encontrado is None:
+        return None
+    valor = encontrado.group(1)
+    if valor.startswith(b'"'):
+        return valor if len(valor) > 2 else None
+    try:
+        return valor if float(valor) >= EPOCA_MINIMA_S else None
+    except ValueError:
+        return None
+
+
+def clave_mensaje(topico, payload, compacto=False):
+    """
+    Clave de contenido del mensaje: tópico, sensor_id, timestamp del
+    dispositivo y payload
+
+    Args:
+        topico: Tópico MQTT
+        payload: Payload en bytes o el mensaje ya decodificado (str);
+                 ambos dan la misma clave
+        compacto: Payload en el formato binario de formato_compacto.py
+
+    Returns:
+        bytes: 16 bytes, o None si el mensaje no trae un timestamp de
+               hora de pared (no se deduplica)
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if compacto:
+        lectura = primera_lectura(payload)
+        if lectura is None or lectura[1] < EPOCA_MINIMA_MS:
+            return None
+        sensor, marca = lectura[0], str(lectura[1]).encode('ascii')
+    else:
+        marca = marca_dispositivo(payload)
+        if marca is None:
+            return None
+        encontrado = _PATRON_SENSOR.search(payload)
+        sensor = encontrado.group(1) if encontrado else b''
+    return hashlib.blake2b(b'\0'.join((topico.encode('utf-8'), sensor, marca, payload)),
+                           digest_size=16).digest()
+
+
+class CacheClaves:
+    """
+    Conjunto LRU de claves recientes
+
+    Lo usa solo el hilo de red de MQTT (on_message), por eso no lleva lock.
+    """
+
+    def __init__(self, maximo=DEDUP_CACHE):
+        self.maximo = maximo
+        self._claves = OrderedDict()
+        self.duplicados = 0
+
+    def visto(self, clave):
+        """
+        Registra la clave
+
+        Returns:
+            bool: True si ya estaba (mensaje duplicado)
+        """
+        if clave in self._claves:
+            self._claves.move_to_end(clave)
+            self.duplicados += 1
+            return True
+        self._claves[clave] = None
+        if len(self._claves) > self.maximo:
+            self._claves.popitem(last=False)
+        return False
+
+    def __len__(self):
+        return len(self._claves)
+
+
+# ============================================
+# ESCRITURA IDEMPOTENTE
+# ============================================
+INSERTAR_CLAVES = """
+INSERT INTO mensajes_claves (clave, recibido)
+SELECT * FROM unnest(%s::bytea[], %s::timestamp[])
+ON CONFLICT (clave) DO NOTHING
+RETURNING clave
+"""
+
+
+def descartar_duplicados(conexion_db, filas):
+    """
+    Registra las claves del lote y retorna solo las filas nuevas (sin commit)
+
+    Debe llamarse en la misma transacción que guarda el lote: si el
+    lote falla, sus claves tampoco quedan registradas.
+
+    Args:
+        conexion_db: Conexión psycopg2 abierta
+        filas: Lista de FilaMensaje
+
+    Returns:
+        list: Filas sin clave o con clave no vista antes, en el mismo orden
+    """
+    global duplicados_db
+    claves = [clave_mensaje(fila.topico, fila.mensaje) for fila in filas]
+    con_clave = [(clave, fila.timestamp_recepcion) for clave, fila in zip(claves, filas) if clave is not None]
+    if not con_clave:
+        return filas
+
+    cursor = conexion_db.cursor()
+    try:
+        cursor.execute(INSERTAR_CLAVES, ([c for c, _ in con_clave], [t for _, t in con_clave]))
+        nuevas = {bytes(fila[0]) for fila in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    resultado = []
+    for clave, fila in zip(claves, filas):
+        if clave is None:
+            resultado.append(fila)
+        elif clave in nuevas:
+            # Solo la primera aparición dentro del lote
+            nuevas.discard(clave)
+            resultado.append(fila)
+
+    if len(resultado) < len(filas):
+        with _lock_contador:
+            duplicados_db += len(filas) - len(resultado)
+    return resultado
+
+
+# ============================================
+# PURGA DE CLAVES
+# ============================================
+def purgar_claves(horas=DEDUP_VENTANA_HORAS):
+    """
+    Borra de mensajes_claves las claves más viejas que la ventana
+
+    Returns:
+        int: Claves borradas
+    """
+    limite = datetime.now() - timedelta(hours=horas)
+    total = 0
+    while True:
+        with conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM mensajes_claves
+                WHERE ctid = ANY(ARRAY(
+                    SELECT ctid FROM mensajes_claves WHERE recibido < %s LIMIT %s
+                ))
+            """, (limite, LOTE_PURGA))
+            borradas = cursor.rowcount
+            cursor.close()
+        total += borradas
+        if borradas < LOTE_PURGA:
+            return total
+
+
+def iniciar_purga_periodica(minutos=DEDUP_PURGA_MINUTOS):
+    """
+    Ejecuta purgar_claves() cada 'minutos' en un hilo daemon
+
+    Returns:
+        threading.Event: Evento que detiene el hilo al activarlo
+    """
+    detener = threading.Event()
+    if minutos <= 0:
+        return detener
+
+    def bucle():
+        while not detener.wait(minutos * 60):
+            try:
+                borradas = purgar_claves()
+                if borradas:
+                    log.info("🧹 %d clave(s) de deduplicación purgadas", borradas)
+            except psycopg2.Error as e:
+                log.warning("⚠️ Error purgando mensajes_claves: %s", e)
+
+    threading.Thread(target=bucle, name="purga_claves", daemon=True).start()
+    return detener
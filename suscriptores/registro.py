@@ -0,0 +1,178 @@
+"""
+============================================
+REGISTRO (LOGGING) NO BLOQUEANTE
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Capa de logging para el camino de ingesta:
+
+- Los registros pasan por una cola en memoria (QueueHandler) y un
+  hilo aparte (QueueListener) los formatea y escribe en consola; el
+  callback MQTT nunca espera por la terminal. Si la cola se llena,
+  el registro se descarta y se cuenta.
+- Muestreo de los registros por mensaje: con una tasa de 0.01 se
+  registra 1 de cada 100 mensajes (0 = ninguno, 1 = todos).
+- Resumen periódico de una línea con las tasas de ingesta.
+
+Uso:
+    configurar_registro()
+    log = logging.getLogger('suscriptor')
+    if muestreo_mensajes.tomar():
+        log_mensajes.info("📥 [%s] %s", topico, valor)
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+REGISTRO_NIVEL = os.getenv('REGISTRO_NIVEL', 'INFO').upper()
+
+# Fracción de mensajes que se registran individualmente (0 a 1)
+REGISTRO_MUESTREO = float(os.getenv('REGISTRO_MUESTREO', 0.01))
+
+# Segundos entre líneas de resumen (0 = sin resumen)
+REGISTRO_RESUMEN_SEGUNDOS = float(os.getenv('REGISTRO_RESUMEN_SEGUNDOS', 10))
+
+# Registros pendientes de escribir antes de empezar a descartar
+REGISTRO_COLA = int(os.getenv('REGISTRO_COLA', 10000))
+
+FORMATO = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+FORMATO_FECHA = '%H:%M:%S'
+
+_listener = None
+
+
+class _ManejadorCola(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) en vez de bloquear con la cola llena"""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class Muestreador:
+    """
+    Decide qué eventos se registran según una tasa de muestreo
+
+    Determinista (1 de cada round(1/tasa)) y sin bloqueo: pensado para
+    consultarse en el camino caliente antes de armar el registro.
+    """
+
+    def __init__(self, tasa=REGISTRO_MUESTREO):
+        self.cada = 0 if tasa <= 0 else max(1, round(1 / min(tasa, 1.0)))
+        self._contador = 0
+
+    def tomar(self):
+        """Retorna True si este evento debe registrarse"""
+        if not self.cada:
+            return False
+        self._contador += 1
+        if self._contador >= self.cada:
+            self._contador = 0
+            return True
+        return False
+
+
+# ============================================
+# CONFIGURACIÓN DEL LOGGING
+# ============================================
+def configurar_registro(nivel=REGISTRO_NIVEL, capacidad=REGISTRO_COLA):
+    """
+    Envía todo el logging del proceso por una cola hacia un hilo escritor
+
+    Idempotente: llamadas posteriores solo cambian el nivel.
+
+    Args:
+        nivel: Nivel mínimo ('DEBUG', 'INFO', 'WARNING', ...)
+        capacidad: Registros máximos en cola (los excedentes se descartan)
+
+    Returns:
+        logging.handlers.QueueHandler: Manejador instalado en el logger raíz
+    """
+    global _listener
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+    if _listener:
+        return next(h for h in raiz.handlers if isinstance(h, _ManejadorCola))
+
+    consola = logging.StreamHandler()
+    consola.setFormatter(logging.Formatter(FORMATO, FORMATO_FECHA))
+
+    cola = queue.Queue(maxsize=max(1, capacidad))
+    manejador = _ManejadorCola(cola)
+    raiz.handlers = [manejador]
+
+    _listener = logging.handlers.QueueListener(cola, consola, respect_handler_level=True)
+    _listener.start()
+    return manejador
+
+
+def detener_registro():
+    """Escribe los registros pendientes y detiene el hilo escritor"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+def registros_descartados():
+    """Registros descartados por cola llena desde el inicio"""
+    for h in logging.getLogger().handlers:
+        if isinstance(h, _ManejadorCola):
+            return h.descartados
+    return 0
+
+
+# ============================================
+# RESUMEN PERIÓDICO
+# ============================================
+def iniciar_resumen(contadores, segundos=REGISTRO_RESUMEN_SEGUNDOS, logger='resumen'):
+    """
+    Registra cada 'segundos' una línea con la tasa de cada contador
+
+    Args:
+        contadores: Función sin argumentos que retorna un dict
+                    {nombre: valor acumulado}; los nombres que empiezan
+                    con '=' se muestran tal cual (valores instantáneos)
+        segundos: Intervalo del resumen
+        logger: Nombre del logger
+
+    Returns:
+        threading.Event: Evento que detiene el hilo al activarlo
+    """
+    detener = threading.Event()
+    if segundos <= 0:
+        return detener
+    log = logging.getLogger(logger)
+
+    def bucle():
+        anteriores = contadores()
+        instante = time.monotonic()
+        while not detener.wait(segundos):
+            actuales = contadores()
+            ahora = time.monotonic()
+            transcurrido = ahora - instante or 1e-9
+            partes = []
+            for nombre, valor in actuales.items():
+                if nombre.startswith('='):
+                    partes.append(f"{nombre[1:]} {valor}")
+                else:
+                    tasa = (valor - anteriores.get(nombre, 0)) / transcurrido
+                    partes.append(f"{tasa:.0f} {nombre}/s")
+            log.info("📊 %s", ', '.join(partes))
+            anteriores, instante = actuales, ahora
+
+    threading.Thread(target=bucle, name="resumen_registro", daemon=True).start()
+    return detener
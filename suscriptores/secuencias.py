@@ -0,0 +1,96 @@
+"""
+============================================
+SECUENCIAS DE PUBLICACIÓN Y MENSAJES PERDIDOS
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+El simulador y el generador de carga numeran los mensajes JSON de
+cada flujo (dispositivo y tópico) con "seq" y agregan "enviado_ms",
+la hora de envío en milisegundos desde epoch (ver
+crear_mensaje() en sensores/sensor_simulator.py).
+
+Con eso el suscriptor mide:
+- Tránsito: recepción - enviado_ms (publicador → broker → suscriptor).
+  Compara relojes de dos máquinas: solo es confiable si ambas están
+  sincronizadas (NTP) o en el mismo host.
+- Huecos: un seq mayor que el siguiente esperado cuenta los
+  intermedios como perdidos. Un seq menor llega desordenado (o es un
+  reenvío que la deduplicación no vio); si retrocede más de
+  VENTANA_REORDEN o vuelve a 0 el publicador se reinició.
+
+Los huecos solo tienen sentido si el proceso ve todos los mensajes
+del flujo: con un solo suscriptor o con el supervisor en modo
+'particion', que reparte por tópico. El flujo es (sensor_id, tópico)
+y no solo el dispositivo por ese reparto. En modo 'compartida' el
+broker reparte mensajes sueltos entre los trabajadores y cada uno
+vería como perdidos los que recibió otro: ahí el suscriptor solo mide
+el tránsito (ver configurar_trabajador() en suscriptor_admin.py).
+
+Los mensajes sin "seq" (ESP32, formato compacto) no se siguen.
+
+Uso:
+    perdidos, desordenado, reinicio = secuencias.registrar((sensor_id, topico), seq)
+"""
+
+import os
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# Flujos seguidos antes de vaciar la tabla
+MAX_FLUJOS = int(os.getenv('SECUENCIAS_MAX_FLUJOS', 200000))
+
+# Retroceso de seq a partir del cual se asume un reinicio del publicador
+VENTANA_REORDEN = 1000
+
+
+class DetectorHuecos:
+    """
+    Última secuencia vista de cada flujo
+
+    Lo usa solo el hilo de red de MQTT (on_message), por eso no lleva lock.
+    """
+
+    def __init__(self, maximo=MAX_FLUJOS, ventana=VENTANA_REORDEN):
+        self.maximo = maximo
+        self.ventana = ventana
+        self._ultimos = {}
+        self.perdidos = 0
+        self.desordenados = 0
+        self.reinicios = 0
+
+    def registrar(self, flujo, seq):
+        """
+        Registra la secuencia de un mensaje del flujo
+
+        Args:
+            flujo: Clave del flujo, p. ej. (sensor_id, topico)
+            seq: Número de secuencia (int)
+
+        Returns:
+            tuple: (perdidos, desordenado, reinicio); perdidos es la
+                   cantidad de secuencias saltadas antes de esta
+        """
+        ultimo = self._ultimos.get(flujo)
+        if ultimo is None:
+            if len(self._ultimos) >= self.maximo:
+                self._ultimos.clear()
+            self._ultimos[flujo] = seq
+            return 0, False, False
+
+        if seq > ultimo:
+            self._ultimos[flujo] = seq
+            perdidos = seq - ultimo - 1
+            self.perdidos += perdidos
+            return perdidos, False, False
+
+        if seq == 0 or ultimo - seq > self.ventana:
+            self._ultimos[flujo] = seq
+            self.reinicios += 1
+            return 0, False, True
+
+        self.desordenados += 1
+        return 0, True, False
+
+    def __len__(self):
+        return len(self._ultimos)
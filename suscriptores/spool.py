@@ -0,0 +1,481 @@
+"""
+============================================
+SPOOL EN DISCO PARA CAÍDAS DE LA BASE DE DATOS
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Cuando PostgreSQL no responde, los lotes que el buffer no pudo
+guardar (y las filas que la cola llena habría descartado) se anexan
+a un registro en disco en lugar de perderse. Un hilo reproductor los
+vuelve a cargar con COPY cuando la base de datos regresa.
+
+Formato:
+- Segmentos spool-<secuencia>.log de hasta SPOOL_SEGMENTO_MB en SPOOL_DIR
+- Cada registro es un lote: cabecera de 8 bytes (longitud y CRC32,
+  little-endian) seguida de las filas en formato texto de COPY
+- Un registro truncado o con CRC inválido (corte de luz a mitad de
+  una escritura) marca el fin útil de su segmento
+
+Cada registro llega al sistema operativo al escribirse (sobrevive a
+una caída del proceso); fsync se agrupa cada SPOOL_FSYNC segundos,
+que es lo máximo que se pierde si se apaga la máquina.
+
+El espacio en disco está acotado por SPOOL_MAX_MB: con el spool
+lleno las filas nuevas se descartan y se cuentan.
+
+Un segmento se borra solo después del commit de sus filas: si el
+proceso cae entre el commit y el borrado, el segmento se vuelve a
+cargar (puede haber duplicados, nunca pérdidas). Cada registro se
+reproduce en su propia transacción; si la base de datos rechaza uno
+por sus datos se reintenta fila por fila y solo las filas inválidas se
+apartan en <segmento>.rechazado (con el mismo formato de registro).
+
+Uso:
+    spool = Spool()
+    spool.agregar(filas)
+    iniciar_reproductor(spool, escribir)   # escribir(filas) guarda y hace commit
+"""
+
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import pool
+
+# Agregar path para importar db_config
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from database.db_config import FilaMensaje, serializar_copy
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# Guardar en disco lo que no se pudo escribir en PostgreSQL (1 = sí)
+SPOOL_ACTIVO = os.getenv('SPOOL_ACTIVO', '1') == '1'
+
+# Directorio de los segmentos (el supervisor usa uno por trabajador)
+SPOOL_DIR = os.getenv('SPOOL_DIR', os.path.join(RAIZ, 'spool'))
+
+# Tamaño de cada segmento y espacio total máximo
+SPOOL_SEGMENTO_MB = float(os.getenv('SPOOL_SEGMENTO_MB', 16))
+SPOOL_MAX_MB = float(os.getenv('SPOOL_MAX_MB', 1024))
+
+# Segundos entre fsync (0 = fsync en cada registro)
+SPOOL_FSYNC = float(os.getenv('SPOOL_FSYNC', 0.5))
+
+# Segundos entre intentos de reproducir el spool en PostgreSQL
+SPOOL_REINTENTO = float(os.getenv('SPOOL_REINTENTO', 5))
+
+MB = 1024 * 1024
+
+# Errores que indican que PostgreSQL (o el pool) no está disponible y no
+# un problema de los datos: las filas siguen en disco para el próximo
+# intento. PoolError llega con el pool agotado o cerrado
+ERRORES_CONEXION = (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError)
+CABECERA = struct.Struct('<II')   # longitud, crc32
+PREFIJO = 'spool-'
+EXTENSION = '.log'
+
+log = logging.getLogger('spool')
+
+# Inverso de _escapar_copy (database/db_config.py)
+_ESCAPES_COPY = {'t': '\t', 'n': '\n', 'r': '\r'}
+_PATRON_ESCAPE = re.compile(r'\\(.)')
+
+
+def _campo_copy(texto):
+    """Valor de un campo en formato texto de COPY (None para \\N)"""
+    if texto == '\\N':
+        return None
+    if '\\' in texto:
+        return _PATRON_ESCAPE.sub(lambda m: _ESCAPES_COPY.get(m.group(1), m.group(1)), texto)
+    return texto
+
+
+def fila_copy(linea):
+    """
+    Convierte una línea en formato texto de COPY (sin el salto final) en fila
+
+    Returns:
+        FilaMensaje: Fila con timestamp datetime y valor float
+    """
+    topico, mensaje, recepcion, sensor_id, valor, unidad, ip_origen = map(_campo_copy, linea.split('\t'))
+    return FilaMensaje(
+        topico,
+        mensaje,
+        datetime.fromisoformat(recepcion),
+        sensor_id,
+        float(valor) if valor is not None else None,
+        unidad,
+        ip_origen
+    )
+
+
+def leer_copy(texto):
+    """
+    Convierte texto de serializar_copy() de vuelta en filas
+
+    Returns:
+        list: Lista de FilaMensaje
+    """
+    return [fila_copy(linea) for linea in texto.split('\n') if linea]
+
+
+def _registro(filas):
+    """Registro del spool: cabecera (longitud, CRC32) y filas en formato COPY"""
+    datos = serializar_copy(filas).encode('utf-8')
+    return CABECERA.pack(len(datos), zlib.crc32(datos)) + datos
+
+
+class ErrorConexionSpool(Exception):
+    """La base de datos dejó de responder a mitad de un registro"""
+
+    def __init__(self, error, restantes):
+        super().__init__(str(error))
+        self.error = error
+        self.restantes = restantes
+
+
+# ============================================
+# SPOOL
+# ============================================
+class Spool:
+    """
+    Registro de solo-anexar en segmentos, seguro entre hilos
+
+    Args:
+        directorio: Carpeta de los segmentos (se crea si no existe)
+        segmento_mb: Tamaño a partir del cual se abre un segmento nuevo
+        max_mb: Espacio máximo en disco (segmentos pendientes)
+        fsync: Segundos entre fsync (0 = en cada registro)
+    """
+
+    def __init__(self, directorio=SPOOL_DIR, segmento_mb=SPOOL_SEGMENTO_MB,
+                 max_mb=SPOOL_MAX_MB, fsync=SPOOL_FSYNC):
+        self.directorio = directorio
+        self.tam_segmento = int(segmento_mb * MB)
+        self.max_bytes = int(max_mb * MB)
+        self.intervalo_fsync = float(fsync)
+
+        self._lock = threading.Lock()
+        self._archivo = None
+        self._sucio = False
+        self._ultimo_fsync = time.monotonic()
+
+        os.makedirs(directorio, exist_ok=True)
+        segmentos = self._segmentos()
+        self._secuencia = max((self._numero(ruta) for ruta in segmentos), default=0)
+        self._bytes = sum(os.path.getsize(ruta) for ruta in segmentos)
+
+        # Estadísticas
+        self.filas_escritas = 0
+        self.filas_reproducidas = 0
+        self.filas_descartadas = 0
+        self.registros_corruptos = 0
+        self.filas_rechazadas = 0
+        self.fsyncs = 0
+
+    # ============================================
+    # ESCRITURA
+    # ============================================
+    def agregar(self, filas):
+        """
+        Anexa un lote de filas como un registro
+
+        Args:
+            filas: Lista de FilaMensaje
+
+        Returns:
+            bool: True si quedó en disco, False si el spool está lleno
+        """
+        registro = _registro(filas)
+        with self._lock:
+            if self._bytes + len(registro) > self.max_bytes:
+                self.filas_descartadas += len(filas)
+                return False
+            if self._archivo is None or (self._archivo.tell() > 0 and
+                                         self._archivo.tell() + len(registro) > self.tam_segmento):
+                self._rotar()
+            self._archivo.write(registro)
+            self._archivo.flush()
+            self._bytes += len(registro)
+            self.filas_escritas += len(filas)
+            self._sucio = True
+            if time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync:
+                self._fsync()
+        return True
+
+    def sincronizar(self):
+        """Hace fsync de lo escrito desde el último fsync"""
+        with self._lock:
+            self._fsync()
+
+    def cerrar(self):
+        """Sincroniza y cierra el segmento abierto"""
+        with self._lock:
+            self._cerrar_segmento()
+
+    def pendiente(self):
+        """Indica si hay filas en disco por reproducir"""
+        return self._bytes > 0
+
+    def metricas(self):
+        """
+        Retorna un resumen de métricas del spool
+
+        Returns:
+            dict: Bytes y segmentos pendientes, filas escritas/reproducidas/descartadas, etc.
+        """
+        with self._lock:
+            return {
+                'bytes': self._bytes,
+                'segmentos': len(self._segmentos()),
+                'filas_escritas': self.filas_escritas,
+                'filas_reproducidas': self.filas_reproducidas,
+                'filas_descartadas': self.filas_descartadas,
+                'registros_corruptos': self.registros_corruptos,
+                'filas_rechazadas': self.filas_rechazadas,
+                'fsyncs': self.fsyncs
+            }
+
+    # ============================================
+    # REPRODUCCIÓN
+    # ============================================
+    def reproducir(self, escribir):
+        """
+        Carga en PostgreSQL los segmentos pendientes, del más antiguo al más nuevo
+
+        Cierra el segmento abierto para incluirlo; lo que llegue mientras
+        tanto va a un segmento nuevo. Cada registro (un lote del buffer)
+        se escribe en su propia transacción. Las filas del spool nunca
+        pasaron por PostgreSQL: si un registro es rechazado por sus datos
+        se reintenta fila por fila y solo las filas inválidas se apartan
+        en <segmento>.rechazado. El segmento se borra cuando todos sus
+        registros quedaron confirmados o apartados.
+
+        Args:
+            escribir: Función (filas) que guarda y confirma las filas
+
+        Returns:
+            tuple: (filas, desde, hasta) reproducidas, con el rango de
+                   timestamp_recepcion (None si no hubo filas)
+
+        Raises:
+            psycopg2.Error: Uno de ERRORES_CONEXION si la base de datos
+                sigue sin responder (lo no confirmado queda en disco)
+        """
+        with self._lock:
+            self._cerrar_segmento()
+            segmentos = self._segmentos()
+
+        total, desde, hasta = 0, None, None
+        for ruta in segmentos:
+            tamano = os.path.getsize(ruta)
+            registros = self._leer_segmento(ruta)
+            for indice, filas in enumerate(registros):
+                try:
+                    guardadas = self._reproducir_registro(ruta, filas, escribir)
+                except ErrorConexionSpool as e:
+                    # Lo confirmado no se vuelve a cargar en el próximo intento
+                    tamano = self._recortar(ruta, tamano, [e.restantes] + registros[indice + 1:])
+                    raise e.error from None
+                if not guardadas:
+                    continue
+                total += len(guardadas)
+                minimo = min(fila.timestamp_recepcion for fila in guardadas)
+                maximo = max(fila.timestamp_recepcion for fila in guardadas)
+                desde = minimo if desde is None else min(desde, minimo)
+                hasta = maximo if hasta is None else max(hasta, maximo)
+                with self._lock:
+                    self.filas_reproducidas += len(guardadas)
+            os.remove(ruta)
+            with self._lock:
+                self._bytes -= tamano
+        return total, desde, hasta
+
+    def _reproducir_registro(self, ruta, filas, escribir):
+        """
+        Escribe un registro; si PostgreSQL lo rechaza, fila por fila
+
+        Returns:
+            list: Filas confirmadas
+
+        Raises:
+            ErrorConexionSpool: Con las filas aún sin confirmar
+        """
+        try:
+            escribir(filas)
+            return filas
+        except ERRORES_CONEXION as e:
+            raise ErrorConexionSpool(e, filas) from None
+        except psycopg2.Error as e:
+            log.warning("⚠️ Registro de %s rechazado (%s), reintentando fila por fila",
+                        os.path.basename(ruta), e.pgcode)
+
+        guardadas, rechazadas = [], []
+        for posicion, fila in enumerate(filas):
+            try:
+                escribir([fila])
+            except ERRORES_CONEXION as e:
+                self._apartar(ruta, rechazadas)
+                raise ErrorConexionSpool(e, filas[posicion:]) from None
+            except psycopg2.Error as e:
+                log.error("❌ Fila del spool rechazada por PostgreSQL (%s): %s", fila.topico, e)
+                rechazadas.append(fila)
+                continue
+            guardadas.append(fila)
+        self._apartar(ruta, rechazadas)
+        return guardadas
+
+    def _apartar(self, ruta, filas):
+        """Anexa filas rechazadas a <segmento>.rechazado (mismo formato de registro)"""
+        if not filas:
+            return
+        with open(ruta + '.rechazado', 'ab') as archivo:
+            archivo.write(_registro(filas))
+        with self._lock:
+            self.filas_rechazadas += len(filas)
+
+    def _recortar(self, ruta, tamano, registros):
+        """
+        Reescribe el segmento solo con los registros pendientes
+
+        Returns:
+            int: Tamaño nuevo del segmento
+        """
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as archivo:
+            for filas in registros:
+                if filas:
+                    archivo.write(_registro(filas))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+        nuevo = os.path.getsize(ruta)
+        with self._lock:
+            self._bytes -= tamano - nuevo
+        return nuevo
+
+    def _leer_segmento(self, ruta):
+        """Filas de cada registro válido de un segmento (una lista por registro)"""
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+        registros = []
+        posicion = 0
+        while posicion < len(contenido):
+            if posicion + CABECERA.size > len(contenido):
+                self._registrar_corrupto(ruta, posicion, "cabecera truncada")
+                break
+            longitud, crc = CABECERA.unpack_from(contenido, posicion)
+            inicio = posicion + CABECERA.size
+            datos = contenido[inicio:inicio + longitud]
+            if len(datos) < longitud or zlib.crc32(datos) != crc:
+                self._registrar_corrupto(ruta, posicion, "registro truncado o CRC inválido")
+                break
+            registros.append(leer_copy(datos.decode('utf-8')))
+            posicion = inicio + longitud
+        return registros
+
+    def _registrar_corrupto(self, ruta, posicion, motivo):
+        log.warning("⚠️ %s en %s (byte %d): se ignora el resto del segmento",
+                    motivo, os.path.basename(ruta), posicion)
+        with self._lock:
+            self.registros_corruptos += 1
+
+    # ============================================
+    # SEGMENTOS
+    # ============================================
+    def _segmentos(self):
+        """Rutas de los segmentos pendientes, ordenadas por secuencia"""
+        nombres = sorted(nombre for nombre in os.listdir(self.directorio)
+                         if nombre.startswith(PREFIJO) and nombre.endswith(EXTENSION))
+        return [os.path.join(self.directorio, nombre) for nombre in nombres]
+
+    @staticmethod
+    def _numero(ruta):
+        return int(os.path.basename(ruta)[len(PREFIJO):-len(EXTENSION)])
+
+    def _rotar(self):
+        """Cierra el segmento actual y abre el siguiente"""
+        self._cerrar_segmento()
+        self._secuencia += 1
+        ruta = os.path.join(self.directorio, f"{PREFIJO}{self._secuencia:012d}{EXTENSION}")
+        self._archivo = open(ruta, 'ab')
+        self._fsync_directorio()
+
+    def _cerrar_segmento(self):
+        if self._archivo is None:
+            return
+        self._fsync()
+        self._archivo.close()
+        self._archivo = None
+
+    def _fsync(self):
+        if self._archivo is None or not self._sucio:
+            return
+        os.fsync(self._archivo.fileno())
+        self._sucio = False
+        self._ultimo_fsync = time.monotonic()
+        self.fsyncs += 1
+
+    def _fsync_directorio(self):
+        """Hace durable la creación del segmento (no disponible en Windows)"""
+        try:
+            descriptor = os.open(self.directorio, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(descriptor)
+        except OSError:
+            pass
+        finally:
+            os.close(descriptor)
+
+
+# ============================================
+# REPRODUCTOR EN SEGUNDO PLANO
+# ============================================
+def iniciar_reproductor(spool, escribir, al_reproducir=None, segundos=SPOOL_REINTENTO):
+    """
+    Sincroniza el spool cada SPOOL_FSYNC segundos y lo reproduce cada
+    'segundos' en un hilo daemon, mientras haya filas pendientes
+
+    Args:
+        spool: Spool a vaciar
+        escribir: Función (filas) que guarda y confirma las filas
+        al_reproducir: Callback (filas, desde, hasta) tras vaciar el spool (opcional)
+        segundos: Espera entre intentos de reproducción
+
+    Returns:
+        threading.Event: Evento que detiene el hilo al activarlo
+    """
+    detener = threading.Event()
+    tick = min(spool.intervalo_fsync, segundos) if spool.intervalo_fsync > 0 else segundos
+
+    def bucle():
+        proximo = 0
+        while not detener.wait(tick):
+            spool.sincronizar()
+            if time.monotonic() < proximo or not spool.pendiente():
+                continue
+            proximo = time.monotonic() + segundos
+            try:
+                filas, desde, hasta = spool.reproducir(escribir)
+            except ERRORES_CONEXION as e:
+                log.debug("Spool: PostgreSQL sigue sin responder (%s)", e)
+                continue
+            except Exception as e:
+                log.error("❌ Error reproduciendo el spool: %s", e)
+                continue
+            if filas and al_reproducir:
+                al_reproducir(filas, desde, hasta)
+
+    threading.Thread(target=bucle, name="reproductor_spool", daemon=True).start()
+    return detener
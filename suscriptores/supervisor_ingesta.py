@@ -0,0 +1,191 @@
+"""
+============================================
+SUPERVISOR DE INGESTA MULTIPROCESO
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Lanza N procesos de suscriptor_admin.py para repartir la ingesta
+entre varios núcleos. Cada trabajador tiene su propio cliente MQTT,
+su propio buffer de escritura y su propio pool de conexiones.
+
+Modos de reparto:
+- compartida: suscripción compartida MQTT v5 ($share/<grupo>/#); el
+  broker entrega cada mensaje a un solo trabajador del grupo. Un
+  flujo queda repartido entre trabajadores, así que no se cuentan
+  huecos de secuencia (ver suscriptores/secuencias.py)
+- particion: cada trabajador se suscribe a # y guarda solo los
+  tópicos cuyo hash (crc32) le corresponden; útil con brokers sin
+  suscripciones compartidas, a costa de recibir todo N veces
+
+El supervisor suma periódicamente los contadores message_count y
+error_count de cada trabajador.
+
+Uso:
+    python supervisor_ingesta.py --trabajadores 4
+    python supervisor_ingesta.py --trabajadores 4 --modo particion
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Agregar path para importar el suscriptor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Cargar variables de entorno antes de leer la configuración
+load_dotenv()
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+TRABAJADORES_DEFECTO = int(os.getenv('SUPERVISOR_TRABAJADORES', os.cpu_count() or 2))
+MODO_DEFECTO = os.getenv('SUPERVISOR_MODO', 'compartida')
+GRUPO_DEFECTO = os.getenv('MQTT_GRUPO_COMPARTIDO', 'admin')
+
+# Segundos entre reportes agregados
+INTERVALO_REPORTE = 10
+
+
+# ============================================
+# PROCESO TRABAJADOR
+# ============================================
+def _publicar_contadores(suscriptor, contadores, indice):
+    """Copia los contadores del trabajador al arreglo compartido"""
+    contadores[2 * indice] = suscriptor.message_count
+    contadores[2 * indice + 1] = suscriptor.error_count
+
+
+def trabajador(indice, total, modo, grupo, contadores):
+    """
+    Punto de entrada de cada proceso trabajador
+
+    Args:
+        indice: Número del trabajador
+        total: Número total de trabajadores
+        modo: 'compartida' o 'particion'
+        grupo: Grupo de suscripción compartida
+        contadores: multiprocessing.Array con 2 contadores por trabajador
+    """
+    from suscriptores import suscriptor_admin
+
+    suscriptor_admin.configurar_trabajador(indice, total, modo, grupo)
+
+    def reportar():
+        while True:
+            _publicar_contadores(suscriptor_admin, contadores, indice)
+            time.sleep(1)
+
+    threading.Thread(target=reportar, name="contadores", daemon=True).start()
+    try:
+        suscriptor_admin.main()
+    finally:
+        _publicar_contadores(suscriptor_admin, contadores, indice)
+
+
+# ============================================
+# SUPERVISOR
+# ============================================
+def totales(contadores, total):
+    """
+    Suma los contadores de todos los trabajadores
+
+    Returns:
+        tuple: (mensajes, errores, lista de (mensajes, errores) por trabajador)
+    """
+    por_trabajador = [(contadores[2 * i], contadores[2 * i + 1]) for i in range(total)]
+    return (
+        sum(m for m, _ in por_trabajador),
+        sum(e for _, e in por_trabajador),
+        por_trabajador
+    )
+
+
+def mostrar_totales(contadores, total, titulo="📊 TOTALES DE INGESTA"):
+    """Imprime los totales agregados y el detalle por trabajador"""
+    mensajes, errores, por_trabajador = totales(contadores, total)
+    print("\n" + "=" * 60)
+    print(titulo)
+    print("=" * 60)
+    for i, (m, e) in enumerate(por_trabajador):
+        print(f"   Trabajador {i}: {m} guardados, {e} errores")
+    print(f"✅ Mensajes guardados: {mensajes}")
+    print(f"❌ Errores: {errores}")
+    print("=" * 60 + "\n")
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Supervisor de ingesta multiproceso")
+    parser.add_argument('--trabajadores', type=int, default=TRABAJADORES_DEFECTO,
+                        help="Número de procesos trabajadores")
+    parser.add_argument('--modo', choices=('compartida', 'particion'), default=MODO_DEFECTO,
+                        help="Reparto de mensajes entre trabajadores")
+    parser.add_argument('--grupo', default=GRUPO_DEFECTO, help="Grupo de suscripción compartida")
+    args = parser.parse_args()
+
+    total = max(1, args.trabajadores)
+
+    print("=" * 60)
+    print("🧭 SUPERVISOR DE INGESTA MULTIPROCESO")
+    print("   Universidad Militar Nueva Granada")
+    print("=" * 60)
+    print(f"👷 Trabajadores: {total}")
+    if args.modo == 'compartida':
+        print(f"🔀 Modo: suscripción compartida $share/{args.grupo}/# (MQTT v5)")
+    else:
+        print("🔀 Modo: partición por hash de tópico")
+    print("=" * 60 + "\n")
+
+    contadores = multiprocessing.Array('q', 2 * total)
+    procesos = []
+    for i in range(total):
+        proceso = multiprocessing.Process(
+            target=trabajador,
+            args=(i, total, args.modo, args.grupo, contadores),
+            name=f"ingesta_{i}"
+        )
+        proceso.start()
+        procesos.append(proceso)
+
+    # SIGTERM al supervisor se reenvía como SIGINT para que cada
+    # trabajador vacíe su buffer (Ctrl+C ya llega a todo el grupo)
+    def reenviar_sigterm(signum, frame):
+        for proceso in procesos:
+            if proceso.is_alive():
+                os.kill(proceso.pid, signal.SIGINT)
+        raise KeyboardInterrupt
+
+    if hasattr(signal, 'SIGTERM') and os.name != 'nt':
+        signal.signal(signal.SIGTERM, reenviar_sigterm)
+
+    anterior = 0
+    try:
+        while any(p.is_alive() for p in procesos):
+            time.sleep(INTERVALO_REPORTE)
+            mensajes, errores, _ = totales(contadores, total)
+            tasa = (mensajes - anterior) / INTERVALO_REPORTE
+            anterior = mensajes
+            vivos = sum(p.is_alive() for p in procesos)
+            timestamp = datetime.now().strftime('%H:%M:%S')
+            print(f"[{timestamp}] 📊 {vivos}/{total} trabajadores | "
+                  f"Guardados: {mensajes} ({tasa:.0f} msgs/s) | Errores: {errores}")
+    except KeyboardInterrupt:
+        print("\n\n⏹️  Deteniendo trabajadores...")
+    finally:
+        for proceso in procesos:
+            proceso.join(timeout=60)
+            if proceso.is_alive():
+                proceso.terminate()
+
+    mostrar_totales(contadores, total)
+    print("👋 Supervisor detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ todos los mensajes recibidos en la base de datos PostgreSQL.
 
 Funcionalidades:
 - Suscripción a todos los tópicos
-- Almacenamiento automático en PostgreSQL
+- Almacenamiento automático en PostgreSQL (escritura por lotes)
 - Procesamiento de mensajes JSON
 - Registro de timestamp de recepción
 - Manejo de errores y reconexión
@@ -19,20 +19,50 @@ Uso:
 """
 
 import paho.mqtt.client as mqtt
-import json
+import logging
 import psycopg2
 from datetime import datetime
 import os
 import sys
+import time
+import zlib
+from collections import Counter
 from dotenv import load_dotenv
 
 # Agregar path para importar db_config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.db_config import crear_conexion, DB_CONFIG
+from database.db_config import (
+    crear_conexion, inicializar_pool, obtener_conexion_pool, liberar_conexion_pool,
+    cerrar_pool, conexion, tablas_faltantes, ESCRITORES_INGESTA, FilaMensaje, DB_CONFIG
+)
+from database.particiones import iniciar_mantenimiento_periodico
+from database.estadisticas import actualizar_estadisticas, ESTADISTICAS_INCREMENTALES
+from database.submuestreo import iniciar_submuestreo_periodico, reconstruir, SUBMUESTREO_INTERVALO
+from suscriptores.buffer_escritura import BufferEscritura
+from sensores.metricas import Contador, Medidor, Histograma, iniciar_exportador
+from suscriptores import decodificacion
+from suscriptores.decodificacion import extraer_campos, como_cadena_json, ErrorDecodificacion
+from sensores.formato_compacto import decodificar, a_json, SUFIJO_COMPACTO, TIPO_CONTENIDO
+from sensores.formato_lote import es_topico_lote, topico_de_lectura, separar_lote
+from suscriptores.deduplicacion import (
+    CacheClaves, clave_mensaje, descartar_duplicados, iniciar_purga_periodica, DEDUP_ACTIVO
+)
+from suscriptores import deduplicacion
+from suscriptores.spool import Spool, iniciar_reproductor, ERRORES_CONEXION, SPOOL_ACTIVO, SPOOL_DIR
+from suscriptores.ultimo_valor import (
+    CacheUltimoValor, cargar_desde_db, iniciar_persistencia, persistir, registrar_rutas,
+    ULTIMO_VALOR_PERSISTIR
+)
+from suscriptores.secuencias import DetectorHuecos
+from suscriptores.registro import configurar_registro, detener_registro, iniciar_resumen, Muestreador
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Eventos en tiempo de ejecución (escritos por el hilo de registro)
+log = logging.getLogger('suscriptor')
+log_mensajes = logging.getLogger('suscriptor.mensajes')
+
 # ============================================
 # CONFIGURACIÓN
 # ============================================
@@ -47,12 +77,122 @@ CLIENT_ID = "suscriptor_admin"
 # Suscripción a TODOS los tópicos
 TOPIC_ALL = "#"
 
+# Tópico efectivo y versión de protocolo (el supervisor los cambia
+# para cada trabajador, ver configurar_trabajador)
+TOPIC_SUSCRIPCION = TOPIC_ALL
+MQTT_PROTOCOLO = mqtt.MQTTv311
+
+# Escritura por lotes: se vacía al llegar a BUFFER_TAM_LOTE filas
+# o cuando la fila más antigua lleva BUFFER_LATENCIA_MAX segundos
+BUFFER_TAM_LOTE = int(os.getenv('BUFFER_TAM_LOTE', 500))
+BUFFER_LATENCIA_MAX = float(os.getenv('BUFFER_LATENCIA_MAX', 0.5))
+
+# Modo de ingesta: 'copy' (COPY FROM STDIN, más rápido) o 'insert'
+INGESTA_MODO = os.getenv('INGESTA_MODO', 'copy').lower()
+
+# Hilos escritores (cada uno con su conexión del pool) y cola acotada
+# entre el callback MQTT y los escritores
+BUFFER_HILOS = int(os.getenv('BUFFER_HILOS', 2))
+BUFFER_CAPACIDAD = int(os.getenv('BUFFER_CAPACIDAD', 10000))
+
+# Política al llenarse la cola: bloquear | descartar_nuevo | descartar_antiguo.
+# Con el spool activo 'bloquear' no espera: lo que no cabe va directo
+# al spool en lugar de detener el hilo de red de MQTT
+BUFFER_POLITICA = os.getenv('BUFFER_POLITICA', 'bloquear').lower()
+BUFFER_TIMEOUT_BLOQUEO = float(os.getenv('BUFFER_TIMEOUT_BLOQUEO', 1.0))
+
+# Puerto del exportador de métricas Prometheus (0 = desactivado) e
+# interfaz en la que escucha (/ultimo expone lecturas: solo local por defecto)
+METRICAS_PUERTO = int(os.getenv('METRICAS_PUERTO', 0))
+METRICAS_HOST = os.getenv('METRICAS_HOST', '127.0.0.1')
+
+# Crear particiones futuras (y aplicar retención) desde el suscriptor
+PARTICION_MANTENIMIENTO = os.getenv('PARTICION_MANTENIMIENTO', '1') == '1'
+
 # ============================================
 # VARIABLES GLOBALES
 # ============================================
 db_connection = None
+buffer_escritura = None
+escritor_ingesta = None   # escritor del buffer (lo reutiliza el spool)
+spool = None              # spool en disco para caídas de la DB (SPOOL_ACTIVO)
+detener_reproductor = None
+directorio_spool = SPOOL_DIR
+particion = None          # (indice, total) en modo partición por hash
+seguir_secuencias = True  # huecos de seq: solo si este proceso ve flujos completos
 message_count = 0
 error_count = 0
+conectado_antes = False
+muestreo_mensajes = Muestreador()   # registros por mensaje (REGISTRO_MUESTREO)
+cache_ultimo = CacheUltimoValor()    # último valor por (sensor_id, topico)
+claves_recientes = CacheClaves()     # claves de contenido vistas (DEDUP_ACTIVO)
+secuencias = DetectorHuecos()        # último seq por (sensor_id, tópico)
+
+
+def _metrica_buffer(clave):
+    """Lee una métrica del buffer al exponer /metrics"""
+    return buffer_escritura.metricas()[clave] if buffer_escritura else 0
+
+
+def _metrica_spool(clave):
+    """Lee una métrica del spool al exponer /metrics"""
+    return spool.metricas()[clave] if spool else 0
+
+
+# ============================================
+# MÉTRICAS (expuestas en /metrics si METRICAS_PUERTO > 0)
+# ============================================
+metrica_recibidos = Contador('mqtt_mensajes_recibidos_total', 'Mensajes MQTT recibidos por tópico', ('topico',))
+metrica_guardados = Contador('mqtt_mensajes_guardados_total', 'Mensajes confirmados en PostgreSQL por tópico', ('topico',))
+metrica_bytes = Contador('mqtt_bytes_recibidos_total', 'Bytes de payload MQTT recibidos')
+metrica_errores_json = Contador('mqtt_errores_json_total', 'Payloads que no son JSON válido')
+metrica_compactos = Contador('mqtt_mensajes_compactos_total', 'Payloads en formato compacto recibidos')
+metrica_errores_compacto = Contador('mqtt_errores_compacto_total', 'Payloads compactos inválidos (descartados)')
+metrica_lotes = Contador('mqtt_mensajes_lote_total', 'Mensajes por lote de un dispositivo recibidos')
+metrica_lecturas_lote = Contador('mqtt_lecturas_lote_total', 'Lecturas separadas de mensajes por lote')
+metrica_reconexiones_mqtt = Contador('mqtt_reconexiones_total', 'Reconexiones al broker MQTT')
+metrica_latencia_lote = Histograma('db_lote_segundos', 'Duración de escritura más commit por lote',
+                                   (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+metrica_tam_lote = Histograma('db_lote_filas', 'Filas por lote confirmado',
+                              (1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+metrica_espera_lote = Histograma('db_espera_segundos',
+                                 'Recepción a commit de la fila más antigua de cada lote (cola + escritura)',
+                                 (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+metrica_transito = Histograma('mqtt_transito_segundos',
+                              'Envío en el publicador (enviado_ms) a recepción en el suscriptor',
+                              (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+metrica_perdidos = Contador('mqtt_mensajes_perdidos_total', 'Huecos en la secuencia (seq) por dispositivo',
+                            ('sensor_id',))
+metrica_desordenados = Contador('mqtt_mensajes_desordenados_total', 'Mensajes con seq menor al último visto')
+metrica_reinicios_seq = Contador('mqtt_reinicios_secuencia_total', 'Publicadores que reiniciaron su seq')
+Medidor('buffer_profundidad_cola', 'Filas en cola esperando escritura',
+        funcion=lambda: buffer_escritura.pendientes() if buffer_escritura else 0)
+Contador('buffer_filas_descartadas_total', 'Filas descartadas por cola llena',
+         funcion=lambda: _metrica_buffer('filas_descartadas'))
+Contador('db_filas_fallidas_total', 'Filas que no se pudieron guardar',
+         funcion=lambda: _metrica_buffer('filas_fallidas'))
+Contador('db_reconexiones_total', 'Reconexiones a PostgreSQL de los hilos escritores',
+         funcion=lambda: _metrica_buffer('reconexiones'))
+Medidor('spool_bytes', 'Bytes en disco pendientes de reproducir en PostgreSQL',
+        funcion=lambda: _metrica_spool('bytes'))
+Medidor('spool_segmentos', 'Segmentos del spool pendientes',
+        funcion=lambda: _metrica_spool('segmentos'))
+Contador('spool_filas_escritas_total', 'Filas guardadas en el spool por falla o lentitud de la DB',
+         funcion=lambda: _metrica_spool('filas_escritas'))
+Contador('spool_filas_reproducidas_total', 'Filas del spool cargadas en PostgreSQL',
+         funcion=lambda: _metrica_spool('filas_reproducidas'))
+Contador('spool_filas_descartadas_total', 'Filas descartadas por spool lleno',
+         funcion=lambda: _metrica_spool('filas_descartadas'))
+Contador('spool_registros_corruptos_total', 'Registros del spool truncados o con CRC inválido',
+         funcion=lambda: _metrica_spool('registros_corruptos'))
+Contador('spool_filas_rechazadas_total', 'Filas del spool rechazadas por PostgreSQL (apartadas en .rechazado)',
+         funcion=lambda: _metrica_spool('filas_rechazadas'))
+metrica_duplicados = Contador('mqtt_mensajes_duplicados_total',
+                              'Mensajes repetidos descartados en memoria (reenvíos QoS 1)')
+Contador('db_filas_duplicadas_total', 'Filas descartadas por el escritor (clave ya en mensajes_claves)',
+         funcion=lambda: deduplicacion.duplicados_db)
+Contador('suscriptor_errores_total', 'Errores del suscriptor (encolado, guardado, procesamiento)',
+         funcion=lambda: error_count)
 
 # ============================================
 # FUNCIONES DE BASE DE DATOS
@@ -73,9 +213,65 @@ def conectar_base_datos():
         return False
 
 
-def guardar_mensaje(topico, mensaje_texto, sensor_id=None, valor_numerico=None, unidad=None, ip_origen=None):
+def tablas_requeridas():
+    """Tablas que usan las funciones activadas por la configuración"""
+    tablas = ['mensajes_mqtt']
+    if DEDUP_ACTIVO:
+        tablas.append('mensajes_claves')
+    if ESTADISTICAS_INCREMENTALES:
+        tablas.append('estadisticas_sensores')
+    if ULTIMO_VALOR_PERSISTIR > 0:
+        tablas.append('ultimo_valor')
+    if SUBMUESTREO_INTERVALO > 0:
+        tablas.extend(['mensajes_1m', 'mensajes_1h', 'mensajes_1d', 'submuestreo_estado'])
+    return tablas
+
+
+def verificar_esquema():
+    """
+    Comprueba que existan las tablas que necesita la configuración
+    
+    Sin mensajes_claves, por ejemplo, cada lote fallaría con
+    ProgrammingError (que no va al spool) y se perderían los datos.
+    
+    Returns:
+        bool: True si no falta ninguna
+    """
+    try:
+        faltantes = tablas_faltantes(db_connection, tablas_requeridas())
+    except psycopg2.Error as e:
+        print(f"❌ No se pudo verificar el esquema: {e}")
+        return False
+    if faltantes:
+        print(f"❌ Faltan tablas en la base de datos: {', '.join(faltantes)}")
+        print("   Ejecuta database/schema.sql (es idempotente) o setup_sistema.py")
+        return False
+    return True
+
+
+def guardar_lote(filas):
     """
-    Guarda un mensaje en la base de datos
+    Encola las filas de un mensaje por lote para escribirlas en el mismo lote
+    
+    Args:
+        filas: Lista de FilaMensaje
+    
+    Returns:
+        bool: True si las filas quedaron encoladas, False si la cola las descartó
+    """
+    if not buffer_escritura:
+        return False
+    
+    return buffer_escritura.agregar(filas)
+
+
+def guardar_mensaje(topico, mensaje_texto, sensor_id=None, valor_numerico=None, unidad=None, ip_origen=None,
+                    timestamp_recepcion=None):
+    """
+    Encola un mensaje para guardarlo en la base de datos
+    
+    La escritura real la hace el buffer por lotes; el timestamp de
+    recepción se toma aquí para no depender del momento del vaciado.
     
     Args:
         topico: Tópico MQTT
@@ -84,106 +280,386 @@ def guardar_mensaje(topico, mensaje_texto, sensor_id=None, valor_numerico=None,
         valor_numerico: Valor numérico extraído
         unidad: Unidad de medida
         ip_origen: IP de origen (opcional)
+        timestamp_recepcion: Momento de recepción (por defecto ahora)
     
     Returns:
-        bool: True si se guardó exitosamente
+        bool: True si el mensaje quedó encolado, False si la cola lo descartó
+    """
+    if not buffer_escritura:
+        return False
+    
+    return buffer_escritura.agregar(FilaMensaje(
+        topico,
+        mensaje_texto,
+        timestamp_recepcion or datetime.now(),
+        sensor_id,
+        valor_numerico,
+        unidad,
+        ip_origen
+    ))
+
+
+def al_confirmar_lote(filas):
+    """Callback del buffer tras guardar un lote"""
+    global message_count
+    message_count += len(filas)
+    for topico, cantidad in Counter(fila.topico for fila in filas).items():
+        metrica_guardados.inc(cantidad, (topico,))
+
+
+def al_medir_lote(filas, segundos):
+    """Callback del buffer con la duración de cada lote confirmado"""
+    metrica_latencia_lote.observar(segundos)
+    metrica_tam_lote.observar(len(filas))
+    metrica_espera_lote.observar((datetime.now() - filas[0].timestamp_recepcion).total_seconds())
+
+
+def medir_secuencia(sensor_id, topico, seq, enviado_ms):
     """
-    global db_connection, message_count, error_count
+    Mide el tránsito y los huecos de secuencia de un mensaje instrumentado
+    
+    Ver suscriptores/secuencias.py.
     
+    Args:
+        sensor_id: Dispositivo que publicó
+        topico: Tópico del mensaje (sin el sufijo /c)
+        seq: Número de secuencia del flujo (None si no viene)
+        enviado_ms: Hora de envío en ms desde epoch (None si no viene)
+    """
+    if isinstance(enviado_ms, (int, float)):
+        metrica_transito.observar(max(0.0, time.time() - enviado_ms / 1000))
+    if not seguir_secuencias or not isinstance(seq, int):
+        return
+    perdidos, desordenado, reinicio = secuencias.registrar((sensor_id, topico), seq)
+    if perdidos:
+        metrica_perdidos.inc(perdidos, (sensor_id,))
+        log.debug("🕳️ %d mensaje(s) perdido(s) de %s en %s antes de seq %d", perdidos, sensor_id, topico, seq)
+    elif desordenado:
+        metrica_desordenados.inc()
+    elif reinicio:
+        metrica_reinicios_seq.inc()
+
+
+def guardar_en_spool(filas):
+    """
+    Pasa al spool en disco filas que no llegaron a PostgreSQL
+    
+    Returns:
+        bool: True si quedaron en disco
+    """
+    if not spool:
+        return False
     try:
-        if not db_connection or db_connection.closed:
-            print("⚠️ Reconectando a base de datos...")
-            if not conectar_base_datos():
-                return False
-        
-        cursor = db_connection.cursor()
-        
-        query = """
-        INSERT INTO mensajes_mqtt 
-        (topico, mensaje, sensor_id, valor_numerico, unidad, ip_origen)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        cursor.execute(query, (
-            topico,
-            mensaje_texto,
-            sensor_id,
-            valor_numerico,
-            unidad,
-            ip_origen
-        ))
-        
-        db_connection.commit()
-        cursor.close()
-        
-        message_count += 1
-        return True
-        
-    except psycopg2.Error as e:
-        error_count += 1
-        print(f"❌ Error al guardar en DB: {e}")
-        
-        # Intentar reconectar
-        try:
-            if db_connection:
-                db_connection.rollback()
-            conectar_base_datos()
-        except:
-            pass
-        
+        return spool.agregar(filas)
+    except OSError as e:
+        log.error("❌ Error escribiendo en el spool: %s", e)
         return False
 
 
-def procesar_mensaje_json(topico, mensaje_texto):
+def al_fallar_lote(filas, error):
+    """Callback del buffer cuando un lote no se pudo guardar"""
+    global error_count
+    # Solo las caídas de conexión van al spool: una fila inválida
+    # fallaría igual al reproducirla
+    if isinstance(error, ERRORES_CONEXION) and guardar_en_spool(filas):
+        log.warning("💾 %d mensaje(s) guardados en el spool (DB no disponible)", len(filas))
+        return
+    error_count += len(filas)
+    log.error("❌ Error al guardar %d mensaje(s) en DB: %s", len(filas), error)
+
+
+def al_descartar_fila(fila):
+    """Callback del buffer cuando la cola llena descarta un mensaje"""
+    global error_count
+    # DB lenta: el mensaje va al spool en lugar de perderse
+    if guardar_en_spool([fila]):
+        return
+    error_count += 1
+
+
+def escribir_desde_spool(filas):
+    """Guarda filas reproducidas del spool en una transacción"""
+    with conexion() as conn:
+        escritor_ingesta(conn, filas)
+    al_confirmar_lote(filas)
+
+
+def al_reproducir_spool(filas, desde, hasta):
+    """Callback del reproductor tras vaciar el spool"""
+    log.info("💾 Spool reproducido: %d mensaje(s) de %s a %s", filas, desde, hasta)
+    # Los minutos ya submuestreados no incluyen estas filas
+    if SUBMUESTREO_INTERVALO > 0:
+        try:
+            reconstruir(desde, hasta)
+        except psycopg2.Error as e:
+            log.warning("⚠️ No se pudo reconstruir el submuestreo: %s", e)
+
+
+def crear_escritor(guardar, estadisticas=ESTADISTICAS_INCREMENTALES, deduplicar=DEDUP_ACTIVO):
+    """
+    Compone el escritor del buffer: si se pide, descarta los mensajes ya
+    guardados, guarda el lote y acumula sus estadísticas, todo antes
+    del commit (todo o nada)
+    
+    Args:
+        guardar: Escritor de ESCRITORES_INGESTA
+        estadisticas: Actualizar estadisticas_sensores con cada lote
+        deduplicar: Registrar las claves en mensajes_claves y omitir repetidos
+    
+    Returns:
+        callable: escritor(conexion, filas)
+    """
+    if not estadisticas and not deduplicar:
+        return guardar
+    
+    def escribir_lote(conexion, filas):
+        if deduplicar:
+            filas = descartar_duplicados(conexion, filas)
+        guardar(conexion, filas)
+        if estadisticas:
+            actualizar_estadisticas(conexion, filas)
+    
+    escribir_lote.__name__ = '+'.join(
+        [guardar.__name__] + (['estadisticas'] if estadisticas else []) + (['dedup'] if deduplicar else [])
+    )
+    return escribir_lote
+
+
+def iniciar_buffer():
+    """Crea y arranca el buffer de escritura por lotes"""
+    global buffer_escritura, escritor_ingesta
+    if INGESTA_MODO not in ESCRITORES_INGESTA:
+        print(f"⚠️ INGESTA_MODO '{INGESTA_MODO}' desconocido, usando 'copy'")
+    escritor = crear_escritor(ESCRITORES_INGESTA.get(INGESTA_MODO, ESCRITORES_INGESTA['copy']))
+    escritor_ingesta = escritor
+    
+    # Una conexión por hilo escritor, una libre para reconexiones y
+    # otra para el reproductor del spool
+    inicializar_pool(BUFFER_HILOS, BUFFER_HILOS + (2 if SPOOL_ACTIVO else 1))
+    
+    buffer_escritura = BufferEscritura(
+        escritor,
+        tam_lote=BUFFER_TAM_LOTE,
+        latencia_max=BUFFER_LATENCIA_MAX,
+        hilos=BUFFER_HILOS,
+        capacidad=BUFFER_CAPACIDAD,
+        politica=BUFFER_POLITICA,
+        timeout_bloqueo=0 if SPOOL_ACTIVO else BUFFER_TIMEOUT_BLOQUEO,
+        conectar=obtener_conexion_pool,
+        liberar=liberar_conexion_pool,
+        al_confirmar=al_confirmar_lote,
+        al_fallar=al_fallar_lote,
+        al_descartar=al_descartar_fila,
+        al_medir=al_medir_lote
+    )
+    buffer_escritura.iniciar()
+    print(f"📦 Buffer de escritura ({escritor.__name__}): lotes de {BUFFER_TAM_LOTE} filas / {BUFFER_LATENCIA_MAX}s")
+    print(f"🧵 Escritores: {BUFFER_HILOS} hilos | Cola: {BUFFER_CAPACIDAD} filas ({BUFFER_POLITICA}"
+          f"{', desborde al spool' if SPOOL_ACTIVO else ''})")
+
+
+def iniciar_spool():
+    """Abre el spool en disco y arranca su reproductor"""
+    global spool, detener_reproductor
+    spool = Spool(directorio_spool)
+    detener_reproductor = iniciar_reproductor(spool, escribir_desde_spool, al_reproducir_spool)
+    metricas = spool.metricas()
+    print(f"💾 Spool en {directorio_spool}: {metricas['segmentos']} segmento(s) pendientes "
+          f"({metricas['bytes'] / 1024 / 1024:.1f} MB)")
+
+
+def detener_spool():
+    """Detiene el reproductor y cierra el segmento abierto (con fsync)"""
+    if detener_reproductor:
+        detener_reproductor.set()
+    if spool:
+        spool.cerrar()
+        if spool.pendiente():
+            print(f"💾 {spool.metricas()['bytes']} bytes quedan en el spool para el próximo arranque")
+
+
+def detener_buffer():
+    """Vacía el buffer pendiente y detiene el hilo de escritura (el pool sigue abierto)"""
+    if buffer_escritura:
+        pendientes = buffer_escritura.pendientes()
+        if pendientes:
+            print(f"💾 Escribiendo {pendientes} mensaje(s) pendientes...")
+        buffer_escritura.detener()
+
+
+# Campos de un mensaje del que no se pudo extraer nada
+SIN_CAMPOS = (None,) * 6
+
+
+def procesar_mensaje_json(topico, payload):
     """
     Procesa un mensaje JSON y extrae información relevante
     
+    Acepta el formato del simulador (sensor_id/valor/unidad) y el del
+    ESP32 (device_id/value/unit); ver suscriptores/decodificacion.py.
+    
     Args:
         topico: Tópico MQTT
-        mensaje_texto: Mensaje recibido
+        payload: Mensaje recibido (bytes tal como llega, o str)
     
     Returns:
-        tuple: (sensor_id, valor_numerico, unidad)
+        tuple: (mensaje_texto, sensor_id, valor_numerico, unidad, estado, seq, enviado_ms);
+               mensaje_texto siempre es JSON válido para la columna JSONB
+    
+    Raises:
+        UnicodeDecodeError: Si el payload no es UTF-8
     """
+    # orjson/simdjson parsean los bytes y el texto solo hace falta para
+    # guardarlo; json parsea str, así que se decodifica una vez antes
+    mensaje_texto = payload if isinstance(payload, str) else None
+    if mensaje_texto is None and decodificacion.BACKEND == 'json':
+        mensaje_texto = payload.decode('utf-8')
     try:
-        data = json.loads(mensaje_texto)
-        
-        sensor_id = data.get('sensor_id', None)
-        valor_numerico = data.get('valor', None)
-        unidad = data.get('unidad', None)
-        
-        return (sensor_id, valor_numerico, unidad)
+        campos = extraer_campos(topico, payload if mensaje_texto is None else mensaje_texto)
     
-    except json.JSONDecodeError:
-        # Si no es JSON, retornar None
-        return (None, None, None)
+    except ErrorDecodificacion:
+        # Si no es JSON, guardarlo como cadena JSON sin campos
+        metrica_errores_json.inc()
+        if mensaje_texto is None:
+            mensaje_texto = payload.decode('utf-8')
+        return (como_cadena_json(mensaje_texto),) + SIN_CAMPOS
     except Exception as e:
-        print(f"⚠️ Error procesando JSON: {e}")
-        return (None, None, None)
+        log.warning("⚠️ Error procesando JSON: %s", e)
+        campos = SIN_CAMPOS
+    
+    if mensaje_texto is None:
+        mensaje_texto = payload.decode('utf-8')
+    return (mensaje_texto,) + campos
+
+
+def procesar_mensaje_compacto(topico, payload):
+    """
+    Decodifica un payload en formato compacto (una o varias lecturas)
+    
+    Cada lectura se convierte al JSON del simulador, así la fila es la
+    misma que con un mensaje JSON; ver sensores/formato_compacto.py.
+    En un tópico de lotes cada lectura se guarda con el tópico de su
+    sensor.
+    
+    Args:
+        topico: Tópico MQTT (sin el sufijo /c)
+        payload: Payload binario
+    
+    Returns:
+        list: Tuplas (topico, mensaje_texto, sensor_id, valor_numerico, unidad, estado)
+    
+    Raises:
+        ValueError: Si el payload no es un formato compacto válido
+    """
+    lote = es_topico_lote(topico)
+    return [(topico_de_lectura(topico, lectura.tipo, lectura.sensor_id) if lote else topico,
+             a_json(lectura), lectura.sensor_id, lectura.valor, lectura.unidad, lectura.estado)
+            for lectura in decodificar(payload)]
+
+
+def procesar_lote_json(topico, payload):
+    """
+    Separa un mensaje por lote JSON en una lectura por sensor
+    
+    Ver sensores/formato_lote.py. Si el payload no tiene la forma de un
+    lote se guarda como un mensaje normal en el tópico del lote.
+    
+    Args:
+        topico: Tópico MQTT del lote
+        payload: Mensaje recibido (bytes)
+    
+    Returns:
+        tuple: (lecturas, seq, enviado_ms); lecturas es una lista de tuplas
+               (topico, mensaje_texto, sensor_id, valor_numerico, unidad, estado)
+               y seq/enviado_ms los del lote (None si no vienen)
+    """
+    try:
+        datos = decodificacion.decodificar(payload)
+        return separar_lote(topico, datos), datos.get('seq'), datos.get('enviado_ms')
+    except ValueError as e:
+        log.warning("⚠️ Lote inválido en %s: %s", topico, e)
+        campos = procesar_mensaje_json(topico, payload)
+        return [(topico,) + campos[:5]], campos[5], campos[6]
+
+
+def es_compacto(topico, msg):
+    """Indica si el mensaje usa el formato compacto (sufijo /c o content-type MQTT v5)"""
+    if topico.endswith(SUFIJO_COMPACTO):
+        return True
+    propiedades = getattr(msg, 'properties', None)
+    return getattr(propiedades, 'ContentType', None) == TIPO_CONTENIDO
+
+
+def configurar_trabajador(indice, total, modo='compartida', grupo='admin'):
+    """
+    Configura este proceso como uno de varios trabajadores de ingesta
+    
+    Args:
+        indice: Número del trabajador (0..total-1)
+        total: Número total de trabajadores
+        modo: 'compartida' (suscripción compartida MQTT v5 $share/<grupo>/#)
+              o 'particion' (cada trabajador guarda solo los tópicos cuyo
+              hash le corresponden)
+        grupo: Nombre del grupo de suscripción compartida
+    """
+    global CLIENT_ID, TOPIC_SUSCRIPCION, MQTT_PROTOCOLO, METRICAS_PUERTO, particion, directorio_spool, \
+        seguir_secuencias
+    
+    CLIENT_ID = f"suscriptor_admin_{indice}"
+    directorio_spool = os.path.join(SPOOL_DIR, f"trabajador_{indice}")
+    if METRICAS_PUERTO:
+        # Un puerto de métricas por trabajador
+        METRICAS_PUERTO += indice
+    if modo == 'compartida':
+        # El broker reparte los mensajes entre los miembros del grupo
+        TOPIC_SUSCRIPCION = f"$share/{grupo}/{TOPIC_ALL}"
+        MQTT_PROTOCOLO = mqtt.MQTTv5
+        particion = None
+        # Los mensajes de un mismo flujo se reparten entre trabajadores:
+        # cada uno vería huecos que recibió otro
+        seguir_secuencias = False
+    elif modo == 'particion':
+        TOPIC_SUSCRIPCION = TOPIC_ALL
+        particion = (indice, total)
+        seguir_secuencias = True
+    else:
+        raise ValueError(f"Modo de trabajador desconocido: {modo}")
+
+
+def pertenece_a_particion(topico):
+    """Indica si el tópico le corresponde a este trabajador (modo partición)"""
+    if particion is None:
+        return True
+    indice, total = particion
+    return zlib.crc32(topico.encode('utf-8')) % total == indice
 
 
 # ============================================
 # CALLBACKS MQTT
 # ============================================
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties=None):
     """Callback al conectarse al broker"""
+    global conectado_antes
     if rc == 0:
-        print("✅ Conectado al broker MQTT")
-        print(f"📡 Servidor: {MQTT_BROKER}:{MQTT_PORT}")
+        if conectado_antes:
+            metrica_reconexiones_mqtt.inc()
+        conectado_antes = True
+        log.info("✅ Conectado al broker MQTT %s:%s", MQTT_BROKER, MQTT_PORT)
         
         # Suscribirse a TODOS los tópicos
-        client.subscribe(TOPIC_ALL)
-        print(f"📥 Suscrito a: {TOPIC_ALL} (todos los tópicos)")
-        print("=" * 60)
-        print("🎧 Escuchando mensajes...\n")
+        client.subscribe(TOPIC_SUSCRIPCION)
+        log.info("📥 Suscrito a: %s (todos los tópicos)", TOPIC_SUSCRIPCION)
+        if particion:
+            log.info("🧩 Partición por hash: %d/%d", particion[0] + 1, particion[1])
+        log.info("🎧 Escuchando mensajes...")
     else:
-        print(f"❌ Error de conexión MQTT. Código: {rc}")
+        log.error("❌ Error de conexión MQTT. Código: %s", rc)
 
 
-def on_disconnect(client, userdata, rc):
+def on_disconnect(client, userdata, rc, properties=None):
     """Callback al desconectarse del broker"""
     if rc != 0:
-        print("⚠️ Desconexión inesperada del broker. Reconectando...")
+        log.warning("⚠️ Desconexión inesperada del broker. Reconectando...")
 
 
 def on_message(client, userdata, msg):
@@ -195,40 +671,91 @@ def on_message(client, userdata, msg):
         userdata: Datos de usuario
         msg: Mensaje recibido
     """
-    global message_count
-    
     try:
         topico = msg.topic
-        mensaje_texto = msg.payload.decode('utf-8')
+        if not pertenece_a_particion(topico):
+            return
         
-        # Procesar mensaje JSON
-        sensor_id, valor_numerico, unidad = procesar_mensaje_json(topico, mensaje_texto)
+        metrica_recibidos.inc(1, (topico,))
+        metrica_bytes.inc(len(msg.payload))
         
-        # Guardar en base de datos
-        if guardar_mensaje(topico, mensaje_texto, sensor_id, valor_numerico, unidad):
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            print(f"[{timestamp}] 💾 [{topico}] ", end='')
-            
-            if sensor_id:
-                print(f"Sensor: {sensor_id} ", end='')
-            if valor_numerico is not None:
-                print(f"Valor: {valor_numerico}", end='')
-                if unidad:
-                    print(f" {unidad}", end='')
-            
-            print(f" | Total: {message_count}")
+        compacto = es_compacto(topico, msg)
+        
+        # Reenvío de un mensaje ya recibido: se descarta sin procesarlo
+        if DEDUP_ACTIVO:
+            clave = clave_mensaje(topico, msg.payload, compacto=compacto)
+            if clave is not None and claves_recientes.visto(clave):
+                metrica_duplicados.inc()
+                return
+        
+        # Procesar mensaje: JSON (una lectura) o compacto (una o varias),
+        # guardado con el tópico sin el sufijo /c. Un mensaje por lote
+        # (dispositivos/<id>/lote) se separa en una fila por lectura con
+        # el tópico de cada sensor. seq/enviado_ms solo vienen en JSON
+        seq = enviado_ms = None
+        if compacto:
+            metrica_compactos.inc()
+            if topico.endswith(SUFIJO_COMPACTO):
+                topico = topico[:-len(SUFIJO_COMPACTO)]
+            try:
+                lecturas = procesar_mensaje_compacto(topico, msg.payload)
+            except ValueError as e:
+                metrica_errores_compacto.inc()
+                log.warning("⚠️ Payload compacto inválido en %s: %s", msg.topic, e)
+                return
+        elif es_topico_lote(topico):
+            lecturas, seq, enviado_ms = procesar_lote_json(topico, msg.payload)
         else:
-            print(f"❌ Error guardando mensaje de {topico}")
+            campos = procesar_mensaje_json(topico, msg.payload)
+            lecturas = ((topico,) + campos[:5],)
+            seq, enviado_ms = campos[5], campos[6]
+        if es_topico_lote(topico):
+            metrica_lotes.inc()
+            metrica_lecturas_lote.inc(len(lecturas))
+            if not lecturas:
+                return
+        recibido = datetime.now()
+        
+        # Tránsito desde el publicador y mensajes perdidos del flujo
+        if seq is not None or enviado_ms is not None:
+            medir_secuencia(lecturas[0][2], topico, seq, enviado_ms)
+        
+        for topico_fila, _, sensor_id, valor_numerico, unidad, estado in lecturas:
+            # Último valor del sensor (API /ultimo)
+            cache_ultimo.actualizar(sensor_id, topico_fila, valor_numerico, unidad, estado, recibido)
+        
+        # Guardar en base de datos; las lecturas de un mismo mensaje van
+        # juntas al mismo lote (una transacción)
+        if len(lecturas) == 1:
+            topico_fila, texto_fila, sensor_id, valor_numerico, unidad, _ = lecturas[0]
+            encolado = guardar_mensaje(topico_fila, texto_fila, sensor_id, valor_numerico, unidad,
+                                       timestamp_recepcion=recibido)
+        else:
+            encolado = guardar_lote([FilaMensaje(topico_fila, texto_fila, recibido,
+                                                 sensor_id, valor_numerico, unidad, None)
+                                     for topico_fila, texto_fila, sensor_id, valor_numerico, unidad, _
+                                     in lecturas])
+        
+        # Solo una muestra de los mensajes se registra (el resumen
+        # periódico da las tasas)
+        if encolado:
+            if muestreo_mensajes.tomar():
+                topico_fila, _, sensor_id, valor_numerico, unidad, _ = lecturas[-1]
+                log_mensajes.info("📥 [%s] Sensor: %s Valor: %s %s | Lecturas: %d | Guardados: %d",
+                                  topico_fila, sensor_id, valor_numerico, unidad or '', len(lecturas),
+                                  message_count)
+        else:
+            log.debug("❌ Error encolando mensaje de %s", msg.topic)
     
     except Exception as e:
         global error_count
         error_count += 1
-        print(f"❌ Error procesando mensaje: {e}")
+        log.error("❌ Error procesando mensaje: %s", e)
 
 
-def on_subscribe(client, userdata, mid, granted_qos):
+def on_subscribe(client, userdata, mid, granted_qos, properties=None):
     """Callback al suscribirse exitosamente"""
-    print(f"✅ Suscripción confirmada. QoS: {granted_qos}")
+    log.info("✅ Suscripción confirmada. QoS: %s", granted_qos)
 
 
 # ============================================
@@ -241,18 +768,38 @@ def mostrar_estadisticas():
     print("=" * 60)
     print(f"✅ Mensajes guardados: {message_count}")
     print(f"❌ Errores: {error_count}")
+    if DEDUP_ACTIVO:
+        print(f"♻️  Duplicados descartados: {claves_recientes.duplicados} en memoria, "
+              f"{deduplicacion.duplicados_db} en DB")
+    transito = metrica_transito.resumen()
+    if len(secuencias):
+        print(f"🕳️  Secuencias: {len(secuencias)} flujos, {secuencias.perdidos} perdidos, "
+              f"{secuencias.desordenados} desordenados, {secuencias.reinicios} reinicios")
+    if transito['total']:
+        print(f"🚚 Tránsito publicador→suscriptor: medio {transito['media'] * 1000:.1f} ms, "
+              f"p50 ≤{transito['p50'] * 1000:g} ms, p99 ≤{transito['p99'] * 1000:g} ms")
+    
+    if buffer_escritura:
+        metricas = buffer_escritura.metricas()
+        print(f"📦 Lotes escritos: {metricas['lotes_escritos']}")
+        print(f"📥 Cola: máx {metricas['profundidad_max']}/{metricas['capacidad']} filas")
+        print(f"🗑️  Descartados por cola llena: {metricas['filas_descartadas']}")
+        print(f"⏳ Esperas por contrapresión: {metricas['esperas_bloqueo']} "
+              f"({metricas['tiempo_bloqueado']}s)")
+    if spool:
+        metricas = spool.metricas()
+        print(f"💾 Spool: {metricas['filas_escritas']} a disco, "
+              f"{metricas['filas_reproducidas']} reproducidos, {metricas['filas_descartadas']} descartados")
     
     # Obtener estadísticas de la base de datos
     try:
         if db_connection and not db_connection.closed:
             cursor = db_connection.cursor()
             
-            # Total por tópico
+            # Total por tópico (tabla de agregados, sin recorrer mensajes_mqtt)
             cursor.execute("""
-                SELECT topico, COUNT(*) as cantidad
-                FROM mensajes_mqtt
-                GROUP BY topico
-                ORDER BY cantidad DESC
+                SELECT topico, total_mensajes
+                FROM estadisticas_topicos
                 LIMIT 10
             """)
             
@@ -270,8 +817,20 @@ def mostrar_estadisticas():
 # ============================================
 # FUNCIÓN PRINCIPAL
 # ============================================
+def resumen_ingesta():
+    """Contadores del resumen periódico del registro"""
+    return {
+        'recibidos': metrica_recibidos.total(),
+        'guardados': message_count,
+        'errores': error_count,
+        '=cola': buffer_escritura.pendientes() if buffer_escritura else 0,
+        '=spool_bytes': _metrica_spool('bytes'),
+    }
+
+
 def main():
     """Función principal"""
+    configurar_registro()
     print("=" * 60)
     print("👨‍💼 SUSCRIPTOR ADMINISTRATIVO - BASE DE DATOS")
     print("   Universidad Militar Nueva Granada")
@@ -286,10 +845,44 @@ def main():
     if not conectar_base_datos():
         print("❌ No se pudo conectar a la base de datos. Verifica la configuración.")
         return
+    if not verificar_esquema():
+        db_connection.close()
+        return
+    
+    # Iniciar escritura por lotes (y el spool para cuando la DB no responda)
+    iniciar_buffer()
+    if SPOOL_ACTIVO:
+        iniciar_spool()
+    
+    # Purgar las claves de deduplicación fuera de la ventana
+    if DEDUP_ACTIVO:
+        iniciar_purga_periodica()
+    
+    # Garantizar las particiones del día y de los próximos días
+    if PARTICION_MANTENIMIENTO:
+        iniciar_mantenimiento_periodico()
+    
+    # Mantener al día las tablas de 1 minuto / 1 hora / 1 día
+    if SUBMUESTREO_INTERVALO > 0:
+        iniciar_submuestreo_periodico()
+    
+    # Último valor por sensor: partir de lo guardado y persistir cambios
+    if ULTIMO_VALOR_PERSISTIR > 0:
+        print(f"🔎 {cargar_desde_db(cache_ultimo)} último(s) valor(es) cargados")
+    detener_persistencia = iniciar_persistencia(cache_ultimo)
+    registrar_rutas(cache_ultimo)
+    
+    # Exportador de métricas Prometheus (y API /ultimo)
+    if METRICAS_PUERTO and iniciar_exportador(METRICAS_PUERTO, METRICAS_HOST):
+        print(f"📈 Métricas en http://{METRICAS_HOST}:{METRICAS_PUERTO}/metrics")
+        print(f"🔎 Último valor en http://{METRICAS_HOST}:{METRICAS_PUERTO}/ultimo")
+    
+    # Línea de resumen periódica en lugar de una línea por mensaje
+    iniciar_resumen(resumen_ingesta)
     
     # Crear cliente MQTT
     print("🔄 Creando cliente MQTT...")
-    client = mqtt.Client(client_id=CLIENT_ID)
+    client = mqtt.Client(client_id=CLIENT_ID, protocol=MQTT_PROTOCOLO)
     
     # Configurar credenciales si existen
     if MQTT_USERNAME and MQTT_PASSWORD:
@@ -303,6 +896,7 @@ def main():
     client.on_subscribe = on_subscribe
     
     # Conectar al broker
+    interrumpido = False
     try:
         print(f"🔄 Conectando a broker MQTT...")
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
@@ -314,17 +908,33 @@ def main():
     
     except KeyboardInterrupt:
         print("\n\n⏹️  Deteniendo suscriptor...")
-        mostrar_estadisticas()
+        interrumpido = True
     except Exception as e:
         print(f"\n❌ Error: {e}")
     finally:
-        # Limpiar recursos
-        if client:
-            client.disconnect()
+        # Cierre en un solo orden: los hilos que usan el pool paran,
+        # ultimo_valor se guarda con el pool abierto, el buffer se vacía
+        # con el spool abierto (por si la DB no responde) y el pool se
+        # cierra al final
+        client.disconnect()
+        detener_persistencia.set()
+        if detener_reproductor:
+            detener_reproductor.set()
+        if ULTIMO_VALOR_PERSISTIR > 0:
+            try:
+                persistir(cache_ultimo)
+            except Exception as e:
+                log.warning("⚠️ No se pudo guardar ultimo_valor: %s", e)
+        detener_buffer()
+        detener_spool()
+        cerrar_pool()
+        if interrumpido:
+            mostrar_estadisticas()
         if db_connection and not db_connection.closed:
             db_connection.close()
             print("🔌 Conexión a base de datos cerrada")
         print("👋 Suscriptor detenido")
+        detener_registro()
 
 
 if __name__ == "__main__":
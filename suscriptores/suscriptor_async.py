@@ -0,0 +1,333 @@
+"""
+============================================
+SUSCRIPTOR ADMINISTRATIVO ASYNCIO - BASE DE DATOS
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Variante asyncio de suscriptor_admin.py. Un único hilo atiende el
+cliente MQTT y varias tareas escritoras que guardan lotes en
+PostgreSQL en paralelo (cada una con su conexión del pool async),
+sin un hilo por conexión.
+
+Comparte con suscriptor_admin.py la extracción de campos de los
+mensajes JSON (procesar_mensaje_json), las filas de mensajes_mqtt
+(FilaMensaje), las estadísticas incrementales y la configuración del
+broker, la base de datos y el buffer (.env). No es un reemplazo
+directo: no decodifica el formato compacto (tópicos /c) ni separa los
+lotes JSON (se guardan como un mensaje), y no tiene deduplicación,
+spool en disco, último valor, submuestreo, secuencias ni /metrics.
+
+Dependencias opcionales (ver requirements.txt):
+    pip install aiomqtt==1.2.1 asyncpg
+
+Uso:
+    python suscriptor_async.py
+"""
+
+import asyncio
+import signal
+import time
+from datetime import datetime
+from decimal import Decimal
+import os
+import sys
+
+try:
+    import aiomqtt
+    import asyncpg
+except ImportError as e:
+    print(f"❌ Falta una dependencia del motor asyncio: {e.name}")
+    print("   Instalar con: pip install aiomqtt==1.2.1 asyncpg")
+    sys.exit(1)
+
+# Agregar path para importar db_config y el suscriptor síncrono
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import DB_CONFIG, FilaMensaje, COLUMNAS_MENSAJES
+from database.estadisticas import acumular_estadisticas, valor_numerico, UPSERT_ESTADISTICAS_ASYNC
+from suscriptores.suscriptor_admin import (
+    procesar_mensaje_json, MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
+    TOPIC_ALL, BUFFER_TAM_LOTE, BUFFER_LATENCIA_MAX, BUFFER_HILOS, BUFFER_CAPACIDAD,
+    ESTADISTICAS_INCREMENTALES
+)
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+CLIENT_ID = "suscriptor_admin_async"
+
+# Tópicos a suscribir, separados por coma (por defecto todos)
+SUSCRIPCIONES = [t.strip() for t in os.getenv('ASYNC_SUSCRIPCIONES', TOPIC_ALL).split(',') if t.strip()]
+
+# Tareas escritoras concurrentes (una conexión del pool cada una)
+ESCRITORES = int(os.getenv('ASYNC_ESCRITORES', BUFFER_HILOS))
+
+# Segundos de espera antes de reintentar la conexión al broker
+REINTENTO_MQTT = 5
+
+# ============================================
+# VARIABLES GLOBALES
+# ============================================
+message_count = 0
+error_count = 0
+
+# Marca de fin para las tareas escritoras
+_FIN = object()
+
+
+# ============================================
+# ESCRITURA EN BASE DE DATOS
+# ============================================
+async def crear_pool_async():
+    """
+    Crea el pool de conexiones asyncpg
+
+    Returns:
+        asyncpg.Pool: Pool con una conexión por tarea escritora
+    """
+    return await asyncpg.create_pool(
+        host=DB_CONFIG['host'],
+        port=int(DB_CONFIG['port']),
+        database=DB_CONFIG['database'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        min_size=1,
+        max_size=ESCRITORES
+    )
+
+
+async def copiar_lote(pool, lote):
+    """
+    Guarda un lote con COPY binario (copy_records_to_table)
+
+    Las estadísticas del lote se actualizan en la misma transacción.
+
+    Args:
+        pool: Pool asyncpg
+        lote: Lista de FilaMensaje
+    """
+    async with pool.acquire() as conexion:
+        async with conexion.transaction():
+            await conexion.copy_records_to_table(
+                'mensajes_mqtt',
+                records=lote,
+                columns=COLUMNAS_MENSAJES
+            )
+            if ESTADISTICAS_INCREMENTALES:
+                await conexion.executemany(UPSERT_ESTADISTICAS_ASYNC, acumular_estadisticas(lote))
+
+
+async def escribir_lote(pool, lote):
+    """Escribe un lote; si se rechaza, reintenta fila por fila para aislar la inválida"""
+    global message_count, error_count
+
+    try:
+        await copiar_lote(pool, lote)
+        message_count += len(lote)
+        return
+    except (OSError, asyncpg.exceptions.InterfaceError,
+            asyncpg.exceptions.PostgresConnectionError) as e:
+        # Conexión perdida: el pool la reemplaza en el próximo acquire
+        error_count += len(lote)
+        print(f"❌ Conexión a DB perdida al escribir lote: {e}")
+        return
+    except Exception as e:
+        print(f"⚠️ Lote rechazado ({e.__class__.__name__}), reintentando fila por fila")
+
+    for fila in lote:
+        try:
+            await copiar_lote(pool, [fila])
+            message_count += 1
+        except Exception as e:
+            error_count += 1
+            print(f"❌ Error al guardar mensaje de {fila.topico}: {e}")
+
+
+async def recolectar_lote(cola):
+    """
+    Espera el primer elemento y acumula hasta llenar el lote o vencer el plazo
+
+    Returns:
+        tuple: (lote, terminar)
+    """
+    primero = await cola.get()
+    if primero is _FIN:
+        return [], True
+
+    lote = [primero]
+    limite = time.monotonic() + BUFFER_LATENCIA_MAX
+
+    while len(lote) < BUFFER_TAM_LOTE:
+        if cola.empty():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                fila = await asyncio.wait_for(cola.get(), restante)
+            except asyncio.TimeoutError:
+                break
+        else:
+            fila = cola.get_nowait()
+        if fila is _FIN:
+            return lote, True
+        lote.append(fila)
+
+    return lote, False
+
+
+async def tarea_escritora(pool, cola):
+    """Tarea que vacía la cola en lotes hasta recibir la marca de fin"""
+    terminar = False
+    while not terminar:
+        lote, terminar = await recolectar_lote(cola)
+        if lote:
+            await escribir_lote(pool, lote)
+
+
+# ============================================
+# RECEPCIÓN MQTT
+# ============================================
+def crear_fila(topico, payload):
+    """
+    Convierte un mensaje en FilaMensaje con los tipos de las columnas
+
+    El COPY binario de asyncpg no convierte tipos como psycopg2: un
+    valor "23.5" o una unidad numérica rechazarían el lote entero.
+
+    Returns:
+        FilaMensaje: Fila lista para copy_records_to_table
+    """
+    mensaje_texto, sensor_id, valor, unidad = procesar_mensaje_json(topico, payload)[:4]
+    valor = valor_numerico(valor)
+    return FilaMensaje(
+        topico,
+        mensaje_texto,
+        datetime.now(),
+        sensor_id,
+        None if valor is None else Decimal(str(valor)),
+        None if unidad is None else str(unidad),
+        None
+    )
+
+
+async def recibir_mensajes(cola):
+    """
+    Mantiene la conexión MQTT y encola cada mensaje como FilaMensaje
+
+    La cola acotada aplica contrapresión: si los escritores no dan
+    abasto, el lector deja de consumir del socket hasta que haya sitio.
+    """
+    while True:
+        try:
+            async with aiomqtt.Client(
+                MQTT_BROKER,
+                MQTT_PORT,
+                username=MQTT_USERNAME or None,
+                password=MQTT_PASSWORD or None,
+                client_id=CLIENT_ID,
+                keepalive=60
+            ) as client:
+                async with client.messages() as mensajes:
+                    for topico in SUSCRIPCIONES:
+                        await client.subscribe(topico)
+                    print("✅ Conectado al broker MQTT")
+                    print(f"📥 Suscrito a: {', '.join(SUSCRIPCIONES)}")
+                    print("=" * 60)
+                    print("🎧 Escuchando mensajes...\n")
+
+                    async for msg in mensajes:
+                        try:
+                            await cola.put(crear_fila(msg.topic.value, msg.payload))
+                        except Exception as e:
+                            global error_count
+                            error_count += 1
+                            print(f"❌ Error procesando mensaje: {e}")
+        except aiomqtt.MqttError as e:
+            print(f"⚠️ Desconexión del broker ({e}). Reintentando en {REINTENTO_MQTT}s...")
+            await asyncio.sleep(REINTENTO_MQTT)
+
+
+async def reportar_progreso(intervalo=10):
+    """Imprime periódicamente el total de mensajes guardados"""
+    anterior = 0
+    while True:
+        await asyncio.sleep(intervalo)
+        tasa = (message_count - anterior) / intervalo
+        anterior = message_count
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        print(f"[{timestamp}] 💾 Guardados: {message_count} ({tasa:.0f} msgs/s) | Errores: {error_count}")
+
+
+# ============================================
+# FUNCIÓN PRINCIPAL
+# ============================================
+async def ejecutar():
+    """Arranca el pool, las tareas escritoras y el lector MQTT hasta recibir una señal"""
+    print("🔄 Creando pool de conexiones async...")
+    try:
+        pool = await crear_pool_async()
+    except (OSError, asyncpg.PostgresError) as e:
+        print(f"❌ No se pudo conectar a la base de datos: {e}")
+        return
+    print(f"✅ Pool asyncpg listo ({ESCRITORES} conexiones)")
+
+    cola = asyncio.Queue(maxsize=BUFFER_CAPACIDAD)
+    escritores = [asyncio.create_task(tarea_escritora(pool, cola)) for _ in range(ESCRITORES)]
+    lector = asyncio.create_task(recibir_mensajes(cola))
+    progreso = asyncio.create_task(reportar_progreso())
+
+    # Detener con Ctrl+C / SIGTERM (en Windows solo queda KeyboardInterrupt)
+    detener = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, detener.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    try:
+        await detener.wait()
+    finally:
+        print("\n\n⏹️  Deteniendo suscriptor...")
+        lector.cancel()
+        progreso.cancel()
+        await asyncio.gather(lector, progreso, return_exceptions=True)
+
+        # Vaciar lo pendiente: las marcas de fin quedan detrás de los mensajes
+        pendientes = cola.qsize()
+        if pendientes:
+            print(f"💾 Escribiendo {pendientes} mensaje(s) pendientes...")
+        for _ in escritores:
+            await cola.put(_FIN)
+        await asyncio.gather(*escritores, return_exceptions=True)
+        await pool.close()
+        print("🔌 Pool de conexiones cerrado")
+
+
+def main():
+    """Función principal"""
+    print("=" * 60)
+    print("👨‍💼 SUSCRIPTOR ADMINISTRATIVO ASYNCIO - BASE DE DATOS")
+    print("   Universidad Militar Nueva Granada")
+    print("=" * 60)
+    print(f"📡 Broker MQTT: {MQTT_BROKER}:{MQTT_PORT}")
+    print(f"🗄️  Base de datos: {DB_CONFIG['database']} @ {DB_CONFIG['host']}")
+    print(f"🆔 Client ID: {CLIENT_ID}")
+    print(f"📦 Lotes de {BUFFER_TAM_LOTE} filas / {BUFFER_LATENCIA_MAX}s | Escritores: {ESCRITORES}")
+    print("=" * 60 + "\n")
+
+    try:
+        asyncio.run(ejecutar())
+    except KeyboardInterrupt:
+        pass
+
+    print("\n" + "=" * 60)
+    print("📊 ESTADÍSTICAS DEL SUSCRIPTOR")
+    print("=" * 60)
+    print(f"✅ Mensajes guardados: {message_count}")
+    print(f"❌ Errores: {error_count}")
+    print("=" * 60)
+    print("👋 Suscriptor detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+============================================
+ÚLTIMO VALOR POR SENSOR (DEVICE SHADOW)
+Taller Comunicaciones - Universidad Militar Nueva Granada
+============================================
+
+Caché en memoria del último valor recibido por (sensor_id, topico):
+valor, unidad, estado y hora de recepción. El suscriptor la actualiza
+en cada mensaje y la expone por el servidor HTTP interno, así los
+tableros no consultan mensajes_mqtt:
+
+    GET /ultimo                          todos los sensores
+    GET /ultimo?sensor_id=ESP32_01       filtrado por sensor
+    GET /ultimo/clima/temperatura        un tópico
+
+Opcionalmente (ULTIMO_VALOR_PERSISTIR > 0) un hilo guarda cada pocos
+segundos las entradas modificadas en la tabla ultimo_valor, que
+también sirve de punto de partida al reiniciar. Con el supervisor cada
+trabajador ve solo sus mensajes: la tabla reúne a todos.
+
+Uso:
+    cache = CacheUltimoValor()
+    cache.actualizar(sensor_id, topico, valor, unidad, estado, datetime.now())
+    registrar_rutas(cache)
+"""
+
+import logging
+import os
+import sys
+import threading
+from collections import namedtuple
+
+import psycopg2
+from psycopg2 import extras
+
+# Agregar path para importar db_config y el servidor HTTP
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_config import conexion
+from sensores.servidor_http import registrar_ruta, respuesta_json
+
+# ============================================
+# CONFIGURACIÓN
+# ============================================
+# Segundos entre escrituras a la tabla ultimo_valor (0 = solo memoria)
+ULTIMO_VALOR_PERSISTIR = float(os.getenv('ULTIMO_VALOR_PERSISTIR', 5))
+
+# Máximo de pares (sensor, tópico) en memoria
+ULTIMO_VALOR_MAX = int(os.getenv('ULTIMO_VALOR_MAX', 100000))
+
+log = logging.getLogger('ultimo_valor')
+
+Lectura = namedtuple('Lectura', ['valor', 'unidad', 'estado', 'recibido'])
+
+# Solo se sobrescribe una fila con una lectura más reciente (varios
+# trabajadores pueden escribir el mismo sensor)
+UPSERT_ULTIMO_VALOR = """
+INSERT INTO ultimo_valor AS u (sensor_id, topico, valor, unidad, estado, recibido)
+VALUES %s
+ON CONFLICT (sensor_id, topico) DO UPDATE SET
+    valor = EXCLUDED.valor,
+    unidad = EXCLUDED.unidad,
+    estado = EXCLUDED.estado,
+    recibido = EXCLUDED.recibido
+WHERE EXCLUDED.recibido >= u.recibido
+"""
+
+
+# ============================================
+# CACHÉ
+# ============================================
+class CacheUltimoValor:
+    """Último valor por (sensor_id, topico); sensor_id '' = mensajes sin sensor"""
+
+    def __init__(self, maximo=ULTIMO_VALOR_MAX):
+        self.maximo = maximo
+        self._datos = {}
+        self._modificados = set()
+        self._lock = threading.Lock()
+        self.descartados = 0
+
+    def actualizar(self, sensor_id, topico, valor, unidad, estado, recibido):
+        """Reemplaza la lectura del sensor (llamado en cada mensaje)"""
+        # Texto siempre: con IDs int y str mezclados las claves se pueden ordenar
+        clave = (str(sensor_id) if sensor_id is not None else '', topico)
+        with self._lock:
+            if clave not in self._datos and len(self._datos) >= self.maximo:
+                self.descartados += 1
+                return
+            self._datos[clave] = Lectura(valor, unidad, estado, recibido)
+            self._modificados.add(clave)
+
+    def consultar(self, topico=None, sensor_id=None):
+        """
+        Lecturas actuales, opcionalmente filtradas
+
+        Returns:
+            list: dicts con sensor_id, topico, valor, unidad, estado y
+                  recibido, ordenados por tópico y sensor
+        """
+        with self._lock:
+            entradas = list(self._datos.items())
+        resultado = []
+        for (sensor, top), lectura in sorted(entradas, key=lambda entrada: entrada[0]):
+            if topico is not None and top != topico:
+                continue
+            if sensor_id is not None and sensor != sensor_id:
+                continue
+            resultado.append(dict(sensor_id=sensor, topico=top, **lectura._asdict()))
+        return resultado
+
+    def __len__(self):
+        return len(self._datos)
+
+    def tomar_modificados(self):
+        """Entradas cambiadas desde la última llamada (para persistir)"""
+        with self._lock:
+            claves, self._modificados = self._modificados, set()
+            return [clave + tuple(self._datos[clave]) for clave in claves]
+
+    def devolver_modificados(self, filas):
+        """Vuelve a marcar como pendientes filas que no se pudieron guardar"""
+        with self._lock:
+            self._modificados.update((f[0], f[1]) for f in filas)
+
+    def cargar(self, filas):
+        """Carga filas (sensor_id, topico, valor, unidad, estado, recibido) sin marcarlas"""
+        with self._lock:
+            for sensor, topico, valor, unidad, estado, recibido in filas:
+                self._datos.setdefault((sensor, topico), Lectura(valor, unidad, estado, recibido))
+
+
+# ============================================
+# PERSISTENCIA
+# ============================================
+def cargar_desde_db(cache):
+    """
+    Inicializa la caché con la tabla ultimo_valor
+
+    Returns:
+        int: Entradas cargadas (0 si la tabla no existe)
+    """
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT sensor_id, topico, valor, unidad, estado, recibido FROM ultimo_valor")
+            filas = cursor.fetchall()
+            cursor.close()
+    except psycopg2.Error as e:
+        log.warning("⚠️ No se pudo leer ultimo_valor: %s", e)
+        return 0
+    cache.cargar(filas)
+    return len(filas)
+
+
+def persistir(cache):
+    """
+    Guarda en ultimo_valor las entradas modificadas
+
+    Returns:
+        int: Filas enviadas
+    """
+    filas = cache.tomar_modificados()
+    if not filas:
+        return 0
+    try:
+        # Orden fijo de bloqueo entre trabajadores
+        valores = [(sensor, topico, extras.Json(valor), unidad, estado, recibido)
+                   for sensor, topico, valor, unidad, estado, recibido
+                   in sorted(filas, key=lambda fila: (fila[0], fila[1]))]
+        with conexion() as conn:
+            cursor = conn.cursor()
+            extras.execute_values(cursor, UPSERT_ULTIMO_VALOR, valores, page_size=1000)
+            cursor.close()
+    except Exception:
+        cache.devolver_modificados(filas)
+        raise
+    return len(filas)
+
+
+def iniciar_persistencia(cache, segundos=ULTIMO_VALOR_PERSISTIR):
+    """
+    Persiste la caché cada 'segundos' en un hilo daemon
+
+    Returns:
+        threading.Event: Evento que detiene el hilo al activarlo
+    """
+    detener = threading.Event()
+    if segundos <= 0:
+        return detener
+
+    def bucle():
+        while not detener.wait(segundos):
+            try:
+                persistir(cache)
+            except Exception as e:
+                # El hilo sigue: las filas quedaron marcadas para la próxima pasada
+                log.warning("⚠️ Error guardando ultimo_valor: %s", e)
+
+    threading.Thread(target=bucle, name="persistencia_ultimo_valor", daemon=True).start()
+    return detener
+
+
+# ============================================
+# API HTTP
+# ============================================
+def registrar_rutas(cache):
+    """Publica /ultimo y /ultimo/<tópico> en el servidor HTTP interno"""
+
+    def manejador(parametros):
+        topico = parametros['_ruta'][len('/ultimo/'):] or None
+        lecturas = cache.consultar(topico or parametros.get('topico'), parametros.get('sensor_id'))
+        if topico and not lecturas:
+            return respuesta_json({'error': f"sin lecturas para '{topico}'"}, 404)
+        return respuesta_json({'total': len(lecturas), 'lecturas': lecturas})
+
+    registrar_ruta('/ultimo', manejador)
+    registrar_ruta('/ultimo/', manejador)